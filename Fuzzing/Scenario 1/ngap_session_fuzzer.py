@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+ngap_session_fuzzer.py
+
+Stateful NGAP fuzzing over established associations.
+
+test_ng_setup() connects, sends one NGSetupRequest, reads one answer and
+closes for every test value, which is fine for NGSetup itself but cannot
+reach anything that needs a set-up NG-C connection. This driver brings
+each association up once - SCTP handshake plus NGSetupRequest /
+NGSetupResponse (ngap_transport.AssociationPool with `setup`) - and then
+streams fuzz cases over it for the procedures that follow setup:
+
+    ran-config-update   RANConfigurationUpdate (RANNodeName, SupportedTAList, PagingDRX)
+    error-indication    ErrorIndication with UE NGAP IDs and a Cause
+    initial-ue          InitialUEMessage carrying a NAS Registration Request
+    uplink-nas          UplinkNASTransport carrying a NAS Authentication Response
+    ue-release          UEContextReleaseRequest
+
+Every base PDU is encoded once with pycrate and fuzzed by
+aper_mutator.AperMutator (extension bits, indexes, bitmaps, lengths,
+truncation, values, padding), so cases stream without re-encoding.
+UE-associated cases go on a non-zero SCTP stream. Before fuzzing, one
+unmutated InitialUEMessage per association (RAN-UE-NGAP-ID --ran-ue-id +
+n) registers a UE, and the AMF-UE-NGAP-ID the AMF assigns in its
+DownlinkNASTransport goes into that UE's base PDUs, so UE-associated cases
+address a context the AMF knows. An association is only
+reopened - and set up again - when the AMF aborts it; the PDUs written
+just before each abort are reported as suspects.
+
+Usage:
+    python3 ngap_session_fuzzer.py --dry-run --count 100000
+    python3 ngap_session_fuzzer.py --amf 192.168.42.134 --count 50000
+    python3 ngap_session_fuzzer.py --amf 192.168.42.134 --procedure error-indication --op length --suspects aborts.txt
+    python3 ngap_session_fuzzer.py --amf 127.0.0.1 --transport tcp --count 100000   # against mock_amf.py
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ngsetup_mutator import NGSetupFields, encode_ngsetup_request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test-case generation"))
+from aper_mutator import OPS, AperMutator
+from ngap_fastpath import PDU_INITIATING, decode_ue_ngap_ids, triage
+from ngap_pdu_pool import NGAP_AVAILABLE, encode_aper
+from ngap_transport import SCTP_AVAILABLE, TRANSPORTS, AssociationPool, describe, resolve_transport
+
+MAX_QUEUED = 4096      # PDUs queued before the sender waits for the sockets to drain
+UE_SETUP_TIMEOUT = 5.0 # seconds to wait for the DownlinkNASTransport of each registered UE
+DOWNLINK_NAS_TRANSPORT = (PDU_INITIATING, 4)
+
+# NAS 5GMM Registration Request: initial registration, SUCI 999-70 MSIN 0000000001
+# (null scheme), UE security capability 5G-EA/IA 0-3
+NAS_REGISTRATION_REQUEST = bytes.fromhex("7e004179000d0199f90700000000000000000001" "2e02f0f0")
+# NAS 5GMM Authentication Response with a zero RES*
+NAS_AUTHENTICATION_RESPONSE = bytes.fromhex("7e00572d10") + bytes(16)
+
+
+def _user_location(fields):
+    return ("UserLocationInformation", ("userLocationInformationNR", {
+        "nR-CGI": {"pLMNIdentity": fields.plmn, "nRCellIdentity": ((fields.gnb_id << 4) | 1, 36)},
+        "tAI": {"pLMNIdentity": fields.plmn, "tAC": fields.tac}}))
+
+
+def _message(kind, proc, crit, name, ies):
+    return (kind, {"procedureCode": proc, "criticality": crit, "value": (name, {"protocolIEs": ies})})
+
+
+def _ie(ie_id, crit, value):
+    return {"id": ie_id, "criticality": crit, "value": value}
+
+
+def base_pdus(fields, amf_ue_id, ran_ue_id):
+    """procedure name -> pycrate value of the unmutated PDU."""
+    amf_id = _ie(10, "reject", ("AMF-UE-NGAP-ID", amf_ue_id))
+    ran_id = _ie(85, "reject", ("RAN-UE-NGAP-ID", ran_ue_id))
+    slices = [{"s-NSSAI": {"sST": bytes([sst])} if sd is None else {"sST": bytes([sst]), "sD": sd}}
+              for sst, sd in fields.slices]
+    return {
+        "ran-config-update": _message("initiatingMessage", 35, "reject", "RANConfigurationUpdate", [
+            _ie(82, "ignore", ("RANNodeName", fields.ran_node_name or "gnb")),
+            _ie(102, "reject", ("SupportedTAList", [{"tAC": fields.tac, "broadcastPLMNList": [
+                {"pLMNIdentity": fields.plmn, "tAISliceSupportList": slices}]}])),
+            _ie(21, "ignore", ("PagingDRX", "v128")),
+        ]),
+        "error-indication": _message("initiatingMessage", 9, "ignore", "ErrorIndication", [
+            _ie(10, "ignore", ("AMF-UE-NGAP-ID", amf_ue_id)),
+            _ie(85, "ignore", ("RAN-UE-NGAP-ID", ran_ue_id)),
+            _ie(15, "ignore", ("Cause", ("protocol", "semantic-error"))),
+        ]),
+        "initial-ue": _message("initiatingMessage", 15, "ignore", "InitialUEMessage", [
+            ran_id,
+            _ie(38, "reject", ("NAS-PDU", NAS_REGISTRATION_REQUEST)),
+            _ie(121, "reject", _user_location(fields)),
+            _ie(90, "ignore", ("RRCEstablishmentCause", "mo-Signalling")),
+            _ie(112, "ignore", ("UEContextRequest", "requested")),
+        ]),
+        "uplink-nas": _message("initiatingMessage", 46, "ignore", "UplinkNASTransport", [
+            amf_id,
+            ran_id,
+            _ie(38, "reject", ("NAS-PDU", NAS_AUTHENTICATION_RESPONSE)),
+            _ie(121, "ignore", _user_location(fields)),
+        ]),
+        "ue-release": _message("initiatingMessage", 42, "ignore", "UEContextReleaseRequest", [
+            amf_id,
+            ran_id,
+            _ie(15, "ignore", ("Cause", ("radioNetwork", "unspecified"))),
+        ]),
+    }
+
+
+PROCEDURES = ("ran-config-update", "error-indication", "initial-ue", "uplink-nas", "ue-release")
+
+
+def fuzz_cases(fields, procedures, ue_ids=((1, 1),), ops=OPS, stack=3, seed=None):
+    """
+    Yield (ue_key, label, payload) forever, round-robin over `procedures`
+    and the (AMF-UE-NGAP-ID, RAN-UE-NGAP-ID) pairs in `ue_ids`; procedures
+    that are not UE-associated are fuzzed once. ue_key is the base PDU's
+    RAN-UE-NGAP-ID (None when not UE-associated).
+    """
+    streams = []
+    n = 0
+    for u, (amf_ue_id, ran_ue_id) in enumerate(ue_ids):
+        pdus = base_pdus(fields, amf_ue_id, ran_ue_id)
+        for name in procedures:
+            payload = encode_aper(pdus[name])
+            ids = decode_ue_ngap_ids(payload)
+            ue_key = ids[1] if ids and ids[1] is not None else None
+            if ue_key is None and any(other == name for other, _, _ in streams):
+                continue
+            mutator = AperMutator(payload, ops)
+            if u == 0:         # the other UEs' PDUs differ only in their IDs
+                print(f"[*] {name}: {mutator.summary()}")
+            streams.append((name, ue_key, mutator.stream(None, None if seed is None else seed + n, stack)))
+            n += 1
+    for name, ue_key, stream in itertools.cycle(streams):
+        label, payload = next(stream)
+        yield ue_key, f"{name} {label}", payload
+
+
+def register_ues(pool, fields, ran_ue_id, learned, timeout=UE_SETUP_TIMEOUT):
+    """
+    Send one unmutated InitialUEMessage per association (RAN-UE-NGAP-ID
+    ran_ue_id + n, which hashes onto association n) and wait until
+    `learned` (RAN id -> AMF id, filled from the DownlinkNASTransport
+    answers by the pool's on_message) has them all. Returns the RAN ids.
+    """
+    ran_ids = [ran_ue_id + n for n in range(pool.size)]
+    for ran_id in ran_ids:
+        payload = encode_aper(base_pdus(fields, 0, ran_id)["initial-ue"])
+        pool.submit(payload, ran_id, f"initial-ue (registration) RAN-UE-NGAP-ID {ran_id}")
+    pool.flush()
+    pool.wait(timeout, lambda: all(ran_id in learned for ran_id in ran_ids))
+    return ran_ids
+
+
+def run(pool, cases, count, rate=None, wait=2.0):
+    """Submit `count` cases on the pool (None = endless); returns the number submitted."""
+    interval = 1.0 / rate if rate else 0.0
+    next_at = time.perf_counter()
+    n = 0
+    try:
+        for ue_key, label, payload in itertools.islice(cases, count):
+            if interval:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            pool.submit(payload, ue_key, label)
+            n += 1
+            if pool.queued >= MAX_QUEUED:
+                while pool.queued > MAX_QUEUED // 2:
+                    pool.pump(0.05)
+            elif n % 64 == 0:
+                pool.pump()
+        pool.flush()
+        pool.wait(wait)
+    except KeyboardInterrupt:
+        print("\n[*] Interrupted")
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stateful NGAP fuzzing over set-up associations")
+    parser.add_argument("--amf", help="AMF IP address")
+    parser.add_argument("--port", type=int, default=38412)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="sctp",
+                        help="tcp = length-prefixed NGAP over TCP, for mock_amf.py without SCTP")
+    parser.add_argument("--procedure", action="append", choices=PROCEDURES,
+                        help="procedure to fuzz (repeatable; default all)")
+    parser.add_argument("--count", type=int, default=10000, help="fuzz cases to send (0 = endless)")
+    parser.add_argument("--op", action="append", choices=OPS, help="APER mutation operator (repeatable; default all)")
+    parser.add_argument("--stack", type=int, default=2, help="max patches combined per case")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--rate", type=float, help="max cases per second")
+    parser.add_argument("--associations", type=int, default=1,
+                        help="associations to set up; each uses its own gNB-ID (--gnb-id + index)")
+    parser.add_argument("--streams", type=int, default=4, help="outbound SCTP streams per association")
+    parser.add_argument("--gnb-id", type=lambda v: int(v, 0), default=0x61)
+    parser.add_argument("--amf-ue-id", type=int, default=1,
+                        help="AMF-UE-NGAP-ID in the base PDUs with --dry-run, or when the AMF assigns none")
+    parser.add_argument("--ran-ue-id", type=int, default=1,
+                        help="RAN-UE-NGAP-ID of the first association's UE (association n uses this + n)")
+    parser.add_argument("--wait", type=float, default=2.0, help="seconds to wait for answers at the end")
+    parser.add_argument("--suspects", help="write the PDUs sent just before each abort as '<error>\\t<label>\\t<hex>'")
+    parser.add_argument("--dry-run", action="store_true", help="generate cases only and report the rate")
+    args = parser.parse_args()
+
+    if not NGAP_AVAILABLE:
+        print("[!] pycrate_asn1dir not available (needed to encode the base PDUs)")
+        return 1
+
+    fields = NGSetupFields(gnb_id=args.gnb_id)
+    procedures = args.procedure or PROCEDURES
+    ops = args.op or OPS
+    count = args.count or None
+
+    if args.dry_run or not args.amf:
+        if not args.amf and not args.dry_run:
+            print("[*] No --amf given, generating only")
+        cases = fuzz_cases(fields, procedures, ((args.amf_ue_id, args.ran_ue_id),), ops, args.stack, args.seed)
+        start = time.perf_counter()
+        n = sum(1 for _ in itertools.islice(cases, count))
+        elapsed = time.perf_counter() - start
+        print(f"[+] Generated {n} cases in {elapsed:.2f}s ({n / elapsed:.0f}/s)")
+        return 0
+
+    if resolve_transport(args.transport) == "sctp" and not SCTP_AVAILABLE:
+        print("[!] pysctp is not installed (pip install pysctp)")
+        return 1
+
+    answers = Counter()
+    learned = {}           # RAN-UE-NGAP-ID -> AMF-UE-NGAP-ID the AMF assigned
+
+    def on_message(payload, index):
+        answers[describe(payload)] += 1
+        if triage(payload) == DOWNLINK_NAS_TRANSPORT:
+            ids = decode_ue_ngap_ids(payload)
+            if ids and ids[0] is not None:
+                learned.setdefault(ids[1], ids[0])
+
+    def setup(index):
+        return encode_ngsetup_request(NGSetupFields(gnb_id=args.gnb_id + index))
+
+    start = time.perf_counter()
+    try:
+        pool = AssociationPool(args.amf, args.port, size=args.associations, streams=args.streams,
+                               on_message=on_message, setup=setup, transport=args.transport)
+    except (OSError, ConnectionError) as e:
+        print(f"[!] Could not set up an association with {args.amf}:{args.port}: {e}")
+        return 1
+    print(f"[+] {args.associations} association(s) set up in {time.perf_counter() - start:.2f}s")
+
+    ran_ids = register_ues(pool, fields, args.ran_ue_id, learned)
+    missing = [ran_id for ran_id in ran_ids if ran_id not in learned]
+    if missing:
+        print(f"[!] No DownlinkNASTransport for RAN-UE-NGAP-ID(s) {missing}; "
+              f"using AMF-UE-NGAP-ID {args.amf_ue_id} for them")
+    ue_ids = [(learned.get(ran_id, args.amf_ue_id), ran_id) for ran_id in ran_ids]
+    print(f"[+] UE NGAP IDs (AMF, RAN): {ue_ids}")
+    cases = fuzz_cases(fields, procedures, ue_ids, ops, args.stack, args.seed)
+
+    registered = pool.sent
+    start = time.perf_counter()
+    try:
+        n = run(pool, cases, count, args.rate, args.wait)
+    except (OSError, ConnectionError) as e:
+        print(f"[!] AMF no longer accepts associations: {e}")
+        n = pool.sent - registered
+    elapsed = time.perf_counter() - start
+    sent = pool.sent - registered
+    print(f"[+] Sent {sent}/{n} cases in {elapsed:.2f}s ({sent / elapsed:.0f}/s)")
+    print(f"[+] {pool.summary()}")
+    for answer, k in answers.most_common():
+        print(f"[*]   {k:8d}  {answer}")
+    for index, error, recent in pool.aborts:
+        print(f"[!] Association {index} aborted ({error}); last sent: {recent[-1][0] if recent else '-'}")
+    if args.suspects and pool.aborts:
+        with open(args.suspects, "w", encoding="utf-8") as f:
+            for _, error, recent in pool.aborts:
+                for label, payload in recent:
+                    f.write(f"{error}\t{label}\t{payload.hex()}\n")
+        print(f"[+] Wrote {args.suspects}")
+    pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+"""
+ngsetup_mutator.py
+
+NGSetupRequest mutation engine for Scenario 1.
+
+gnodebid.py, pagingdrx.py and rannodename.py each changed one field of a
+captured NGSetupRequest by editing its hex, which only worked while every
+length stayed the same. This module encodes the whole request itself (a
+small aligned-PER writer, no pycrate needed) from an NGSetupFields record,
+so every length determinant - open types, RANNodeName, gNB-ID bit length,
+slice count - is recomputed for whatever values are set.
+
+NGSetupMutator picks one field per message (gNB-ID and its bit length,
+RANNodeName, TAC, PLMN, slices, PagingDRX) and sets it to either a random
+valid value or a boundary value (minimum / maximum sizes and values,
+extended RANNodeName). stream() yields the encoded payloads fast enough to
+feed send_loop() thousands of requests per second.
+
+Usage:
+    python3 ngsetup_mutator.py --dry-run --count 20000
+    python3 ngsetup_mutator.py --check 2000                  # pycrate decode check
+    python3 ngsetup_mutator.py --amf 192.168.42.134 --count 5000 --field ran_node_name
+    python3 ngsetup_mutator.py --amf 127.0.0.1 --transport tcp --count 50000   # against mock_amf.py
+"""
+
+import argparse
+import binascii
+import itertools
+import os
+import random
+import selectors
+import socket
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+try:
+    import sctp
+    SCTP_AVAILABLE = True
+except ImportError:
+    # Only needed to talk to the AMF; encoding and --dry-run work without it
+    SCTP_AVAILABLE = False
+
+PROC_NG_SETUP = 21
+NGAP_PPID = 60
+SEND_RETRY_TIMEOUT = 5.0     # seconds a payload may wait for room in the socket buffer
+
+IE_GLOBAL_RAN_NODE_ID = 27
+IE_RAN_NODE_NAME = 82
+IE_SUPPORTED_TA_LIST = 102
+IE_DEFAULT_PAGING_DRX = 21
+
+CRIT_REJECT = 0
+CRIT_IGNORE = 1
+
+PAGING_DRX = ("v32", "v64", "v128", "v256")
+
+GNB_ID_BITS_MIN, GNB_ID_BITS_MAX = 22, 32
+RAN_NODE_NAME_MAX = 150      # root of SIZE(1..150, ...); longer names use the extension
+MAX_SLICES = 1024            # maxnoofSliceItems
+
+PRINTABLE = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 '()+,-./:=?"
+
+# The captured requests the Scenario 1 scripts replay end with three zero
+# bytes after the PDU; kept so their payloads stay byte-identical.
+CAPTURE_TRAILER = b"\x00\x00\x00"
+
+FIELDS = ("gnb_id", "ran_node_name", "tac", "plmn", "slices", "paging_drx")
+
+
+def encode_plmn_identity(mcc, mnc):
+    """Encode MCC/MNC into 3-byte PLMNIdentity."""
+    mcc = str(mcc).zfill(3)
+    mnc = str(mnc)
+    if len(mnc) == 2:
+        mnc = mnc + "f"
+    elif len(mnc) == 1:
+        mnc = mnc + "ff"
+    b1 = int(mcc[1] + mcc[0], 16)
+    b2 = int(mnc[2] + mcc[2], 16)
+    b3 = int(mnc[1] + mnc[0], 16)
+    return bytes([b1, b2, b3])
+
+
+@dataclass(frozen=True)
+class NGSetupFields:
+    """Every value the engine puts into an NGSetupRequest (defaults: the Scenario 1 capture)."""
+    plmn: bytes = b"\x99\xf9\x07"                  # 999-70
+    gnb_id: int = 0x61
+    gnb_id_bits: int = 32
+    ran_node_name: Optional[str] = "safemalwarescanner123"   # None leaves the IE out
+    tac: bytes = b"\x00\x00\x01"
+    slices: Tuple[Tuple[int, Optional[bytes]], ...] = ((1, None),)   # (SST, SD or None)
+    paging_drx: int = 2                            # index into PAGING_DRX (v128)
+
+
+# --------------------------------------------------------------------
+# Aligned-PER writer
+# --------------------------------------------------------------------
+class _AperWriter:
+    """Minimal aligned-PER writer: bit fields, octet alignment, length determinants."""
+    __slots__ = ("word", "nbits")
+
+    def __init__(self):
+        self.word = 0
+        self.nbits = 0
+
+    def bits(self, value, n):
+        self.word = (self.word << n) | value
+        self.nbits += n
+
+    def align(self):
+        pad = -self.nbits & 7
+        if pad:
+            self.word <<= pad
+            self.nbits += pad
+
+    def octets(self, data):
+        self.align()
+        self.bits(int.from_bytes(data, "big"), 8 * len(data))
+
+    def length(self, n):
+        """Unconstrained length determinant (no fragmentation)."""
+        self.align()
+        if n < 128:
+            self.bits(n, 8)
+        elif n < 16384:
+            self.bits(0x8000 | n, 16)
+        else:
+            raise ValueError(f"length {n} needs APER fragmentation")
+
+    def open_type(self, data):
+        self.length(len(data))
+        self.octets(data)
+
+    def tobytes(self):
+        self.align()
+        if not self.nbits:
+            return b"\x00"       # an empty open type still carries one octet
+        return self.word.to_bytes(self.nbits >> 3, "big")
+
+
+def _global_ran_node_id(f):
+    w = _AperWriter()
+    w.bits(0, 2)                 # GlobalRANNodeID: globalGNB-ID
+    w.bits(0, 2)                 # extension, iE-Extensions absent
+    w.octets(f.plmn)
+    if not GNB_ID_BITS_MIN <= f.gnb_id_bits <= GNB_ID_BITS_MAX:
+        raise ValueError(f"gNB-ID length {f.gnb_id_bits} outside 22..32")
+    if not 0 <= f.gnb_id < (1 << f.gnb_id_bits):
+        raise ValueError(f"gNB-ID {f.gnb_id} does not fit in {f.gnb_id_bits} bits")
+    w.bits(0, 1)                 # GNB-ID: gNB-ID
+    w.bits(f.gnb_id_bits - GNB_ID_BITS_MIN, 4)
+    w.align()
+    w.bits(f.gnb_id, f.gnb_id_bits)
+    return w.tobytes()
+
+
+def _ran_node_name(name):
+    data = name.encode("latin-1")
+    if not data:
+        raise ValueError("RANNodeName cannot be empty")
+    w = _AperWriter()
+    if len(data) <= RAN_NODE_NAME_MAX:
+        w.bits(0, 1)
+        w.bits(len(data) - 1, 8)
+    else:
+        w.bits(1, 1)
+        w.length(len(data))
+    w.octets(data)
+    return w.tobytes()
+
+
+def _supported_ta_list(f):
+    if not 1 <= len(f.slices) <= MAX_SLICES:
+        raise ValueError(f"{len(f.slices)} slices outside 1..{MAX_SLICES}")
+    w = _AperWriter()
+    w.align()
+    w.bits(0, 8)                 # one SupportedTAItem
+    w.bits(0, 2)
+    w.octets(f.tac)
+    w.bits(0, 4)                 # one BroadcastPLMNItem
+    w.bits(0, 2)
+    w.octets(f.plmn)
+    w.align()
+    w.bits(len(f.slices) - 1, 16)
+    for sst, sd in f.slices:
+        w.bits(0, 3)             # SliceSupportItem / S-NSSAI extension bits
+        w.bits(sd is not None, 1)
+        w.bits(0, 1)
+        w.bits(sst, 8)
+        if sd is not None:
+            w.octets(sd)
+    return w.tobytes()
+
+
+def _paging_drx(index):
+    if not 0 <= index < len(PAGING_DRX):
+        raise ValueError(f"PagingDRX index {index} outside 0..{len(PAGING_DRX) - 1}")
+    return bytes([index << 5])
+
+
+def encode_ngsetup_request(f):
+    """Return the APER bytes of the NGSetupRequest described by `f`."""
+    ies = [(IE_GLOBAL_RAN_NODE_ID, CRIT_REJECT, _global_ran_node_id(f))]
+    if f.ran_node_name is not None:
+        ies.append((IE_RAN_NODE_NAME, CRIT_IGNORE, _ran_node_name(f.ran_node_name)))
+    ies.append((IE_SUPPORTED_TA_LIST, CRIT_REJECT, _supported_ta_list(f)))
+    ies.append((IE_DEFAULT_PAGING_DRX, CRIT_IGNORE, _paging_drx(f.paging_drx)))
+
+    body = _AperWriter()
+    body.bits(0, 1)              # NGSetupRequest extension bit
+    body.align()
+    body.bits(len(ies), 16)
+    for ie_id, crit, value in ies:
+        body.bits(ie_id, 16)
+        body.bits(crit, 2)
+        body.open_type(value)
+
+    pdu = _AperWriter()
+    pdu.bits(0, 8)               # initiatingMessage
+    pdu.bits(PROC_NG_SETUP, 8)
+    pdu.bits(CRIT_REJECT, 2)
+    pdu.open_type(body.tobytes())
+    return pdu.tobytes()
+
+
+# --------------------------------------------------------------------
+# Mutation engine
+# --------------------------------------------------------------------
+class NGSetupMutator:
+    """
+    Yields NGSetupRequests derived from `base` with one field changed each.
+    A `boundary` fraction of them uses edge values instead of random ones.
+    """
+
+    def __init__(self, base=None, fields=FIELDS, seed=None, boundary=0.25):
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"unknown field(s): {', '.join(sorted(unknown))}")
+        self.base = base or NGSetupFields()
+        self.rng = random.Random(seed)
+        self.boundary = boundary
+        self.strategies = [(name, getattr(self, "_mutate_" + name)) for name in fields]
+
+    def _mutate_gnb_id(self, edge):
+        rng = self.rng
+        if edge:
+            bits = rng.choice((GNB_ID_BITS_MIN, GNB_ID_BITS_MAX))
+            gnb_id = rng.choice((0, 1, (1 << bits) - 1))
+        else:
+            bits = rng.randint(GNB_ID_BITS_MIN, GNB_ID_BITS_MAX)
+            gnb_id = rng.getrandbits(bits)
+        return {"gnb_id": gnb_id, "gnb_id_bits": bits}
+
+    def _mutate_ran_node_name(self, edge):
+        rng = self.rng
+        if edge:
+            size = rng.choice((None, 1, RAN_NODE_NAME_MAX, RAN_NODE_NAME_MAX + 1))
+            if size is None:
+                return {"ran_node_name": None}
+        else:
+            size = rng.randint(1, 48)
+        return {"ran_node_name": "".join(rng.choices(PRINTABLE, k=size))}
+
+    def _mutate_tac(self, edge):
+        if edge:
+            return {"tac": self.rng.choice((b"\x00\x00\x00", b"\x00\x00\x01", b"\xff\xff\xff"))}
+        return {"tac": self.rng.randbytes(3)}
+
+    def _mutate_plmn(self, edge):
+        rng = self.rng
+        if edge:
+            mcc, mnc = rng.choice((("000", "00"), ("999", "99"), ("999", "999"), ("001", "001")))
+        else:
+            mcc = "%03d" % rng.randrange(1000)
+            mnc = "%02d" % rng.randrange(100) if rng.random() < 0.5 else "%03d" % rng.randrange(1000)
+        return {"plmn": encode_plmn_identity(mcc, mnc)}
+
+    def _mutate_slices(self, edge):
+        rng = self.rng
+        if edge:
+            count = rng.choice((1, MAX_SLICES))
+            sst = rng.choice((0, 255))
+            sd = rng.choice((None, b"\x00\x00\x00", b"\xff\xff\xff"))
+            return {"slices": ((sst, sd),) * count}
+        slices = []
+        for _ in range(rng.randint(1, 8)):
+            sst = rng.choice((1, 2, 3, 4, rng.randrange(256)))
+            sd = rng.randbytes(3) if rng.random() < 0.5 else None
+            slices.append((sst, sd))
+        return {"slices": tuple(slices)}
+
+    def _mutate_paging_drx(self, edge):
+        if edge:
+            return {"paging_drx": self.rng.choice((0, len(PAGING_DRX) - 1))}
+        return {"paging_drx": self.rng.randrange(len(PAGING_DRX))}
+
+    def mutate(self):
+        """Return (label, NGSetupFields) for the next request."""
+        name, strategy = self.rng.choice(self.strategies)
+        edge = self.rng.random() < self.boundary
+        label = f"{name}:{'boundary' if edge else 'valid'}"
+        return label, replace(self.base, **strategy(edge))
+
+    def stream(self, count=None):
+        """Yield (label, payload) pairs; forever when `count` is None."""
+        n = 0
+        while count is None or n < count:
+            label, fields = self.mutate()
+            yield label, encode_ngsetup_request(fields)
+            n += 1
+
+
+# --------------------------------------------------------------------
+# Sending
+# --------------------------------------------------------------------
+def connect_amf(amf_ip, amf_port=38412, transport="sctp"):
+    """SCTP association to the AMF, or ngap_transport's framed TCP for mock_amf.py."""
+    if transport == "tcp":
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                                        "test-case generation"))
+        from ngap_transport import FramedTcpSocket
+        s = FramedTcpSocket()
+    else:
+        s = sctp.sctpsocket_tcp(socket.AF_INET)
+    s.connect((amf_ip, amf_port))
+    return s
+
+
+def _wait(s, timeout):
+    """Block until the socket is readable or writable, or `timeout` seconds pass."""
+    with selectors.DefaultSelector() as sel:
+        sel.register(s.fileno(), selectors.EVENT_READ | selectors.EVENT_WRITE)
+        sel.select(timeout)
+
+
+def _drain(s):
+    """Read whatever the AMF has answered so far; returns the number of messages."""
+    n = 0
+    while True:
+        try:
+            if not s.recv(65536):
+                return n
+            n += 1
+        except (BlockingIOError, InterruptedError):
+            return n
+        except OSError:
+            return n
+
+
+def send_loop(payloads, amf_ip, amf_port=38412, rate=None, transport="sctp"):
+    """
+    Send every payload of `payloads` ((label, bytes) pairs) on one SCTP
+    association, reconnecting when the AMF aborts it. `rate` caps the
+    messages per second. A payload the socket has no room for is retried
+    while the AMF's answers are drained; it is dropped only if the socket
+    stays full for SEND_RETRY_TIMEOUT or the send fails again after a
+    reconnect. Returns (sent, responses, reconnects, dropped).
+    """
+    s = connect_amf(amf_ip, amf_port, transport)
+    s.setblocking(False)
+    sent = responses = reconnects = dropped = 0
+    interval = 1.0 / rate if rate else 0.0
+    next_at = time.perf_counter()
+    try:
+        for label, payload in payloads:
+            if interval:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            deadline = None
+            retried = False
+            while True:
+                try:
+                    s.sctp_send(payload, ppid=socket.htonl(NGAP_PPID))
+                    sent += 1
+                    break
+                except BlockingIOError:
+                    # no room: let the AMF's answers out so it keeps reading, then retry
+                    responses += _drain(s)
+                    now = time.perf_counter()
+                    if deadline is None:
+                        deadline = now + SEND_RETRY_TIMEOUT
+                    elif now >= deadline:
+                        print(f"[!] Socket stayed full for {SEND_RETRY_TIMEOUT:.0f}s, dropping {label}")
+                        dropped += 1
+                        break
+                    _wait(s, min(deadline - now, 0.1))
+                except OSError as e:
+                    if retried:
+                        print(f"[!] Send failed again after reconnecting, dropping {label}: {e}")
+                        dropped += 1
+                        break
+                    print(f"[!] Send failed after {sent} messages ({label}): {e}; reconnecting")
+                    s.close()
+                    s = connect_amf(amf_ip, amf_port, transport)
+                    s.setblocking(False)
+                    reconnects += 1
+                    retried = True
+                    deadline = None
+            # drain whatever the AMF answered so its window never fills up
+            responses += _drain(s)
+    finally:
+        s.close()
+    return sent, responses, reconnects, dropped
+
+
+def send_ngsetup(ngap_payload, amf_ip, amf_port=38412, description="NG Setup Request"):
+    """Send one NGSetupRequest, wait for the answer and report it. True on NGSetupResponse."""
+    if not SCTP_AVAILABLE:
+        print("✗ pysctp is not installed (pip install pysctp)")
+        return False
+
+    s = sctp.sctpsocket_tcp(socket.AF_INET)
+    try:
+        s.connect((amf_ip, amf_port))
+        print("✓ Connected to AMF")
+
+        bytes_sent = s.sctp_send(ngap_payload, ppid=socket.htonl(NGAP_PPID))
+        print(f"✓ Sent {bytes_sent} bytes with {description}")
+
+        s.settimeout(10.0)
+        response = s.recv(4096)
+
+        if response:
+            print(f"✓ Received {len(response)} byte response")
+
+            if len(response) >= 2:
+                pdu_type, procedure = response[0], response[1]
+
+                print(f"\n📊 Response Analysis:")
+                print(f"  PDU Type: 0x{pdu_type:02x}", end="")
+
+                if pdu_type == 0x20:
+                    print(" - successfulOutcome")
+                    if procedure == 0x15:
+                        print("  ✅ NG Setup Procedure SUCCESS!")
+                        print(f"  🎉 AMF accepted {description}!")
+                        return True
+                    else:
+                        print(f"  Procedure: 0x{procedure:02x} (unexpected)")
+                elif pdu_type == 0x40:
+                    print(" - unsuccessfulOutcome")
+                    print("  ❌ NG Setup Failed")
+                else:
+                    print(f" - unknown type")
+
+                # Show first few bytes of response
+                resp_hex = binascii.hexlify(response[:20]).decode()
+                print(f"  Response (first 20 bytes): {resp_hex}")
+
+            return False
+        else:
+            print("✗ No response received")
+            return False
+
+    except socket.timeout:
+        print("⏱ Timeout waiting for response")
+        return False
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+    finally:
+        s.close()
+        print("\n🔌 Connection closed")
+
+
+def verify_exact_match(generated, expected_hex):
+    """Compare a generated payload with the captured hexdump and point at the first difference."""
+    generated_hex = binascii.hexlify(generated).decode()
+
+    print(f"Expected: {expected_hex}")
+    print(f"Generated: {generated_hex}")
+
+    if expected_hex == generated_hex:
+        return True
+    print("❌ MISMATCH!")
+    min_len = min(len(expected_hex), len(generated_hex))
+    for i in range(0, min_len, 2):
+        e_chunk = expected_hex[i:i+2]
+        g_chunk = generated_hex[i:i+2]
+        if e_chunk != g_chunk:
+            print(f"Difference at byte {i//2}: expected={e_chunk}, generated={g_chunk}")
+            print(f"Context: ...{expected_hex[i-8:i]}>{expected_hex[i:i+8]}<{expected_hex[i+8:i+16]}...")
+            print(f"         ...{generated_hex[i-8:i]}>{generated_hex[i:i+8]}<{generated_hex[i+8:i+16]}...")
+            break
+    else:
+        print(f"Lengths differ: expected {len(expected_hex)//2} bytes, generated {len(generated_hex)//2}")
+    return False
+
+
+# --------------------------------------------------------------------
+# Self-check against pycrate
+# --------------------------------------------------------------------
+def _expected_value(f):
+    ies = [{"id": IE_GLOBAL_RAN_NODE_ID, "criticality": "reject",
+            "value": ("GlobalRANNodeID", ("globalGNB-ID", {
+                "pLMNIdentity": f.plmn, "gNB-ID": ("gNB-ID", (f.gnb_id, f.gnb_id_bits))}))}]
+    if f.ran_node_name is not None:
+        ies.append({"id": IE_RAN_NODE_NAME, "criticality": "ignore",
+                    "value": ("RANNodeName", f.ran_node_name)})
+    slices = []
+    for sst, sd in f.slices:
+        nssai = {"sST": bytes([sst])}
+        if sd is not None:
+            nssai["sD"] = sd
+        slices.append({"s-NSSAI": nssai})
+    ies.append({"id": IE_SUPPORTED_TA_LIST, "criticality": "reject",
+                "value": ("SupportedTAList", [{"tAC": f.tac, "broadcastPLMNList": [
+                    {"pLMNIdentity": f.plmn, "tAISliceSupportList": slices}]}])})
+    ies.append({"id": IE_DEFAULT_PAGING_DRX, "criticality": "ignore",
+                "value": ("PagingDRX", PAGING_DRX[f.paging_drx])})
+    return ("initiatingMessage", {"procedureCode": PROC_NG_SETUP, "criticality": "reject",
+                                  "value": ("NGSetupRequest", {"protocolIEs": ies})})
+
+
+def check_against_pycrate(mutator, count):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test-case generation"))
+    try:
+        from ngap_pdu_pool import decode_aper, encode_aper
+    except ImportError as e:
+        print(f"[!] pycrate not available: {e}")
+        return False
+    mismatches = 0
+    for _ in range(count):
+        label, fields = mutator.mutate()
+        payload = encode_ngsetup_request(fields)
+        expected = _expected_value(fields)
+        try:
+            ok = decode_aper(payload) == expected and encode_aper(expected) == payload
+        except Exception:
+            ok = False
+        if not ok:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"[!] Mismatch ({label}): {fields}")
+    print(f"[+] {count} requests checked against pycrate, {mismatches} mismatches")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scenario 1 NGSetupRequest mutation engine")
+    parser.add_argument("--amf", help="AMF IP address to stream requests to")
+    parser.add_argument("--port", type=int, default=38412)
+    parser.add_argument("--transport", choices=("sctp", "tcp"), default="sctp",
+                        help="tcp = length-prefixed NGAP over TCP, for mock_amf.py without SCTP")
+    parser.add_argument("--count", type=int, default=1000, help="requests to generate (0 = endless)")
+    parser.add_argument("--field", action="append", choices=FIELDS,
+                        help="mutate only this field (repeatable; default: all)")
+    parser.add_argument("--boundary", type=float, default=0.25,
+                        help="fraction of boundary-value requests (default 0.25)")
+    parser.add_argument("--rate", type=float, help="max requests per second when sending")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="print the first N payloads")
+    parser.add_argument("--dry-run", action="store_true", help="encode only and report the rate")
+    parser.add_argument("--check", type=int, metavar="N", help="decode N requests with pycrate and compare")
+    args = parser.parse_args()
+
+    mutator = NGSetupMutator(fields=args.field or FIELDS, seed=args.seed, boundary=args.boundary)
+
+    if args.check:
+        return 0 if check_against_pycrate(mutator, args.check) else 1
+
+    count = args.count or None
+    stream = mutator.stream(count)
+    if args.show:
+        shown = [next(stream) for _ in range(min(args.show, count or args.show))]
+        for label, payload in shown:
+            print(f"[*] {label:28s} {len(payload):5d} bytes  {payload[:32].hex()}")
+        stream = itertools.chain(shown, stream)
+
+    if args.dry_run or not args.amf:
+        if not args.amf and not args.dry_run:
+            print("[*] No --amf given, encoding only")
+        start = time.perf_counter()
+        n = total = 0
+        for _, payload in stream:
+            n += 1
+            total += len(payload)
+            if count is None and n % 100000 == 0:
+                print(f"[*] {n} requests ({n / (time.perf_counter() - start):.0f}/s)")
+        elapsed = time.perf_counter() - start
+        print(f"[+] Encoded {n} requests, {total} bytes in {elapsed:.2f}s ({n / elapsed:.0f} requests/s)")
+        return 0
+
+    if args.transport == "sctp" and not SCTP_AVAILABLE:
+        print("[!] pysctp is not installed (pip install pysctp)")
+        return 1
+    start = time.perf_counter()
+    sent, responses, reconnects, dropped = send_loop(stream, args.amf, args.port, args.rate, args.transport)
+    elapsed = time.perf_counter() - start
+    print(f"[+] Sent {sent} requests to {args.amf}:{args.port} in {elapsed:.2f}s "
+          f"({sent / elapsed:.0f}/s), {responses} responses, {reconnects} reconnects, {dropped} dropped")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
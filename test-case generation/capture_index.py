@@ -0,0 +1,321 @@
+"""
+capture_index.py
+
+One-time indexer that writes a sidecar file (<capture>.idx.json) next to a
+capture. For every SCTP association it records where each message type
+(INIT, INIT-ACK, SACK, NGSetupRequest, other NGAP procedures, ...) lives as
+[frame_no, timestamp, file_offset], plus the highest-TSN DATA message per
+direction. DATA goes through the same DataReassembler as the analyzer, so
+retransmissions are not indexed and a message split over several DATA
+chunks lists every frame it spans. PFCP messages are indexed by message
+type with their SEID.
+
+Later runs load the sidecar and seek straight to the frames they need with
+MmapPcapReader.read_record() instead of rescanning the whole capture.
+
+Usage:
+    python capture_index.py --pcap capture.pcap
+"""
+
+import json
+import os
+import struct
+import time
+
+from capture_io import MmapPcapReader, open_capture
+from sctp_fastpath import (
+    CHUNK_DATA, CHUNK_INIT, CHUNK_INIT_ACK, CHUNK_SACK, FALLBACK, NGAP_PPID,
+    iter_raw_chunks, parse_frame,
+)
+from sctp_flows import SCTPFlowTable, scapy_fallback
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".idx.json"
+
+PFCP_PORT = 8805
+VLAN_ETHERTYPES = (b"\x81\x00", b"\x88\xa8", b"\x91\x00")
+
+CHUNK_NAMES = {
+    CHUNK_INIT: "INIT",
+    CHUNK_INIT_ACK: "INIT-ACK",
+    CHUNK_SACK: "SACK",
+}
+
+NGAP_PDU_TYPES = ("initiatingMessage", "successfulOutcome", "unsuccessfulOutcome")
+NGAP_MESSAGE_NAMES = {
+    (0, 21): "NGSetupRequest",
+    (1, 21): "NGSetupResponse",
+    (2, 21): "NGSetupFailure",
+}
+
+PFCP_MESSAGE_NAMES = {
+    1: "HeartbeatRequest",
+    2: "HeartbeatResponse",
+    5: "AssociationSetupRequest",
+    6: "AssociationSetupResponse",
+    7: "AssociationUpdateRequest",
+    8: "AssociationUpdateResponse",
+    9: "AssociationReleaseRequest",
+    10: "AssociationReleaseResponse",
+    50: "SessionEstablishmentRequest",
+    51: "SessionEstablishmentResponse",
+    52: "SessionModificationRequest",
+    53: "SessionModificationResponse",
+    54: "SessionDeletionRequest",
+    55: "SessionDeletionResponse",
+    56: "SessionReportRequest",
+    57: "SessionReportResponse",
+}
+
+
+# Frames testcase_generation_scenario2.py needs per association: the handshake
+# (initial TSNs / tags), the NGSetupRequest (PLMN / slice) and the highest-TSN
+# DATA frame (the downlink TSN the fake NGSetupResponse must follow).
+NGSETUP_KINDS = ("INIT", "INIT-ACK", "NGSetupRequest", "max_tsn_data")
+
+
+def sidecar_path(capture_path):
+    return capture_path + INDEX_SUFFIX
+
+
+def ngap_message_name(payload):
+    """Name an NGAP PDU from its first two APER bytes (PDU choice + procedureCode)."""
+    if payload is None or len(payload) < 2:
+        return "NGAP"
+    pdu_type = (payload[0] >> 5) & 0x03
+    name = NGAP_MESSAGE_NAMES.get((pdu_type, payload[1]))
+    if name:
+        return name
+    kind = NGAP_PDU_TYPES[pdu_type] if pdu_type < len(NGAP_PDU_TYPES) else "unknown"
+    return f"NGAP:{kind}:{payload[1]}"
+
+
+def pfcp_message(frame):
+    """Return (message_type, seid) for an Ethernet[/VLAN]/IPv4/UDP PFCP frame, else None."""
+    ip = 14
+    ethertype = frame[12:14]
+    while ethertype in VLAN_ETHERTYPES and len(frame) >= ip + 4:
+        ethertype = frame[ip + 2:ip + 4]
+        ip += 4
+    if ethertype != b"\x08\x00" or len(frame) < ip + 20:
+        return None
+    ihl = (frame[ip] & 0x0F) * 4
+    if ihl < 20 or frame[ip + 9] != 17:
+        return None
+    udp = ip + ihl
+    if len(frame) < udp + 8:
+        return None
+    sport, dport = struct.unpack_from("!HH", frame, udp)
+    if PFCP_PORT not in (sport, dport):
+        return None
+    pfcp = udp + 8
+    if len(frame) < pfcp + 4:
+        return None
+    flags, msg_type = frame[pfcp], frame[pfcp + 1]
+    seid = None
+    if flags & 0x01 and len(frame) >= pfcp + 12:
+        seid = struct.unpack_from("!Q", frame, pfcp + 4)[0]
+    return msg_type, seid
+
+
+def _capture_stat(path):
+    st = os.stat(path)
+    return {"path": os.path.basename(path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def build_index(path):
+    """Scan `path` once and return the index dict."""
+    table = SCTPFlowTable()
+    assoc_entries = []
+    pfcp = {}
+    frames = 0
+
+    with open_capture(path) as reader:
+        linktype = reader.linktype
+        for rec in reader:
+            frames += 1
+            entry = [rec.frame_no, rec.ts, rec.offset]
+
+            chunks = parse_frame(rec.frame, linktype)
+            if chunks is FALLBACK:
+                chunks = list(scapy_fallback(rec.frame, linktype))
+            if not chunks:
+                msg = pfcp_message(rec.frame) if linktype == 1 else None
+                if msg is not None:
+                    name = PFCP_MESSAGE_NAMES.get(msg[0], f"PFCP:{msg[0]}")
+                    pfcp.setdefault(name, []).append(entry + [msg[1]])
+                continue
+
+            for ch in chunks:
+                assoc = table.lookup(ch)
+                if assoc.index == len(assoc_entries):
+                    assoc_entries.append({"messages": {}, "max_tsn_data": {}, "ngap_count": 0, "seen": set()})
+                info = assoc_entries[assoc.index]
+                direction = 0 if (ch.ip_src, ch.sport) == assoc.endpoints[0] else 1
+                refs = [entry]
+
+                if ch.ctype == CHUNK_DATA:
+                    ch = assoc.reassembler.push(ch, entry)
+                    if ch is None:
+                        continue   # retransmission, or a fragment of a message still incomplete
+                    refs = assoc.reassembler.last_refs
+                    if ch.ppid == NGAP_PPID:
+                        info["ngap_count"] += 1
+                        name = ngap_message_name(ch.payload)
+                    else:
+                        name = None
+                    best = info["max_tsn_data"].get(direction)
+                    if ch.tsn is not None and (best is None or ch.tsn > best[-1][3]):
+                        info["max_tsn_data"][direction] = [ref + [ch.tsn] for ref in refs]
+                else:
+                    name = CHUNK_NAMES.get(ch.ctype)
+
+                # one entry per message type per frame, even with bundled chunks
+                for ref in refs:
+                    if name and (ref[0], name) not in info["seen"]:
+                        info["seen"].add((ref[0], name))
+                        info["messages"].setdefault(name, []).append(ref + [direction])
+
+    associations = []
+    for assoc, info in zip(table.associations, assoc_entries):
+        associations.append({
+            "id": assoc.index,
+            "endpoints": [list(ep) for ep in assoc.endpoints],
+            "tags": list(assoc.tags),
+            "ngap_count": info["ngap_count"],
+            "messages": info["messages"],
+            "max_tsn_data": {str(k): v for k, v in info["max_tsn_data"].items()},
+        })
+
+    return {
+        "version": INDEX_VERSION,
+        "capture": _capture_stat(path),
+        "linktype": linktype,
+        "frames": frames,
+        "seekable": isinstance(reader, MmapPcapReader),
+        "associations": associations,
+        "pfcp": pfcp,
+    }
+
+
+def write_index(path, index):
+    out = sidecar_path(path)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    return out
+
+
+def load_index(path):
+    """Return the sidecar index for `path`, or None if missing or stale."""
+    side = sidecar_path(path)
+    if not os.path.exists(side):
+        return None
+    try:
+        with open(side, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    cap = _capture_stat(path)
+    if index.get("version") != INDEX_VERSION or index.get("capture", {}).get("size") != cap["size"] \
+            or index.get("capture", {}).get("mtime") != cap["mtime"]:
+        return None
+    return index
+
+
+def load_or_build_index(path, rebuild=False):
+    """Load a fresh sidecar index, building and writing it first if needed."""
+    index = None if rebuild else load_index(path)
+    if index is None:
+        start = time.monotonic()
+        index = build_index(path)
+        out = write_index(path, index)
+        print(f"[+] Indexed {index['frames']} frames, {len(index['associations'])} association(s) "
+              f"in {time.monotonic() - start:.2f}s -> {out}")
+    return index
+
+
+def association_entries(index, kinds, assoc_ids=None):
+    """
+    Collect [frame_no, ts, offset, ...] entries of the given message kinds
+    (plus "max_tsn_data", every frame of the highest-TSN DATA message per
+    direction) for the selected associations, in frame order.
+    """
+    picked = {}
+    for assoc in index["associations"]:
+        if assoc_ids is not None and assoc["id"] not in assoc_ids:
+            continue
+        for kind in kinds:
+            if kind == "max_tsn_data":
+                entries = [e for frames in assoc["max_tsn_data"].values() for e in frames]
+            else:
+                entries = assoc["messages"].get(kind, [])
+            for entry in entries:
+                picked[entry[0]] = entry
+    return [picked[k] for k in sorted(picked)]
+
+
+def pfcp_entries(index, names=None):
+    """PFCP [frame_no, ts, offset, seid] entries, optionally filtered by message type name."""
+    picked = []
+    for name, entries in index.get("pfcp", {}).items():
+        if names is None or name in names:
+            picked.extend(entries)
+    picked.sort(key=lambda e: e[0])
+    return picked
+
+
+def match_association_ids(index, associations):
+    """
+    Give associations rebuilt from indexed frames the ids the index lists
+    for them (a fresh SCTPFlowTable numbers them from 0 in replay order),
+    matched by endpoints and verification tags.
+    """
+    by_endpoints = {}
+    for entry in index["associations"]:
+        by_endpoints.setdefault(tuple(tuple(ep) for ep in entry["endpoints"]), []).append(entry)
+    for assoc in associations:
+        candidates = by_endpoints.get(tuple(tuple(ep) for ep in assoc.endpoints), [])
+        tags = set(assoc.tags)
+        matched = [entry for entry in candidates if tags & set(entry["tags"])]
+        if len(matched) == 1 or (not matched and len(candidates) == 1):
+            assoc.index = (matched or candidates)[0]["id"]
+
+
+def read_indexed_frames(path, entries):
+    """Seek to each indexed frame and yield its PcapRecord (classic pcap only)."""
+    with MmapPcapReader(path) as reader:
+        for entry in entries:
+            rec = reader.read_record(entry[2], frame_no=entry[0])
+            if rec is not None:
+                yield rec
+
+
+def iter_indexed_chunks(path, index, kinds, assoc_ids=None):
+    """SCTPChunk records for just the indexed frames of the given kinds."""
+    entries = association_entries(index, kinds, assoc_ids)
+    frames = (rec.frame for rec in read_indexed_frames(path, entries))
+    yield from iter_raw_chunks(frames, index["linktype"], scapy_fallback)
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="Build a sidecar index (<pcap>.idx.json) for fast capture random access")
+    p.add_argument("--pcap", required=True)
+    p.add_argument("--rebuild", action="store_true", help="Rebuild even if a fresh index exists")
+    args = p.parse_args()
+
+    if not os.path.exists(args.pcap):
+        print("[!] pcap not found:", args.pcap)
+        return
+
+    index = load_or_build_index(args.pcap, rebuild=args.rebuild)
+    for assoc in index["associations"]:
+        (ip_a, port_a), (ip_b, port_b) = assoc["endpoints"]
+        kinds = ", ".join(f"{k}={len(v)}" for k, v in sorted(assoc["messages"].items()))
+        print(f"[+] Association #{assoc['id']}: {ip_a}:{port_a} <-> {ip_b}:{port_b} ({kinds})")
+    for name, entries in sorted(index["pfcp"].items()):
+        print(f"[+] PFCP {name}: {len(entries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,570 @@
+"""
+capture_io.py
+
+Capture readers shared by the offline analysis tools.
+
+MmapPcapReader maps a classic libpcap file into memory and yields each
+record's frame as a memoryview slice of the mapping, so nothing is copied
+until a consumer really needs its own bytes (e.g. pycrate's from_aper()).
+
+pcapng files and gzip / zstd compressed captures (.pcap.gz, .pcapng.zst,
+...) are parsed as streams by PcapStreamReader / PcapNgReader, which yield
+plain bytes frames with the same record layout. Compressed input is
+decompressed on a background thread so inflating overlaps with parsing.
+
+PcapTailReader follows a classic pcap that tcpdump is still writing.
+"""
+
+import gzip
+import io
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# frame_no is 1-based like Wireshark; offset is the file offset of the
+# record header (None for streamed pcapng / compressed input).
+PcapRecord = namedtuple("PcapRecord", "frame_no ts offset caplen wirelen frame")
+
+LINKTYPE_ETHERNET = 1
+
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+
+# magic -> (struct byte order, timestamp fraction divisor)
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e9),
+}
+
+PCAPNG_SHB_MAGIC = b"\x0a\x0d\x0d\x0a"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# pcapng block types and interface options (draft-ietf-opsawg-pcapng)
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002        # obsolete Packet Block
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_OPT_END = 0
+PCAPNG_OPT_IF_TSRESOL = 9
+PCAPNG_OPT_IF_TSOFFSET = 14
+
+DECOMPRESS_BLOCK_SIZE = 1 << 20
+DECOMPRESS_QUEUE_BLOCKS = 8
+
+
+def capture_magic(path):
+    """Return the first four bytes of a capture file."""
+    with open(path, "rb") as f:
+        return f.read(4)
+
+
+class MmapPcapReader:
+    """
+    Zero-copy reader for classic pcap files.
+
+    Iterating yields PcapRecord entries whose `frame` is a memoryview into
+    the mapped file. Views stay valid while the reader is open; copy them
+    with bytes() if they must outlive it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < PCAP_GLOBAL_HEADER_LEN:
+            self._file.close()
+            raise ValueError(f"{path}: too short to be a pcap file")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+
+        magic = bytes(self._mm[0:4])
+        if magic not in PCAP_MAGICS:
+            self.close()
+            raise ValueError(f"{path}: not a classic pcap file (magic {magic.hex()})")
+        self._endian, self._ts_div = PCAP_MAGICS[magic]
+        _vmaj, _vmin, _tz, _sig, self.snaplen, self.linktype = struct.unpack_from(
+            self._endian + "HHiIII", self._mm, 4)
+        self.linktype &= 0x0FFFFFFF
+        self._record_header = struct.Struct(self._endian + "IIII")
+
+    def read_record(self, offset, frame_no=None):
+        """Read the single record whose header starts at `offset` (for index seeks)."""
+        if offset + PCAP_RECORD_HEADER_LEN > len(self._mm):
+            return None
+        ts_sec, ts_frac, caplen, wirelen = self._record_header.unpack_from(self._mm, offset)
+        start = offset + PCAP_RECORD_HEADER_LEN
+        end = start + caplen
+        if end > len(self._mm):
+            return None
+        return PcapRecord(frame_no, ts_sec + ts_frac / self._ts_div, offset, caplen, wirelen,
+                          self._view[start:end])
+
+    def __iter__(self):
+        mm = self._mm
+        view = self._view
+        unpack = self._record_header.unpack_from
+        ts_div = self._ts_div
+        size = len(mm)
+        offset = PCAP_GLOBAL_HEADER_LEN
+        frame_no = 0
+        while offset + PCAP_RECORD_HEADER_LEN <= size:
+            ts_sec, ts_frac, caplen, wirelen = unpack(mm, offset)
+            start = offset + PCAP_RECORD_HEADER_LEN
+            end = start + caplen
+            if end > size:
+                break  # truncated last record
+            frame_no += 1
+            yield PcapRecord(frame_no, ts_sec + ts_frac / ts_div, offset, caplen, wirelen,
+                             view[start:end])
+            offset = end
+
+    def close(self):
+        if self._mm is None:
+            return
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # Record views are still referenced somewhere; the mapping is
+            # released once they are garbage collected.
+            pass
+        self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PcapTailReader:
+    """
+    Follow a classic pcap that is still being written (tcpdump -w, ideally
+    with -U so records are flushed as they arrive).
+
+    Iterating yields PcapRecord entries as complete records reach the file
+    and None whenever no new data was found, after sleeping `poll_interval`,
+    so the caller gets a chance to do idle work. `offset` is the file offset
+    just past the last record yielded; pass it back in to resume. If the
+    file is truncated or replaced, reading restarts at the beginning and
+    `resets` is incremented before its first record is yielded, so callers
+    can drop state built from the old file.
+    """
+
+    def __init__(self, path, offset=None, frame_no=0, poll_interval=0.2):
+        self.path = path
+        self.offset = offset
+        self.frame_no = frame_no
+        self.poll_interval = poll_interval
+        self.linktype = None
+        self.snaplen = None
+        self._file = None
+        self._inode = None
+        self.resets = 0
+
+    def _open(self):
+        """Open the file and parse its global header; False if it is not there yet."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        header = f.read(PCAP_GLOBAL_HEADER_LEN)
+        if len(header) < PCAP_GLOBAL_HEADER_LEN:
+            f.close()
+            return False
+        if header[:4] not in PCAP_MAGICS:
+            f.close()
+            raise ValueError(f"{self.path}: --follow needs a classic pcap (tcpdump -w) capture")
+        self._endian, self._ts_div = PCAP_MAGICS[header[:4]]
+        _vmaj, _vmin, _tz, _sig, self.snaplen, self.linktype = struct.unpack_from(
+            self._endian + "HHiIII", header, 4)
+        self.linktype &= 0x0FFFFFFF
+        self._record_header = struct.Struct(self._endian + "IIII")
+        self._file = f
+        self._inode = os.fstat(f.fileno()).st_ino
+        if self.offset is None or self.offset < PCAP_GLOBAL_HEADER_LEN:
+            self.offset = PCAP_GLOBAL_HEADER_LEN
+            self.frame_no = 0
+        f.seek(self.offset)
+        return True
+
+    def _replaced(self):
+        """True if the path now points at a different or shorter file."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return st.st_ino != self._inode or st.st_size < self.offset
+
+    def __iter__(self):
+        buf = b""
+        while True:
+            if self._file is None and not self._open():
+                time.sleep(self.poll_interval)
+                yield None
+                continue
+
+            data = self._file.read(DECOMPRESS_BLOCK_SIZE)
+            if not data:
+                if self._replaced():
+                    print(f"[!] {self.path} was truncated or replaced; reading it from the start")
+                    self.close()
+                    self.offset = None
+                    self.resets += 1
+                    buf = b""
+                    continue
+                time.sleep(self.poll_interval)
+                yield None
+                continue
+
+            buf += data
+            pos = 0
+            unpack = self._record_header.unpack_from
+            while len(buf) - pos >= PCAP_RECORD_HEADER_LEN:
+                ts_sec, ts_frac, caplen, wirelen = unpack(buf, pos)
+                end = pos + PCAP_RECORD_HEADER_LEN + caplen
+                if end > len(buf):
+                    break  # rest of this record has not been written yet
+                record_offset = self.offset
+                self.offset += end - pos
+                self.frame_no += 1
+                yield PcapRecord(self.frame_no, ts_sec + ts_frac / self._ts_div, record_offset,
+                                 caplen, wirelen, buf[pos + PCAP_RECORD_HEADER_LEN:end])
+                pos = end
+            buf = buf[pos:]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ThreadedDecompressor(io.RawIOBase):
+    """
+    Read-only stream over a decompressing file object.
+
+    A background thread pulls DECOMPRESS_BLOCK_SIZE blocks from `source` into
+    a bounded queue while the caller parses the previous ones; read() and
+    peek() serve bytes from the queued blocks.
+    """
+
+    def __init__(self, source, block_size=DECOMPRESS_BLOCK_SIZE, depth=DECOMPRESS_QUEUE_BLOCKS):
+        super().__init__()
+        self._source = source
+        self._block_size = block_size
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._buf = b""
+        self._pos = 0
+        self._eof = False
+        self._thread = threading.Thread(target=self._pump, name="capture-decompress", daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        try:
+            while not self._stop.is_set():
+                block = self._source.read(self._block_size)
+                if not block:
+                    break
+                self._put(block)
+        except Exception as e:  # surfaced to the reading thread
+            self._put(e)
+        self._put(None)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fill(self, n):
+        """Make at least `n` unread bytes available unless the stream ends first."""
+        while len(self._buf) - self._pos < n and not self._eof:
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, Exception):
+                self._eof = True
+                raise item
+            else:
+                self._buf = self._buf[self._pos:] + item
+                self._pos = 0
+
+    def readable(self):
+        return True
+
+    def peek(self, n=1):
+        self._fill(n)
+        return self._buf[self._pos:self._pos + n]
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            parts = []
+            while True:
+                part = self.read(self._block_size)
+                if not part:
+                    return b"".join(parts)
+                parts.append(part)
+        self._fill(n)
+        data = self._buf[self._pos:self._pos + n]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._source.close()
+        super().close()
+
+
+def _read_exact(stream, n):
+    data = stream.read(n)
+    return data if len(data) == n else None
+
+
+class PcapStreamReader:
+    """Classic pcap parsed from a stream (e.g. a decompressed .pcap.gz)."""
+
+    def __init__(self, stream, path=None):
+        self.path = path
+        self._stream = stream
+        header = _read_exact(stream, PCAP_GLOBAL_HEADER_LEN)
+        if header is None or header[:4] not in PCAP_MAGICS:
+            stream.close()
+            raise ValueError(f"{path}: not a classic pcap stream")
+        self._endian, self._ts_div = PCAP_MAGICS[header[:4]]
+        _vmaj, _vmin, _tz, _sig, self.snaplen, self.linktype = struct.unpack_from(
+            self._endian + "HHiIII", header, 4)
+        self.linktype &= 0x0FFFFFFF
+        self._record_header = struct.Struct(self._endian + "IIII")
+
+    def __iter__(self):
+        read = self._stream.read
+        unpack = self._record_header.unpack
+        ts_div = self._ts_div
+        frame_no = 0
+        while True:
+            header = read(PCAP_RECORD_HEADER_LEN)
+            if len(header) < PCAP_RECORD_HEADER_LEN:
+                break
+            ts_sec, ts_frac, caplen, wirelen = unpack(header)
+            frame = read(caplen)
+            if len(frame) < caplen:
+                break  # truncated last record
+            frame_no += 1
+            yield PcapRecord(frame_no, ts_sec + ts_frac / ts_div, None, caplen, wirelen, frame)
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _tsresol_divisor(value):
+    """Ticks per second for an if_tsresol option byte."""
+    if value & 0x80:
+        return float(1 << (value & 0x7F))
+    return float(10 ** value)
+
+
+class PcapNgReader:
+    """
+    Streaming pcapng parser.
+
+    Honors every section's byte order and each Interface Description
+    Block's link type, if_tsresol and if_tsoffset. Enhanced, Simple and
+    (obsolete) Packet Blocks yield records; other blocks are skipped.
+    `linktype` is the first interface's link type; frames from interfaces
+    with a different link type are skipped (with one warning each).
+    """
+
+    def __init__(self, stream, path=None):
+        self.path = path
+        self._stream = stream
+        self._endian = "<"
+        self._interfaces = []     # (linktype, snaplen, ticks per second, ts offset)
+        self._pending = []        # packet blocks read while looking for the first IDB
+        self._warned = set()
+        self.linktype = None
+        self.snaplen = None
+
+        block = self._read_block()
+        if block is None or block[0] != int.from_bytes(PCAPNG_SHB_MAGIC, "big"):
+            stream.close()
+            raise ValueError(f"{path}: not a pcapng stream")
+        # IDBs precede the packets that use them, so reading up to the first
+        # one never consumes more than a few metadata blocks.
+        while self.linktype is None:
+            block = self._read_block()
+            if block is None:
+                self.linktype = LINKTYPE_ETHERNET
+                break
+            if block[0] == PCAPNG_IDB:
+                self._add_interface(block[1])
+            else:
+                self._pending.append(block)
+
+    def _read_block(self):
+        """Return (block_type, body) of the next block, or None at end of stream."""
+        header = _read_exact(self._stream, 8)
+        if header is None:
+            return None
+        if header[:4] == PCAPNG_SHB_MAGIC:
+            # new section: its byte order magic decides how to read everything after it
+            bom = _read_exact(self._stream, 4)
+            if bom is None:
+                return None
+            self._endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            total = struct.unpack(self._endian + "I", header[4:])[0]
+            body = _read_exact(self._stream, total - 12)
+            if body is None:
+                return None
+            self._interfaces = []
+            return int.from_bytes(PCAPNG_SHB_MAGIC, "big"), bom + body[:-4]
+        block_type, total = struct.unpack(self._endian + "II", header)
+        if total < 12:
+            return None
+        body = _read_exact(self._stream, total - 8)
+        if body is None:
+            return None
+        return block_type, body[:-4]   # drop the trailing length copy
+
+    def _add_interface(self, body):
+        e = self._endian
+        linktype, _reserved, snaplen = struct.unpack_from(e + "HHI", body, 0)
+        ticks, tsoffset = 1e6, 0
+        off = 8
+        while off + 4 <= len(body):
+            code, length = struct.unpack_from(e + "HH", body, off)
+            off += 4
+            if code == PCAPNG_OPT_END:
+                break
+            if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                ticks = _tsresol_divisor(body[off])
+            elif code == PCAPNG_OPT_IF_TSOFFSET and length >= 8:
+                tsoffset = struct.unpack_from(e + "q", body, off)[0]
+            off += (length + 3) & ~3
+        self._interfaces.append((linktype, snaplen, ticks, tsoffset))
+        if self.linktype is None:
+            self.linktype, self.snaplen = linktype, snaplen
+
+    def _packet(self, block_type, body):
+        """Return (interface_id, ts, caplen, wirelen, frame) for a packet block, else None."""
+        e = self._endian
+        if block_type == PCAPNG_EPB:
+            if_id, ts_high, ts_low, caplen, wirelen = struct.unpack_from(e + "IIIII", body, 0)
+            frame = body[20:20 + caplen]
+        elif block_type == PCAPNG_PB:
+            if_id, _drops, ts_high, ts_low, caplen, wirelen = struct.unpack_from(e + "HHIIII", body, 0)
+            frame = body[20:20 + caplen]
+        elif block_type == PCAPNG_SPB:
+            if_id, ts_high, ts_low = 0, None, None
+            wirelen = struct.unpack_from(e + "I", body, 0)[0]
+            snaplen = self._interfaces[0][1] if self._interfaces else 0
+            caplen = min(wirelen, snaplen) if snaplen else wirelen
+            frame = body[4:4 + caplen]
+        else:
+            return None
+        if if_id >= len(self._interfaces):
+            return None
+        _linktype, _snaplen, ticks, tsoffset = self._interfaces[if_id]
+        ts = None if ts_high is None else ((ts_high << 32) | ts_low) / ticks + tsoffset
+        return if_id, ts, len(frame), wirelen, frame
+
+    def _blocks(self):
+        pending, self._pending = self._pending, []
+        yield from pending
+        while True:
+            block = self._read_block()
+            if block is None:
+                return
+            yield block
+
+    def __iter__(self):
+        frame_no = 0
+        for block_type, body in self._blocks():
+            if block_type == PCAPNG_IDB:
+                self._add_interface(body)
+                continue
+            pkt = self._packet(block_type, body)
+            if pkt is None:
+                continue
+            if_id, ts, caplen, wirelen, frame = pkt
+            frame_no += 1
+            if self._interfaces[if_id][0] != self.linktype:
+                if if_id not in self._warned:
+                    self._warned.add(if_id)
+                    print(f"[!] {self.path}: interface {if_id} has link type "
+                          f"{self._interfaces[if_id][0]} (expected {self.linktype}); skipping its frames")
+                continue
+            yield PcapRecord(frame_no, ts, None, caplen, wirelen, frame)
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_stream(path):
+    """
+    Open `path` for sequential reading, transparently decompressing gzip
+    and zstd input on a background thread. The result supports peek().
+    """
+    f = open(path, "rb")
+    magic = f.peek(4)[:4]
+    if magic[:2] == GZIP_MAGIC:
+        f.close()
+        # gzip.open() owns its file, so closing the reader closes it too
+        return ThreadedDecompressor(gzip.open(path, "rb"))
+    if magic == ZSTD_MAGIC:
+        if not ZSTD_AVAILABLE:
+            f.close()
+            raise ValueError(f"{path}: zstd compressed; install with: pip install zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=True)
+        return ThreadedDecompressor(reader)
+    return f
+
+
+def open_capture(path):
+    """Open a capture with the cheapest reader that understands it."""
+    if capture_magic(path) in PCAP_MAGICS:
+        return MmapPcapReader(path)
+    stream = open_stream(path)
+    magic = stream.peek(4)[:4]
+    if magic in PCAP_MAGICS:
+        return PcapStreamReader(stream, path)
+    if magic == PCAPNG_SHB_MAGIC:
+        return PcapNgReader(stream, path)
+    stream.close()
+    raise ValueError(f"{path}: unrecognized capture format (magic {bytes(magic).hex()})")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+covering_array.py
+
+t-way (pairwise / 3-way) parameter sweeps for NGSetupRequest and PFCP FAR
+test cases.
+
+Each Scenario 1 script tests one value, and trying every combination of
+gNB-ID, TAC, PLMN, SST, PagingDRX ... is a Cartesian product of tens of
+thousands of messages. A t-way covering array holds every combination of
+values for every t parameters in far fewer rows. Most interaction faults
+need only two or three parameters to line up.
+
+covering_array() builds the array with the IPOG strategy: full product of
+the first t parameters, then one parameter at a time, horizontal growth
+(pick the value that covers most missing t-tuples for each existing row)
+and vertical growth (add rows for the tuples still missing). Rows are
+value indices in a NumPy array; stream() maps them onto a domain's values
+and runs the matching encoder:
+
+    ngsetup    Fuzzing/Scenario 1/ngsetup_mutator.py  encode_ngsetup_request()
+    pfcp-far   Fuzzing/Scenario 7/Fake_PFCP_Modification.py  build_pfcp_session_mod_request()
+
+Usage:
+    python covering_array.py --domain ngsetup --strength 2 --show
+    python covering_array.py --domain ngsetup --strength 3 --save ngsetup_3way.npy --out ngsetup_3way.txt
+    python covering_array.py --domain ngsetup --load ngsetup_3way.npy --amf 192.168.42.134
+    python covering_array.py --domain pfcp-far --strength 2 --out far_pairs.txt
+"""
+
+import argparse
+import importlib.util
+import itertools
+import math
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SCENARIO1_MUTATOR = os.path.join(REPO_ROOT, "Fuzzing", "Scenario 1", "ngsetup_mutator.py")
+SCENARIO7_PFCP = os.path.join(REPO_ROOT, "Fuzzing", "Scenario 7", "Fake_PFCP_Modification.py")
+
+
+# --------------------------------------------------------------------
+# Covering array construction (IPOG)
+# --------------------------------------------------------------------
+def covering_array(sizes, strength=2, seed=None):
+    """
+    Return an (n_rows, len(sizes)) int array of value indices in which every
+    combination of values of every `strength` columns appears at least once.
+    """
+    k = len(sizes)
+    t = min(strength, k)
+    if t < 1 or any(s < 1 for s in sizes):
+        raise ValueError("need strength >= 1 and at least one value per parameter")
+    rng = np.random.default_rng(seed)
+
+    # Largest domains first keeps the array small
+    order = sorted(range(k), key=lambda c: -sizes[c])
+    dom = [sizes[c] for c in order]
+    rows = np.array(list(itertools.product(*(range(s) for s in dom[:t]))), dtype=np.int32)
+
+    for i in range(t, k):
+        combos = list(itertools.combinations(range(i), t - 1))
+        strides = []
+        uncovered = []
+        keys = []
+        for combo in combos:
+            radix = [dom[c] for c in combo]
+            stride = np.array([math.prod(radix[j + 1:]) for j in range(len(radix))], dtype=np.int64)
+            strides.append(stride)
+            uncovered.append(np.ones((math.prod(radix), dom[i]), dtype=bool))
+            keys.append(rows[:, list(combo)] @ stride if combo else np.zeros(len(rows), dtype=np.int64))
+
+        # horizontal growth: extend every row with its best value
+        column = np.empty(len(rows), dtype=np.int32)
+        for r in range(len(rows)):
+            gain = np.zeros(dom[i], dtype=np.int32)
+            for unc, key in zip(uncovered, keys):
+                gain += unc[key[r]]
+            best = np.flatnonzero(gain == gain.max())
+            v = best[rng.integers(len(best))] if len(best) > 1 else best[0]
+            column[r] = v
+            for unc, key in zip(uncovered, keys):
+                unc[key[r], v] = False
+        rows = np.column_stack([rows, column])
+
+        # vertical growth: rows (with -1 "don't care") for the tuples still missing
+        extra = np.full((16, i + 1), -1, dtype=np.int32)
+        n_extra = 0
+        for combo, stride, unc in zip(combos, strides, uncovered):
+            cols = list(combo) + [i]
+            for key, v in zip(*np.nonzero(unc)):
+                want = [int(key // s) % dom[c] for c, s in zip(combo, stride)] + [int(v)]
+                block = extra[:n_extra, cols]
+                fits = ((block == want) | (block == -1)).all(axis=1)
+                hit = np.flatnonzero(fits)
+                if len(hit):
+                    extra[hit[0], cols] = want
+                    continue
+                if n_extra == len(extra):
+                    extra = np.vstack([extra, np.full_like(extra, -1)])
+                extra[n_extra, cols] = want
+                n_extra += 1
+        if n_extra:
+            extra = extra[:n_extra]
+            free = extra == -1
+            fill = rng.integers(0, np.array(dom[:i + 1]), size=extra.shape)
+            extra[free] = fill[free]
+            rows = np.vstack([rows, extra])
+
+    return rows[:, np.argsort(order)]
+
+
+def coverage(rows, sizes, strength=2):
+    """(covered, total) t-tuples of `rows`; equal when the array is complete."""
+    covered = total = 0
+    for combo in itertools.combinations(range(len(sizes)), strength):
+        radix = [sizes[c] for c in combo]
+        stride = np.array([math.prod(radix[j + 1:]) for j in range(len(radix))], dtype=np.int64)
+        covered += len(np.unique(rows[:, list(combo)] @ stride))
+        total += math.prod(radix)
+    return covered, total
+
+
+# --------------------------------------------------------------------
+# Parameter domains and their encoders
+# --------------------------------------------------------------------
+# Every gNB-ID value fits the shortest gNB-ID length, so any row is valid.
+NGSETUP_DOMAIN = {
+    "gnb_id": [0, 1, 0x51, 0x61, (1 << 22) - 1],
+    "gnb_id_bits": [22, 24, 28, 32],
+    "ran_node_name": ["safemalwarescanner123", "A", "A" * 150, "A" * 151, None],
+    "tac": [b"\x00\x00\x00", b"\x00\x00\x01", b"\xff\xff\xff"],
+    # PLMNIdentity of 999-70, 001-01, 000-00, 999-999
+    "plmn": [b"\x99\xf9\x07", b"\x00\xf1\x10", b"\x00\xf0\x00", b"\x99\x99\x99"],
+    "sst": [0, 1, 2, 3, 4, 255],
+    "paging_drx": [0, 1, 2, 3],
+}
+
+PFCP_FAR_DOMAIN = {
+    "seid": [0, 1, 0xFFFFFFFFFFFFFFFF],
+    "far_id": [0, 1, 2, 0xFFFFFFFF],
+    "apply_action": ["FORW", "DROP", "BUFF", "NOCP", "DUPL"],
+    "dst_ipv4": [None, "10.0.0.1", "0.0.0.0", "255.255.255.255"],
+    "teid": [None, 0, 1, 0xFFFFFFFF],
+    "dst_port": [None, 2152, 0, 65535],
+}
+
+
+def load_module(name, path):
+    """Import a repo script by path (the Fuzzing scripts are not packages)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # registered first: dataclasses resolve their module through sys.modules
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def ngsetup_encoder():
+    s1 = load_module("scenario1_ngsetup_mutator", SCENARIO1_MUTATOR)
+
+    def encode(case):
+        case = dict(case)
+        case["slices"] = ((case.pop("sst"), None),)
+        return s1.encode_ngsetup_request(s1.NGSetupFields(**case))
+    return encode
+
+
+def pfcp_far_encoder():
+    s7 = load_module("scenario7_fake_pfcp", SCENARIO7_PFCP)
+
+    def encode(case):
+        pkt = s7.build_pfcp_session_mod_request(s7.PFCPModifySpec(**case))
+        return bytes(pkt[s7.PFCP])
+    return encode
+
+
+DOMAINS = {
+    "ngsetup": (NGSETUP_DOMAIN, ngsetup_encoder),
+    "pfcp-far": (PFCP_FAR_DOMAIN, pfcp_far_encoder),
+}
+
+
+def stream(domain, rows, encode):
+    """Yield (case, payload) for every row of `rows` (value indices into `domain`)."""
+    names = list(domain)
+    values = [domain[name] for name in names]
+    for row in rows.tolist():
+        case = {name: vals[j] for name, vals, j in zip(names, values, row)}
+        yield case, encode(case)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="t-way covering arrays for NGSetupRequest / PFCP FAR sweeps")
+    parser.add_argument("--domain", choices=sorted(DOMAINS), default="ngsetup")
+    parser.add_argument("--strength", type=int, default=2, help="t: 2 = pairwise, 3 = 3-way")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--load", help="reuse rows saved with --save instead of building")
+    parser.add_argument("--save", help="save the rows as a .npy file")
+    parser.add_argument("--show", action="store_true", help="print every test case")
+    parser.add_argument("--out", help="write encoded payloads as '<row>\\t<hex>' lines")
+    parser.add_argument("--amf", help="send the NGSetupRequests to this AMF (ngsetup domain)")
+    parser.add_argument("--port", type=int, default=38412)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("[!] numpy is required (pip install numpy)")
+        return 1
+
+    domain, make_encoder = DOMAINS[args.domain]
+    sizes = [len(v) for v in domain.values()]
+    product = math.prod(sizes)
+
+    if args.load:
+        rows = np.load(args.load)
+        if rows.ndim != 2 or rows.shape[1] != len(sizes) or (rows >= np.array(sizes)).any():
+            print(f"[!] {args.load} does not match the {args.domain} domain")
+            return 1
+        print(f"[+] Loaded {len(rows)} rows from {args.load}")
+    else:
+        start = time.perf_counter()
+        rows = covering_array(sizes, args.strength, args.seed)
+        print(f"[+] {args.strength}-way covering array: {len(rows)} rows in "
+              f"{time.perf_counter() - start:.2f}s")
+    covered, total = coverage(rows, sizes, args.strength)
+    print(f"[*] {args.domain}: {len(sizes)} parameters, {product} combinations in the full product; "
+          f"{len(rows)} rows ({100.0 * len(rows) / product:.2f}%) cover {covered}/{total} "
+          f"{args.strength}-tuples")
+    if args.save:
+        np.save(args.save, rows)
+        print(f"[+] Saved rows to {args.save}")
+
+    if not (args.show or args.out or args.amf):
+        return 0
+
+    encode = make_encoder()
+    cases = stream(domain, rows, encode)
+    if args.amf:
+        if args.domain != "ngsetup":
+            print("[!] --amf only applies to the ngsetup domain")
+            return 1
+        s1 = load_module("scenario1_ngsetup_mutator", SCENARIO1_MUTATOR)
+        if not s1.SCTP_AVAILABLE:
+            print("[!] pysctp is not installed (pip install pysctp)")
+            return 1
+        labelled = ((f"row{n}", payload) for n, (_, payload) in enumerate(cases))
+        sent, responses, reconnects, dropped = s1.send_loop(labelled, args.amf, args.port)
+        print(f"[+] Sent {sent} requests, {responses} responses, {reconnects} reconnects, {dropped} dropped")
+        return 0
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    start = time.perf_counter()
+    n = 0
+    try:
+        for n, (case, payload) in enumerate(cases, 1):
+            if args.show:
+                shown = {k: (v.hex() if isinstance(v, bytes) else v) for k, v in case.items()}
+                print(f"[*] {n - 1:4d} {len(payload):5d} bytes  {shown}")
+            if out is not None:
+                out.write(f"{n - 1}\t{payload.hex()}\n")
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"[+] Encoded {n} test cases in {elapsed:.2f}s")
+    if args.out:
+        print(f"[+] Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
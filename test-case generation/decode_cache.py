@@ -0,0 +1,139 @@
+"""
+decode_cache.py
+
+Digest-keyed cache for decoded NGAP values.
+
+Lab captures repeat the same NGAP payloads over and over (identical
+NGSetupRequests after every gNB restart, repeated paging), and every repeat
+used to be decoded again. DecodeCache keys the extracted values by a
+BLAKE2b digest of the payload and keeps the most recently used entries in
+memory. With a database path it also keeps a SQLite tier, so later runs
+over the same captures skip the ASN.1 decode entirely.
+
+Entries are stamped with a version; bump it when the extraction logic
+changes and the old rows are simply ignored.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 4096
+COMMIT_EVERY = 256
+
+# Sentinel returned by get() on a miss (None is a valid cached value).
+MISS = object()
+
+
+def payload_digest(payload):
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class DecodeCache:
+    """
+    Bounded LRU of payload digest -> extracted values, with an optional
+    SQLite tier at `db_path`.
+
+    Safe to inherit into forked worker processes: each process opens its own
+    database connection, and rows queued in the parent are left to it.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, db_path=None, version=1):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.version = version
+        self._entries = OrderedDict()
+        self._conn = None
+        self._pid = None
+        self._pending = []
+        self.lookups = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self.db_path is not None
+
+    def _db(self):
+        if self._pid != os.getpid():
+            # first use, or a forked worker: never share the parent's connection
+            self._conn = None
+            self._pending = []
+            self._pid = os.getpid()
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS ngap_decode "
+                               "(digest BLOB PRIMARY KEY, version INTEGER NOT NULL, value TEXT)")
+        return self._conn
+
+    def _remember(self, digest, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[digest] = value
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, payload):
+        """Return the cached values for `payload` (a copy), or MISS."""
+        if not self.enabled:
+            return MISS
+        self.lookups += 1
+        digest = payload_digest(payload)
+        value = self._entries.get(digest, MISS)
+        if value is not MISS:
+            self._entries.move_to_end(digest)
+            self.hits += 1
+        elif self.db_path is not None:
+            row = self._db().execute("SELECT value FROM ngap_decode WHERE digest = ? AND version = ?",
+                                     (digest, self.version)).fetchone()
+            if row is None:
+                return MISS
+            value = json.loads(row[0])
+            self._remember(digest, value)
+            self.disk_hits += 1
+        else:
+            return MISS
+        return dict(value) if value else value
+
+    def put(self, payload, value):
+        if not self.enabled:
+            return
+        digest = payload_digest(payload)
+        self._remember(digest, dict(value) if value else value)
+        if self.db_path is not None:
+            self._db()
+            self._pending.append((digest, self.version, json.dumps(value)))
+            if len(self._pending) >= COMMIT_EVERY:
+                self.flush()
+
+    def flush(self):
+        """Write queued rows to the SQLite tier."""
+        if self.db_path is None or not self._pending or self._pid != os.getpid():
+            return
+        with self._db() as conn:
+            conn.executemany("INSERT OR REPLACE INTO ngap_decode (digest, version, value) VALUES (?, ?, ?)",
+                             self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    @property
+    def misses(self):
+        return self.lookups - self.hits - self.disk_hits
+
+    def summary(self):
+        rate = 100.0 * (self.hits + self.disk_hits) / self.lookups if self.lookups else 0.0
+        text = (f"Decode cache: {self.lookups} lookups, {self.hits} memory hits, "
+                f"{self.disk_hits} disk hits, {self.misses} misses ({rate:.1f}% hit rate)")
+        if self.evictions:
+            text += f", {self.evictions} evicted"
+        return text
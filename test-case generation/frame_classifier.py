@@ -0,0 +1,150 @@
+"""
+frame_classifier.py
+
+Cheap pre-dissection classifier for offline captures.
+
+Lab captures are mostly ARP, GTP-U user plane, SBI HTTP/2 and ICMP. Looking
+at the fixed-offset Ethernet / IPv4 / L4 header bytes is enough to tell
+those apart, so only the frames in the configured pass classes (by default
+SCTP and PFCP) reach Scapy or the SCTP fast path; everything else is
+counted and dropped.
+"""
+
+import struct
+from collections import Counter
+
+LINKTYPE_ETHERNET = 1
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_SCTP = 132
+IPPROTO_TUNNELS = (4, 41, 47)   # IP-in-IP, 6in4, GRE
+
+PFCP_PORT = 8805
+GTPU_PORT = 2152
+# Ports the 5GC SBI (HTTP/2) listens on in the usual open-source cores.
+SBI_PORTS = (80, 443, 7777, 8080, 29510, 29518)
+
+CLASS_SCTP = "sctp"
+CLASS_PFCP = "pfcp"
+CLASS_TUNNEL = "tunnel"      # may carry SCTP; the fast path hands these to Scapy
+CLASS_UNKNOWN = "unknown"    # non-Ethernet link type or truncated headers
+CLASS_ARP = "arp"
+CLASS_GTPU = "gtpu"
+CLASS_SBI = "sbi"
+CLASS_ICMP = "icmp"
+CLASS_IPV6 = "ipv6"
+CLASS_TCP = "tcp"
+CLASS_UDP = "udp"
+CLASS_OTHER = "other"
+
+CLASSES = (
+    CLASS_SCTP, CLASS_PFCP, CLASS_TUNNEL, CLASS_UNKNOWN, CLASS_ARP, CLASS_GTPU,
+    CLASS_SBI, CLASS_ICMP, CLASS_IPV6, CLASS_TCP, CLASS_UDP, CLASS_OTHER,
+)
+
+# Tunnels and unknown frames are passed on so nothing that might hold SCTP
+# is lost; drop them from the pass list to be stricter.
+DEFAULT_PASS = (CLASS_SCTP, CLASS_PFCP, CLASS_TUNNEL, CLASS_UNKNOWN)
+
+_unpack_u16 = struct.Struct("!H").unpack_from
+_unpack_ports = struct.Struct("!HH").unpack_from
+
+
+def classify(frame, linktype=LINKTYPE_ETHERNET, sbi_ports=SBI_PORTS):
+    """Return the class name of one raw frame from its fixed-offset header bytes."""
+    if linktype != LINKTYPE_ETHERNET:
+        return CLASS_UNKNOWN
+    flen = len(frame)
+    if flen < 14:
+        return CLASS_UNKNOWN
+    off = 12
+    ethertype = _unpack_u16(frame, off)[0]
+    while ethertype in ETHERTYPE_VLAN:
+        off += 4
+        if flen < off + 2:
+            return CLASS_UNKNOWN
+        ethertype = _unpack_u16(frame, off)[0]
+    off += 2
+
+    if ethertype == ETHERTYPE_ARP:
+        return CLASS_ARP
+    if ethertype == ETHERTYPE_IPV6:
+        return CLASS_IPV6
+    if ethertype != ETHERTYPE_IPV4:
+        return CLASS_OTHER
+    if flen < off + 20:
+        return CLASS_UNKNOWN
+
+    proto = frame[off + 9]
+    if proto == IPPROTO_SCTP:
+        return CLASS_SCTP      # every fragment carries the protocol byte
+    if proto in IPPROTO_TUNNELS:
+        return CLASS_TUNNEL
+    if proto == IPPROTO_ICMP:
+        return CLASS_ICMP
+    if proto not in (IPPROTO_UDP, IPPROTO_TCP):
+        return CLASS_OTHER
+
+    l4 = off + (frame[off] & 0x0F) * 4
+    if _unpack_u16(frame, off + 6)[0] & 0x1FFF or flen < l4 + 4:
+        # non-first fragment or truncated: no ports to look at
+        return CLASS_UDP if proto == IPPROTO_UDP else CLASS_TCP
+    sport, dport = _unpack_ports(frame, l4)
+    if proto == IPPROTO_UDP:
+        if sport == PFCP_PORT or dport == PFCP_PORT:
+            return CLASS_PFCP
+        if sport == GTPU_PORT or dport == GTPU_PORT:
+            return CLASS_GTPU
+        return CLASS_UDP
+    if sport in sbi_ports or dport in sbi_ports:
+        return CLASS_SBI
+    return CLASS_TCP
+
+
+class FrameClassifier:
+    """
+    Filter raw frames down to the pass classes and count every class seen.
+
+    `filter()` wraps an iterable of raw frames; the counters are complete
+    once it has been exhausted.
+    """
+
+    def __init__(self, passes=DEFAULT_PASS, sbi_ports=SBI_PORTS, linktype=LINKTYPE_ETHERNET):
+        unknown = set(passes) - set(CLASSES)
+        if unknown:
+            raise ValueError(f"unknown frame class(es): {', '.join(sorted(unknown))}")
+        self.passes = frozenset(passes)
+        self.sbi_ports = tuple(sbi_ports)
+        self.linktype = linktype
+        self.counts = Counter()
+
+    def wants(self, frame):
+        cls = classify(frame, self.linktype, self.sbi_ports)
+        self.counts[cls] += 1
+        return cls in self.passes
+
+    def filter(self, frames):
+        for frame in frames:
+            if self.wants(frame):
+                yield frame
+
+    @property
+    def passed(self):
+        return sum(n for cls, n in self.counts.items() if cls in self.passes)
+
+    @property
+    def skipped(self):
+        return sum(n for cls, n in self.counts.items() if cls not in self.passes)
+
+    def summary(self):
+        skipped = ", ".join(f"{cls}={n}" for cls, n in self.counts.most_common()
+                            if cls not in self.passes)
+        return (f"Classifier passed {self.passed} of {self.passed + self.skipped} frames, "
+                f"skipped {self.skipped}" + (f" ({skipped})" if skipped else ""))
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+mock_amf.py
+
+Local mock AMF for benchmarking the NGAP drivers without a 5G core.
+
+The Scenario 1 / 5 drivers (ngsetup_mutator.py, ngap_session_fuzzer.py,
+Fake_PFCP_Modification.py s5-ngap) need an AMF to talk to. This server
+accepts any number of associations on port 38412 in one selectors loop,
+decodes every incoming PDU with the project's fast decoders (triage,
+decode_ngsetup, decode_ue_ngap_ids; --full-decode adds a pycrate decode)
+and answers the way an AMF would:
+
+    NGSetupRequest              NGSetupResponse (GUAMI / PLMN of the request), or NGSetupFailure
+    RANConfigurationUpdate      RANConfigurationUpdateAcknowledge, or RANConfigurationUpdateFailure
+    InitialUEMessage            DownlinkNASTransport (Authentication Request) with a new AMF-UE-NGAP-ID
+    UplinkNASTransport          DownlinkNASTransport on the same UE NGAP IDs
+    UEContextReleaseRequest     UEContextReleaseCommand on the same UE NGAP IDs
+    undecodable PDU             ErrorIndication (transfer-syntax-error)
+
+Anything else is counted and left unanswered. --setup-fail-rate and
+--fail-rate answer that fraction of NGSetupRequests / other class 1
+requests (RANConfigurationUpdate) with the unsuccessful outcome; the
+drivers treat a failed NGSetup on reconnect as the AMF giving up, so keep
+--setup-fail-rate for testing exactly that. Replies are held back by
+--latency +- --jitter milliseconds.
+Faults: --abort-rate aborts the association (SO_LINGER 0, so the peer
+sees a reset) instead of answering, --timeout-rate drops the answer,
+--abort-after aborts every association after N PDUs.
+
+--transport tcp (or auto, when pysctp or kernel SCTP is missing) speaks
+ngap_transport's length-prefixed TCP framing, which the drivers select
+with their own --transport tcp, so the whole loop runs on any Linux box.
+
+Usage:
+    python3 mock_amf.py
+    python3 mock_amf.py --transport tcp --latency 5 --jitter 2 --duration 60
+    python3 mock_amf.py --fail-rate 0.1 --abort-rate 0.001 --timeout-rate 0.01
+    python3 mock_amf.py --setup-fail-rate 1      # every NGSetupRequest fails
+    python3 ../Fuzzing/Scenario\\ 1/ngap_session_fuzzer.py --amf 127.0.0.1 --transport tcp --count 100000
+"""
+
+import argparse
+import heapq
+import random
+import selectors
+import socket
+import struct
+import time
+from collections import Counter, deque
+
+from ngap_fastpath import (FALLBACK, NGSETUP_REQUEST, PDU_INITIATING, decode_ngsetup,
+                           decode_ue_ngap_ids, triage)
+from ngap_pdu_pool import NGAP_AVAILABLE, decode_aper, encode_aper
+from ngap_template import DOWNLINK_NAS_TRANSPORT, NGSETUP_RESPONSE, UE_CONTEXT_RELEASE_COMMAND
+from ngap_transport import NGAP_PORT, TRANSPORTS, describe, open_socket, resolve_transport
+from sctp_fastpath import NGAP_PPID
+
+PROC_ERROR_INDICATION = 9
+PROC_INITIAL_UE_MESSAGE = 15
+PROC_NG_SETUP = 21
+PROC_RAN_CONFIGURATION_UPDATE = 35
+PROC_UE_CONTEXT_RELEASE = 41
+PROC_UE_CONTEXT_RELEASE_REQUEST = 42
+PROC_UPLINK_NAS_TRANSPORT = 46
+PROC_DOWNLINK_NAS_TRANSPORT = 4
+UE_PROCEDURES = frozenset((PROC_DOWNLINK_NAS_TRANSPORT, PROC_UE_CONTEXT_RELEASE))
+
+REPORT_EVERY = 10.0
+RECV_SIZE = 65536
+MAX_RESPONSES = 4096         # cached NGSetupResponses, one per (MCC, MNC, SST) seen
+
+# NAS 5GMM Authentication Request: ngKSI 0, ABBA 0000, zero RAND and AUTN
+NAS_AUTHENTICATION_REQUEST = (bytes.fromhex("7e005600020000" "21") + bytes(16) +
+                              bytes.fromhex("2010") + bytes(16))
+
+
+def _plmn_identity(mcc, mnc):
+    """MCC / MNC digit strings -> 3-byte PLMNIdentity."""
+    mnc = mnc if len(mnc) == 3 else mnc + "f"
+    return bytes.fromhex(mcc[1] + mcc[0] + mnc[2] + mcc[2] + mnc[1] + mnc[0])
+
+
+def _message(kind, proc, name, ies, crit="reject"):
+    return (kind, {"procedureCode": proc, "criticality": crit, "value": (name, {"protocolIEs": ies})})
+
+
+def _cause(dom, name):
+    return {"id": 15, "criticality": "ignore", "value": ("Cause", (dom, name))}
+
+
+class Connection:
+    """One accepted association and what happened on it."""
+    __slots__ = ("sock", "peer", "pdus", "outbox")
+
+    def __init__(self, sock, peer):
+        self.sock = sock
+        self.peer = peer
+        self.pdus = 0
+        self.outbox = deque()     # (payload, stream) the socket did not take yet
+
+
+class MockAmf:
+    """
+    Event-driven mock AMF. Replies are scheduled on a heap by due time, so
+    --latency delays answers without stalling the reads of other
+    associations.
+    """
+
+    def __init__(self, host="0.0.0.0", port=NGAP_PORT, transport="auto", mcc="999", mnc="70", sst=1,
+                 latency=0.0, jitter=0.0, setup_fail_rate=0.0, fail_rate=0.0, abort_rate=0.0,
+                 timeout_rate=0.0, abort_after=None, full_decode=False, streams=8, backlog=1024, seed=None):
+        self.host = host
+        self.port = port
+        self.transport = resolve_transport(transport)
+        self.mcc = mcc
+        self.mnc = mnc
+        self.sst = sst
+        self.latency = latency / 1000.0
+        self.jitter = jitter / 1000.0
+        self.setup_fail_rate = setup_fail_rate
+        self.fail_rate = fail_rate
+        self.abort_rate = abort_rate
+        self.timeout_rate = timeout_rate
+        self.abort_after = abort_after
+        self.full_decode = full_decode
+        self.streams = streams
+        self.backlog = backlog
+        self.rng = random.Random(seed)
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self.conns = {}            # connection id -> Connection
+        self.next_id = 1
+        self.due = []              # heap of (due time, seq, connection id, payload, stream)
+        self.seq = 0
+        self.next_amf_ue_id = 1
+        self.responses = {}        # (mcc, mnc, sst) -> NGSetupResponse
+        self.received = Counter()  # describe() of every PDU
+        self.replies = Counter()
+        self.accepted = 0
+        self.peak = 0
+        self.aborted = 0
+        self.closed = 0
+        self.dropped = 0
+        self.undecodable = 0
+        self.first = self.last = None     # arrival of the first / latest PDU
+        self._cache_replies()
+
+    # ----------------------------------------------------------------
+    # replies
+    # ----------------------------------------------------------------
+    def _cache_replies(self):
+        """PDUs that never change, encoded once with pycrate."""
+        self.ngsetup_failure = encode_aper(_message(
+            "unsuccessfulOutcome", PROC_NG_SETUP, "NGSetupFailure", [_cause("misc", "unspecified")]))
+        self.ran_config_ack = encode_aper(_message(
+            "successfulOutcome", PROC_RAN_CONFIGURATION_UPDATE, "RANConfigurationUpdateAcknowledge", []))
+        self.ran_config_failure = encode_aper(_message(
+            "unsuccessfulOutcome", PROC_RAN_CONFIGURATION_UPDATE, "RANConfigurationUpdateFailure",
+            [_cause("misc", "unspecified")]))
+        self.error_indication = encode_aper(_message(
+            "initiatingMessage", PROC_ERROR_INDICATION, "ErrorIndication",
+            [_cause("protocol", "transfer-syntax-error")], crit="ignore"))
+
+    def _ngsetup_response(self, payload):
+        values = decode_ngsetup(payload)
+        if values is FALLBACK or not values:
+            values = {}
+        mcc, mnc = values.get("mcc") or self.mcc, values.get("mnc") or self.mnc
+        sst = int(values["sst"], 16) if "sst" in values else self.sst
+        key = (mcc, mnc, sst)
+        response = self.responses.get(key)
+        if response is None:
+            if len(self.responses) >= MAX_RESPONSES:
+                self.responses.clear()
+            try:
+                plmn = _plmn_identity(mcc, mnc)
+            except (ValueError, IndexError):
+                plmn = _plmn_identity(self.mcc, self.mnc)
+            response = self.responses[key] = NGSETUP_RESPONSE.encode((True,), {
+                "amf_name": "mock-amf", "guami_plmn": plmn, "region": 1, "set": 1, "pointer": 0,
+                "capacity": 255, "plmn_0": plmn, "sst_0": bytes([sst])})
+        return response
+
+    def _ue_ids(self, ids):
+        return {"amf_ue_ngap_id": ids[0], "ran_ue_ngap_id": ids[1]}
+
+    def reply(self, payload):
+        """
+        (answer, stream) for one incoming PDU, or None when it goes
+        unanswered. UE-associated answers go on stream 1, the rest on 0.
+        """
+        answer = self._answer(payload)
+        if answer is None:
+            return None
+        return answer, (1 if self.streams > 1 and answer[1] in UE_PROCEDURES else 0)
+
+    def _answer(self, payload):
+        key = triage(payload)
+        if self.full_decode:
+            try:
+                decode_aper(payload)
+            except Exception:
+                key = None
+        if key is None:
+            self.undecodable += 1
+            return self.error_indication
+        if key[0] != PDU_INITIATING:
+            return None
+        proc = key[1]
+        if key == NGSETUP_REQUEST:
+            if self.rng.random() < self.setup_fail_rate:
+                return self.ngsetup_failure
+            return self._ngsetup_response(payload)
+        if proc == PROC_RAN_CONFIGURATION_UPDATE:
+            return self.ran_config_failure if self.rng.random() < self.fail_rate else self.ran_config_ack
+        if proc not in (PROC_INITIAL_UE_MESSAGE, PROC_UPLINK_NAS_TRANSPORT,
+                        PROC_UE_CONTEXT_RELEASE, PROC_UE_CONTEXT_RELEASE_REQUEST):
+            return None
+        ids = decode_ue_ngap_ids(payload)
+        if ids is None or ids[1] is None:
+            self.undecodable += 1
+            return self.error_indication
+        try:
+            if proc == PROC_INITIAL_UE_MESSAGE:
+                ids = (self.next_amf_ue_id, ids[1])
+                self.next_amf_ue_id = (self.next_amf_ue_id + 1) % (1 << 40)
+                return DOWNLINK_NAS_TRANSPORT.encode((NAS_AUTHENTICATION_REQUEST,), self._ue_ids(ids))
+            if ids[0] is None:
+                self.undecodable += 1
+                return self.error_indication
+            if proc == PROC_UPLINK_NAS_TRANSPORT:
+                return DOWNLINK_NAS_TRANSPORT.encode((NAS_AUTHENTICATION_REQUEST,), self._ue_ids(ids))
+            return UE_CONTEXT_RELEASE_COMMAND.encode(("radioNetwork", "unspecified"), self._ue_ids(ids))
+        except Exception:
+            # an AMF-UE-NGAP-ID past 2^40-1 decodes but cannot be encoded back
+            self.undecodable += 1
+            return self.error_indication
+
+    # ----------------------------------------------------------------
+    # event loop
+    # ----------------------------------------------------------------
+    def _listen(self):
+        s = open_socket(self.transport)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.transport == "sctp":
+            s.initparams.num_ostreams = self.streams
+            s.initparams.max_instreams = self.streams
+        s.bind((self.host, self.port))
+        s.listen(self.backlog)
+        s.setblocking(False)
+        self.selector.register(s.fileno(), selectors.EVENT_READ, None)
+        self.listener = s
+
+    def _accept(self):
+        while True:
+            try:
+                sock, peer = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            cid = self.next_id
+            self.next_id += 1
+            self.conns[cid] = Connection(sock, f"{peer[0]}:{peer[1]}")
+            self.selector.register(sock.fileno(), selectors.EVENT_READ, cid)
+            self.accepted += 1
+            self.peak = max(self.peak, len(self.conns))
+
+    def _close(self, cid, abort=False):
+        conn = self.conns.pop(cid, None)
+        if conn is None:
+            return     # already closed earlier in this round
+        self.selector.unregister(conn.sock.fileno())
+        if abort:
+            # RST (TCP) / ABORT (SCTP) instead of an orderly shutdown
+            conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.aborted += 1
+        else:
+            self.closed += 1
+        conn.sock.close()
+
+    def _read(self, cid):
+        conn = self.conns[cid]
+        while cid in self.conns:
+            try:
+                data = conn.sock.recv(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self._close(cid)
+                return
+            if not data:
+                self._close(cid)
+                return
+            conn.pdus += 1
+            self.received[describe(data)] += 1
+            self.last = time.monotonic()
+            if self.first is None:
+                self.first = self.last
+            if (self.abort_after and conn.pdus >= self.abort_after) or self.rng.random() < self.abort_rate:
+                self._close(cid, abort=True)
+                return
+            reply = self.reply(data)
+            if reply is None:
+                continue
+            if self.rng.random() < self.timeout_rate:
+                self.dropped += 1
+                continue
+            answer, stream = reply
+            delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            if delay > 0:
+                self.seq += 1
+                heapq.heappush(self.due, (time.monotonic() + delay, self.seq, cid, answer, stream))
+            elif not self._send(cid, answer, stream):
+                return
+
+    def _send(self, cid, payload, stream):
+        """Send or queue one answer; False when the association is gone (or just failed)."""
+        conn = self.conns.get(cid)
+        if conn is None:
+            return False     # association went away while the answer was delayed
+        if conn.outbox:
+            conn.outbox.append((payload, stream))
+            return True
+        try:
+            conn.sock.sctp_send(payload, ppid=socket.htonl(NGAP_PPID), stream=stream)
+        except (BlockingIOError, InterruptedError):
+            conn.outbox.append((payload, stream))
+            self.selector.modify(conn.sock.fileno(), selectors.EVENT_READ | selectors.EVENT_WRITE, cid)
+            return True
+        except OSError:
+            self._close(cid)
+            return False
+        self.replies[describe(payload)] += 1
+        return True
+
+    def _write(self, cid):
+        conn = self.conns[cid]
+        while conn.outbox:
+            payload, stream = conn.outbox[0]
+            try:
+                conn.sock.sctp_send(payload, ppid=socket.htonl(NGAP_PPID), stream=stream)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self._close(cid)
+                return
+            conn.outbox.popleft()
+            self.replies[describe(payload)] += 1
+        self.selector.modify(conn.sock.fileno(), selectors.EVENT_READ, cid)
+
+    def _send_due(self):
+        now = time.monotonic()
+        while self.due and self.due[0][0] <= now:
+            _, _, cid, payload, stream = heapq.heappop(self.due)
+            self._send(cid, payload, stream)
+
+    def serve(self, duration=None):
+        """Run until `duration` seconds have passed (forever when None) or Ctrl-C."""
+        self._listen()
+        print(f"[+] Mock AMF listening on {self.host}:{self.port}/{self.transport} "
+              f"(latency {self.latency * 1000:.1f}+-{self.jitter * 1000:.1f} ms, "
+              f"fail {self.setup_fail_rate} / {self.fail_rate}, "
+              f"abort {self.abort_rate}, timeout {self.timeout_rate})")
+        last_report = time.monotonic()
+        deadline = None if duration is None else last_report + duration
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                timeout = 0.5
+                if self.due:
+                    timeout = max(0.0, min(timeout, self.due[0][0] - time.monotonic()))
+                for key, events in self.selector.select(timeout):
+                    cid = key.data
+                    if cid is None:
+                        self._accept()
+                        continue
+                    if events & selectors.EVENT_WRITE and cid in self.conns:
+                        self._write(cid)
+                    if events & selectors.EVENT_READ and cid in self.conns:
+                        self._read(cid)
+                self._send_due()
+                if time.monotonic() - last_report >= REPORT_EVERY:
+                    last_report = time.monotonic()
+                    print(f"[*] {self.summary()}")
+        except KeyboardInterrupt:
+            print("\n[*] Stopping")
+        finally:
+            for cid in list(self.conns):
+                self._close(cid)
+            self.selector.close()
+            self.listener.close()
+
+    def summary(self):
+        received = sum(self.received.values())
+        elapsed = self.last - self.first if self.first is not None else 0.0
+        rate = f" in {elapsed:.2f}s ({received / elapsed:.0f}/s)" if elapsed else ""
+        return (f"{received} PDUs received{rate}, {sum(self.replies.values())} answered, "
+                f"{self.dropped} answers dropped, {self.undecodable} undecodable; "
+                f"{self.accepted} associations (peak {self.peak}, {len(self.conns)} open), "
+                f"{self.aborted} aborted, {self.closed} closed by peer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock AMF for benchmarking NGAP drivers")
+    parser.add_argument("--listen", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=NGAP_PORT)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="auto",
+                        help="sctp, tcp (length-prefixed NGAP) or auto (TCP when SCTP is missing)")
+    parser.add_argument("--mcc", default="999", help="GUAMI PLMN when the request carries none")
+    parser.add_argument("--mnc", default="70")
+    parser.add_argument("--sst", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="answer delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- ms added to --latency")
+    parser.add_argument("--setup-fail-rate", type=float, default=0.0,
+                        help="fraction of NGSetupRequests answered with NGSetupFailure")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="fraction of RANConfigurationUpdates answered unsuccessfully")
+    parser.add_argument("--abort-rate", type=float, default=0.0, help="fraction of PDUs that abort the association")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of answers never sent")
+    parser.add_argument("--abort-after", type=int, help="abort every association after N PDUs")
+    parser.add_argument("--full-decode", action="store_true", help="also decode every PDU with pycrate")
+    parser.add_argument("--streams", type=int, default=8, help="SCTP streams per association")
+    parser.add_argument("--duration", type=float, help="stop after N seconds")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if not NGAP_AVAILABLE:
+        print("[!] pycrate_asn1dir not available (needed to encode the answers)")
+        return 1
+    try:
+        server = MockAmf(args.listen, args.port, args.transport, args.mcc, args.mnc, args.sst,
+                         args.latency, args.jitter, args.setup_fail_rate, args.fail_rate, args.abort_rate,
+                         args.timeout_rate, args.abort_after, args.full_decode, args.streams, seed=args.seed)
+        server.serve(args.duration)
+    except (OSError, RuntimeError) as e:
+        print(f"[!] Could not listen on {args.listen}:{args.port}: {e}")
+        return 1
+    print(f"[+] {server.summary()}")
+    for name, title in ((server.received, "Received"), (server.replies, "Answered")):
+        print(f"[*] {title}:")
+        for answer, n in name.most_common():
+            print(f"[*]   {n:8d}  {answer}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
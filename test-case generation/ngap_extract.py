@@ -0,0 +1,361 @@
+"""
+ngap_extract.py
+
+Declarative extraction of values from decoded (pycrate) NGAP messages.
+
+Every extracted field is a table entry: output name(s), one or more path
+selectors tried in order, and a converter. A path names the message and
+then walks the pycrate value tree:
+
+    NGSetupRequest/protocolIEs[id=27]/globalGNB-ID/pLMNIdentity
+
+  name        dict key, or the alternative of a CHOICE (("name", value) tuple)
+  [n]         n-th item of a SEQUENCE OF
+  [key=val]   first item of a SEQUENCE OF whose `key` equals `val`; on a
+              ProtocolIE-Field this yields the IE value itself
+
+Paths are compiled once into a trie per message, so one walk over the
+value tree pulls every registered field and shared prefixes (the IE list,
+a GUAMI) are visited once. The IE list is scanned once per message no
+matter how many IEs are selected from it. Extraction cost follows the
+fields asked for, not the number of procedures in the table.
+
+Usage:
+    from ngap_extract import extract_values
+    values = extract_values(pdu_val)                  # every registered field
+    values = extract_values(pdu_val, ("mcc", "mnc"))  # just these
+"""
+
+import re
+from functools import lru_cache
+
+from ngap_fastpath import decode_plmn
+
+_MISSING = object()
+
+
+# ---------------------------------------------------------------------------
+# Converters: raw pycrate value -> output value, or None when unusable
+# ---------------------------------------------------------------------------
+
+def plmn_digits(plmn):
+    """PLMNIdentity -> (mcc, mnc)."""
+    if not plmn:
+        return None
+    mcc, mnc = decode_plmn(plmn)
+    if mcc and mnc:
+        return mcc, mnc
+    return None
+
+
+def octet_hex(value):
+    """One-octet OCTET STRING (e.g. sST) -> "%02X"."""
+    if isinstance(value, (bytes, bytearray)):
+        return f"{value[0]:02X}" if value else None
+    return f"{value:02X}"
+
+
+def bits_hex(width):
+    """BIT STRING (value, length) -> zero-padded hex of `width` digits."""
+    def convert(value):
+        if isinstance(value, tuple):
+            value = value[0]
+        return f"{value:0{width}X}"
+    return convert
+
+
+def hex_bytes(value):
+    return bytes(value).hex() if value else None
+
+
+def choice_name(value):
+    """CHOICE / ENUMERATED -> "alternative:value" (e.g. Cause)."""
+    if isinstance(value, tuple) and len(value) == 2:
+        return f"{value[0]}:{value[1]}"
+    return str(value)
+
+
+class Field:
+    """One registry entry: output name(s), alternative paths, converter."""
+    __slots__ = ("names", "paths", "convert")
+
+    def __init__(self, names, paths, convert=None):
+        self.names = (names,) if isinstance(names, str) else tuple(names)
+        self.paths = (paths,) if isinstance(paths, str) else tuple(paths)
+        self.convert = convert
+        if len(self.names) > 1 and convert is None:
+            raise ValueError(f"{self.names}: several outputs need a converter returning a tuple")
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+_SETUP_REQ_TA = "NGSetupRequest/protocolIEs[id=102][0]/broadcastPLMNList[0]"
+_SETUP_RSP_GUAMI = "NGSetupResponse/protocolIEs[id=96][0]/gUAMI"
+_SETUP_RSP_PLMN = "NGSetupResponse/protocolIEs[id=80][0]"
+_INITIAL_UE_TAI = "InitialUEMessage/protocolIEs[id=121]/userLocationInformationNR/tAI"
+
+NGAP_FIELDS = (
+    # NGSetupRequest: gNB PLMN (GlobalRANNodeID, else first broadcast PLMN) and slice
+    Field(("mcc", "mnc"), ("NGSetupRequest/protocolIEs[id=27]/globalGNB-ID/pLMNIdentity",
+                           f"{_SETUP_REQ_TA}/pLMNIdentity"), plmn_digits),
+    Field("sst", f"{_SETUP_REQ_TA}/tAISliceSupportList[0]/s-NSSAI/sST", octet_hex),
+
+    # NGSetupResponse: AMF identity (GUAMI, else first supported PLMN)
+    Field("amf_name", "NGSetupResponse/protocolIEs[id=1]", str),
+    Field(("mcc", "mnc"), (f"{_SETUP_RSP_GUAMI}/pLMNIdentity", f"{_SETUP_RSP_PLMN}/pLMNIdentity"), plmn_digits),
+    Field("amf_region_id", f"{_SETUP_RSP_GUAMI}/aMFRegionID", bits_hex(2)),
+    Field("amf_set_id", f"{_SETUP_RSP_GUAMI}/aMFSetID", bits_hex(4)),
+    Field("amf_pointer", f"{_SETUP_RSP_GUAMI}/aMFPointer", bits_hex(2)),
+    Field("amf_capacity", "NGSetupResponse/protocolIEs[id=86]", int),
+    Field("sst", f"{_SETUP_RSP_PLMN}/sliceSupportList[0]/s-NSSAI/sST", octet_hex),
+
+    # UE-associated procedures
+    Field("amf_ue_ngap_id", ("UEContextReleaseRequest/protocolIEs[id=10]",
+                             "UEContextReleaseCommand/protocolIEs[id=114]/uE-NGAP-ID-pair/aMF-UE-NGAP-ID",
+                             "UEContextReleaseCommand/protocolIEs[id=114]/aMF-UE-NGAP-ID"), int),
+    Field("ran_ue_ngap_id", ("UEContextReleaseRequest/protocolIEs[id=85]",
+                             "UEContextReleaseCommand/protocolIEs[id=114]/uE-NGAP-ID-pair/rAN-UE-NGAP-ID"), int),
+    Field("cause", ("UEContextReleaseRequest/protocolIEs[id=15]",
+                    "UEContextReleaseCommand/protocolIEs[id=15]"), choice_name),
+
+    Field("ran_ue_ngap_id", "InitialUEMessage/protocolIEs[id=85]", int),
+    Field("nas_pdu", "InitialUEMessage/protocolIEs[id=38]", hex_bytes),
+    Field(("mcc", "mnc"), f"{_INITIAL_UE_TAI}/pLMNIdentity", plmn_digits),
+    Field("tac", f"{_INITIAL_UE_TAI}/tAC", hex_bytes),
+    Field("rrc_establishment_cause", "InitialUEMessage/protocolIEs[id=90]", str),
+
+    Field("amf_ue_ngap_id", "PDUSessionResourceSetupRequest/protocolIEs[id=10]", int),
+    Field("ran_ue_ngap_id", "PDUSessionResourceSetupRequest/protocolIEs[id=85]", int),
+    Field("pdu_session_id", "PDUSessionResourceSetupRequest/protocolIEs[id=74][0]/pDUSessionID", int),
+    Field("sst", "PDUSessionResourceSetupRequest/protocolIEs[id=74][0]/s-NSSAI/sST", octet_hex),
+)
+
+
+# ---------------------------------------------------------------------------
+# Path compiler
+# ---------------------------------------------------------------------------
+
+_SEGMENT = re.compile(r"^([^\[\]]*)((?:\[[^\[\]]+\])*)$")
+_SELECTOR = re.compile(r"\[([^\[\]]+)\]")
+
+
+def _parse_literal(text):
+    return int(text) if text.lstrip("-").isdigit() else text
+
+
+def compile_path(path):
+    """Split a path into (message name, steps); each step is ("key", name), ("index", n) or ("match", key, val)."""
+    parts = path.split("/")
+    message, steps = parts[0], []
+    for part in parts[1:]:
+        m = _SEGMENT.match(part)
+        if not m:
+            raise ValueError(f"bad path segment {part!r} in {path!r}")
+        if m.group(1):
+            steps.append(("key", m.group(1)))
+        for sel in _SELECTOR.findall(m.group(2)):
+            if "=" in sel:
+                key, val = sel.split("=", 1)
+                steps.append(("match", key.strip(), _parse_literal(val.strip())))
+            else:
+                steps.append(("index", int(sel)))
+    if not message:
+        raise ValueError(f"path {path!r} does not start with a message name")
+    return message, tuple(steps)
+
+
+class _Node:
+    __slots__ = ("children", "outputs")
+
+    def __init__(self):
+        self.children = {}
+        self.outputs = []
+
+
+def _key_getter(name):
+    def get(value, matches):
+        if type(value) is dict:
+            return value.get(name, _MISSING)
+        if type(value) is tuple and len(value) == 2 and value[0] == name:
+            return value[1]      # CHOICE alternative
+        return _MISSING
+    return get
+
+
+def _index_getter(n):
+    def get(value, matches):
+        if type(value) is list and -len(value) <= n < len(value):
+            return value[n]
+        return _MISSING
+    return get
+
+
+def _match_getter(key, val):
+    def get(value, matches):
+        if matches is None:
+            return _MISSING
+        item = matches.get((key, val), _MISSING)
+        return item if item is _MISSING else _ie_value(item)
+    return get
+
+
+def _ie_value(item):
+    """A ProtocolIE-Field's value without its open-type wrapper; other items as is."""
+    if "id" in item and "value" in item:
+        item = item["value"]
+        if type(item) is tuple and len(item) == 2 and type(item[0]) is str:
+            return item[1]
+    return item
+
+
+def _chain_getter(first, rest):
+    """`first` followed by plain key/index steps, without a visitor call per step."""
+    def get(value, matches):
+        value = first(value, matches)
+        for kind, arg in rest:
+            if value is _MISSING:
+                break
+            if kind == "key":
+                if type(value) is dict:
+                    value = value.get(arg, _MISSING)
+                elif type(value) is tuple and len(value) == 2 and value[0] == arg:
+                    value = value[1]
+                else:
+                    return _MISSING
+            elif type(value) is list and -len(value) <= arg < len(value):
+                value = value[arg]
+            else:
+                return _MISSING
+        return value
+    return get
+
+
+def _compile_node(node):
+    """Turn a trie node into visit(value, found), with one closure per child step."""
+    children = []
+    match_keys = set()
+    for step, child in node.children.items():
+        if step[0] == "key":
+            get = _key_getter(step[1])
+        elif step[0] == "index":
+            get = _index_getter(step[1])
+        else:
+            get = _match_getter(step[1], step[2])
+            match_keys.add(step[1])
+        # fold runs of single-child key/index steps into one getter
+        rest = []
+        while not child.outputs and len(child.children) == 1:
+            (next_step, next_child), = child.children.items()
+            if next_step[0] == "match":
+                break
+            rest.append(next_step)
+            child = next_child
+        if rest:
+            get = _chain_getter(get, tuple(rest))
+        visit = _compile_node(child) if child.children else None
+        children.append((get, tuple(child.outputs), visit))
+    children = tuple(children)
+    match_keys = tuple(sorted(match_keys))
+
+    def visit(value, found):
+        matches = None
+        if match_keys and type(value) is list:
+            # one scan of the SEQUENCE OF serves every [key=val] child
+            matches = {}
+            for item in value:
+                if type(item) is dict:
+                    for key in match_keys:
+                        matches.setdefault((key, item.get(key)), item)
+        for get, outputs, sub_visit in children:
+            sub = get(value, matches)
+            if sub is _MISSING:
+                continue
+            for out in outputs:
+                found[out] = sub
+            if sub_visit is not None:
+                sub_visit(sub, found)
+    return visit
+
+
+class Extractor:
+    """Registry fields compiled into one selector trie (and visitor) per message name."""
+
+    def __init__(self, fields=NGAP_FIELDS, names=None):
+        wanted = None if names is None else set(names)
+        self.fields = [f for f in fields if wanted is None or wanted & set(f.names)]
+        roots = {}
+        plans = {}
+        for idx, field in enumerate(self.fields):
+            for alt, path in enumerate(field.paths):
+                message, steps = compile_path(path)
+                node = roots.setdefault(message, _Node())
+                for step in steps:
+                    node = node.children.setdefault(step, _Node())
+                node.outputs.append((idx, alt))
+                plan = plans.setdefault(message, {})
+                plan.setdefault(idx, []).append((idx, alt))
+        self.visitors = {message: _compile_node(root) for message, root in roots.items()}
+        # per message: (output keys in path order, names, converter) for each field
+        self.plans = {
+            message: tuple((tuple(keys), self.fields[idx].names, self.fields[idx].convert)
+                           for idx, keys in plan.items())
+            for message, plan in plans.items()
+        }
+
+    def extract(self, message, body):
+        """Values of every compiled field for one message body, or None if nothing matched."""
+        visit = self.visitors.get(message)
+        if visit is None:
+            return None
+        found = {}
+        visit(body, found)
+        extracted = {}
+        if not found:
+            return None
+        for keys, names, convert in self.plans[message]:
+            for key in keys:
+                raw = found.get(key, _MISSING)
+                if raw is _MISSING:
+                    continue
+                value = convert(raw) if convert else raw
+                if value is None:
+                    continue
+                if len(names) == 1:
+                    extracted[names[0]] = value
+                else:
+                    extracted.update(zip(names, value))
+                break
+        return extracted if extracted else None
+
+
+@lru_cache(maxsize=32)
+def _extractor(names):
+    return Extractor(NGAP_FIELDS, names)
+
+
+def message_body(pdu_val):
+    """(message name, body) of a decoded NGAP-PDU value, or (None, None)."""
+    if isinstance(pdu_val, tuple) and len(pdu_val) == 2 and isinstance(pdu_val[1], dict):
+        value = pdu_val[1].get("value")
+        if isinstance(value, tuple) and len(value) == 2:
+            return value[0], value[1]
+    return None, None
+
+
+DEFAULT_EXTRACTOR = Extractor()
+
+
+def extract_values(pdu_val, names=None):
+    """Registered fields (all, or just `names`) of a decoded NGAP-PDU value."""
+    message, body = message_body(pdu_val)
+    if message is None:
+        return None
+    return extract_message(message, body, names)
+
+
+def extract_message(message, body, names=None):
+    """Same as extract_values() for an already unwrapped (message name, body)."""
+    extractor = DEFAULT_EXTRACTOR if names is None else _extractor(tuple(sorted(names)))
+    return extractor.extract(message, body)
@@ -0,0 +1,472 @@
+"""
+ngap_fastpath.py
+
+Triage and a hand-written APER decoder for the NGAP messages the generators
+actually read.
+
+Every DATA chunk with PPID 60 used to go through a full pycrate decode even
+though only NGSetupRequest / NGSetupResponse are ever looked at. triage()
+reads the PDU choice and procedureCode straight from the first two APER
+bytes so everything else is dropped before pycrate is touched, and
+decode_ngsetup() walks just the IEs that are extracted (GlobalRANNodeID,
+SupportedTAList, AMFName, ServedGUAMIList, RelativeAMFCapacity,
+PLMNSupportList) and returns the same dict as the pycrate extractors in
+testcase_generation_scenario2.py.
+
+Anything the walker does not expect (extended choices, fragmented lengths,
+IE lengths that do not add up) returns FALLBACK and the caller decodes the
+message with pycrate instead. IEs that are not read are only length-checked,
+so a message whose other IEs pycrate would reject can still yield values.
+
+decode_ue_ngap_ids() walks the same IE list for the AMF / RAN UE NGAP IDs
+of UE-associated messages (Scenario 7 hunt5g.py context extraction).
+
+Usage (equivalence check against pycrate):
+    python ngap_fastpath.py --pcap capture.pcap
+    python ngap_fastpath.py --random 2000
+"""
+
+PDU_INITIATING = 0
+PDU_SUCCESSFUL = 1
+PDU_UNSUCCESSFUL = 2
+
+PROC_NG_SETUP = 21
+
+NGSETUP_REQUEST = (PDU_INITIATING, PROC_NG_SETUP)
+NGSETUP_RESPONSE = (PDU_SUCCESSFUL, PROC_NG_SETUP)
+
+# (pdu_type, procedureCode) pairs worth a decode; triage() drops the rest.
+HOT_PROCEDURES = frozenset((NGSETUP_REQUEST, NGSETUP_RESPONSE))
+
+IE_AMF_NAME = 1
+IE_AMF_UE_NGAP_ID = 10
+IE_GLOBAL_RAN_NODE_ID = 27
+IE_PLMN_SUPPORT_LIST = 80
+IE_RELATIVE_AMF_CAPACITY = 86
+IE_SERVED_GUAMI_LIST = 96
+IE_SUPPORTED_TA_LIST = 102
+IE_RAN_UE_NGAP_ID = 85
+IE_UE_NGAP_IDS = 114
+
+# Sentinel returned by decode_ngsetup() when pycrate has to take over (None
+# already means "nothing to extract").
+FALLBACK = object()
+
+
+class _Malformed(Exception):
+    pass
+
+
+class _AperReader:
+    """Minimal aligned-PER reader: bit fields, octet alignment, length determinants."""
+    __slots__ = ("data", "pos", "end")
+
+    def __init__(self, data, start=0, end=None):
+        self.data = data
+        self.pos = start * 8
+        self.end = (len(data) if end is None else end) * 8
+
+    def bits(self, n):
+        pos = self.pos
+        if pos + n > self.end:
+            raise _Malformed("truncated")
+        first, last = pos >> 3, (pos + n + 7) >> 3
+        word = int.from_bytes(self.data[first:last], "big")
+        self.pos = pos + n
+        return (word >> ((last << 3) - pos - n)) & ((1 << n) - 1)
+
+    def align(self):
+        self.pos = (self.pos + 7) & ~7
+
+    def octets(self, n):
+        self.align()
+        start = self.pos >> 3
+        if self.pos + n * 8 > self.end:
+            raise _Malformed("truncated")
+        self.pos += n * 8
+        return bytes(self.data[start:start + n])
+
+    def u8(self):
+        return self.octets(1)[0]
+
+    def u16(self):
+        hi, lo = self.octets(2)
+        return (hi << 8) | lo
+
+    def length(self):
+        """Unconstrained length determinant; fragmented (>= 16K) lengths are left to pycrate."""
+        first = self.u8()
+        if first < 0x80:
+            return first
+        if first < 0xC0:
+            return ((first & 0x3F) << 8) | self.u8()
+        raise _Malformed("fragmented length")
+
+    def count(self, ub):
+        """SEQUENCE (SIZE(1..ub)) OF item count."""
+        if ub <= 255:
+            n = self.bits((ub - 1).bit_length())
+        elif ub == 256:
+            n = self.u8()
+        else:
+            n = self.u16()
+        return n + 1
+
+
+def decode_plmn(plmn_bytes: bytes):
+    """Decode PLMN bytes to MCC/MNC strings.
+
+    PLMN encoding (3GPP TS 24.301):
+    Byte 1: MNC_digit2 (bits 4-7) || MCC_digit1 (bits 0-3)
+    Byte 2: MNC_digit1 (bits 4-7) || MCC_digit3 (bits 0-3)
+    Byte 3: MNC_digit3 (bits 4-7) || MCC_digit2 (bits 0-3)
+
+    For 2-digit MNC: If byte 2 upper nibble = 0xF, then:
+      - MNC_digit1 is in byte 1 upper nibble
+      - MNC_digit2 is in byte 3 upper nibble
+      - Byte 2 upper nibble = 0xF is just an indicator
+    """
+    if len(plmn_bytes) < 3:
+        return None, None
+
+    b1, b2, b3 = plmn_bytes[0], plmn_bytes[1], plmn_bytes[2]
+
+    mcc1 = (b1 & 0x0F)
+    mcc2 = (b1 & 0xF0) >> 4
+    mcc3 = (b2 & 0x0F)
+
+    if (b2 & 0xF0) >> 4 == 0xF:
+        mnc1 = (b3 & 0x0F)
+        mnc2 = (b3 & 0xF0) >> 4
+        mnc = f"{mnc1}{mnc2}"
+    elif (b3 & 0xF0) >> 4 == 0xF:
+        mnc1 = (b2 & 0xF0) >> 4
+        mnc1 = (b1 & 0xF0) >> 4
+        mnc2 = (b2 & 0xF0) >> 4
+        mnc1 = (b2 & 0xF0) >> 4
+        mnc2 = (b1 & 0xF0) >> 4
+        mnc = f"{mnc1}{mnc2}"
+    else:
+        mnc1 = (b2 & 0xF0) >> 4
+        mnc2 = (b1 & 0xF0) >> 4
+        mnc3 = (b3 & 0xF0) >> 4
+        mnc = f"{mnc1}{mnc2}{mnc3}"
+
+    mcc = f"{mcc1}{mcc2}{mcc3}"
+
+    return mcc, mnc
+
+
+def triage(payload):
+    """Return (pdu_type, procedureCode) from the first two APER bytes, or None."""
+    if payload is None or len(payload) < 2 or payload[0] & 0x80:
+        return None    # too short, or an NGAP-PDU extension choice
+    return (payload[0] >> 5) & 0x03, payload[1]
+
+
+def _set_plmn(extracted, plmn):
+    mcc, mnc = decode_plmn(plmn)
+    if mcc and mnc:
+        extracted["mcc"] = mcc
+        extracted["mnc"] = mnc
+
+
+def _first_sst(r):
+    """sST of the first SliceSupportItem of a SliceSupportList (SIZE(1..1024))."""
+    r.count(1024)
+    r.bits(2)     # SliceSupportItem: extension bit, iE-Extensions
+    r.bits(3)     # S-NSSAI: extension bit, sD, iE-Extensions
+    return r.bits(8)
+
+
+def _request_ie(extracted, ie_id, r):
+    if ie_id == IE_GLOBAL_RAN_NODE_ID:
+        if r.bits(2) != 0:
+            return    # globalNgENB-ID / globalN3IWF-ID carry no gNB PLMN here
+        r.bits(2)     # GlobalGNB-ID: extension bit, iE-Extensions
+        _set_plmn(extracted, r.octets(3))
+    elif ie_id == IE_SUPPORTED_TA_LIST:
+        r.count(256)
+        r.bits(2)     # SupportedTAItem: extension bit, iE-Extensions
+        r.octets(3)   # tAC
+        r.count(12)
+        r.bits(2)     # BroadcastPLMNItem: extension bit, iE-Extensions
+        plmn = r.octets(3)
+        if "mcc" not in extracted:
+            _set_plmn(extracted, plmn)
+        extracted["sst"] = f"{_first_sst(r):02X}"
+
+
+def _response_ie(extracted, ie_id, r):
+    if ie_id == IE_AMF_NAME:
+        if r.bits(1):
+            raise _Malformed("AMFName outside its root size")
+        size = r.bits(8) + 1
+        extracted["amf_name"] = r.octets(size).decode("ascii")
+    elif ie_id == IE_SERVED_GUAMI_LIST:
+        r.count(256)
+        r.bits(3)     # ServedGUAMIItem: extension bit, backupAMFName, iE-Extensions
+        r.bits(2)     # GUAMI: extension bit, iE-Extensions
+        _set_plmn(extracted, r.octets(3))
+        extracted["amf_region_id"] = f"{r.bits(8):02X}"
+        extracted["amf_set_id"] = f"{r.bits(10):04X}"
+        extracted["amf_pointer"] = f"{r.bits(6):02X}"
+    elif ie_id == IE_RELATIVE_AMF_CAPACITY:
+        extracted["amf_capacity"] = r.u8()
+    elif ie_id == IE_PLMN_SUPPORT_LIST:
+        r.count(12)
+        r.bits(2)     # PLMNSupportItem: extension bit, iE-Extensions
+        plmn = r.octets(3)
+        if "mcc" not in extracted:
+            _set_plmn(extracted, plmn)
+        extracted["sst"] = f"{_first_sst(r):02X}"
+
+
+def _protocol_ies(payload):
+    """
+    Yield (ie_id, reader over the IE value) for the protocolIEs of an
+    initiating / outcome message; raises _Malformed when lengths do not add up.
+    """
+    r = _AperReader(payload, 2)
+    r.bits(2)                    # criticality
+    size = r.length()
+    end = (r.pos >> 3) + size
+    if end > len(payload):
+        raise _Malformed("open type past the payload")   # trailing bytes after it are ignored, as pycrate does
+    r.bits(1)                    # message extension bit
+    n_ies = r.u16()
+    for _ in range(n_ies):
+        ie_id = r.u16()
+        r.bits(2)                # criticality
+        ie_len = r.length()
+        ie_start = r.pos >> 3
+        ie_end = ie_start + ie_len
+        if ie_end > end:
+            raise _Malformed("IE past the message")
+        yield ie_id, _AperReader(payload, ie_start, ie_end)
+        r.pos = ie_end * 8
+    if r.pos >> 3 != end:
+        raise _Malformed("message length mismatch")
+
+
+def decode_ngsetup(payload):
+    """
+    Extract the NGSetupRequest / NGSetupResponse values from an APER payload.
+
+    Returns the same dict (or None) as the pycrate-based extractors, or
+    FALLBACK when the message needs a full decode.
+    """
+    key = triage(payload)
+    if key == NGSETUP_REQUEST:
+        handle_ie = _request_ie
+    elif key == NGSETUP_RESPONSE:
+        handle_ie = _response_ie
+    else:
+        return FALLBACK
+    extracted = {}
+    try:
+        for ie_id, r in _protocol_ies(payload):
+            handle_ie(extracted, ie_id, r)
+    except (_Malformed, UnicodeDecodeError):
+        return FALLBACK
+    return extracted if extracted else None
+
+
+def _amf_ue_ngap_id(r):
+    """AMF-UE-NGAP-ID, INTEGER (0..2^40-1): 3-bit octet count, then aligned octets."""
+    return int.from_bytes(r.octets(r.bits(3) + 1), "big")
+
+
+def _ran_ue_ngap_id(r):
+    """RAN-UE-NGAP-ID, INTEGER (0..2^32-1): 2-bit octet count, then aligned octets."""
+    return int.from_bytes(r.octets(r.bits(2) + 1), "big")
+
+
+def decode_ue_ngap_ids(payload):
+    """
+    Return (amf_ue_ngap_id, ran_ue_ngap_id) of a UE-associated NGAP message,
+    either one None when the message does not carry it, or None when the
+    payload carries neither or cannot be walked. UE-NGAP-IDs (IE 114, in
+    UEContextReleaseCommand) is read as well.
+    """
+    if triage(payload) is None:
+        return None
+    amf_id = ran_id = None
+    try:
+        for ie_id, r in _protocol_ies(payload):
+            if ie_id == IE_AMF_UE_NGAP_ID:
+                amf_id = _amf_ue_ngap_id(r)
+            elif ie_id == IE_RAN_UE_NGAP_ID:
+                ran_id = _ran_ue_ngap_id(r)
+            elif ie_id == IE_UE_NGAP_IDS:
+                choice = r.bits(2)
+                if choice == 0:
+                    r.bits(2)     # UE-NGAP-ID-pair: extension bit, iE-Extensions
+                    amf_id = _amf_ue_ngap_id(r)
+                    ran_id = _ran_ue_ngap_id(r)
+                elif choice == 1:
+                    amf_id = _amf_ue_ngap_id(r)
+    except _Malformed:
+        return None
+    if amf_id is None and ran_id is None:
+        return None
+    return amf_id, ran_id
+
+
+class NgapStats:
+    """Counters for how NGAP payloads were handled by decode_ngap_message()."""
+    __slots__ = ("messages", "skipped", "cached", "fast", "fallback")
+
+    def __init__(self):
+        self.messages = 0
+        self.skipped = 0
+        self.cached = 0
+        self.fast = 0
+        self.fallback = 0
+
+    def summary(self):
+        return (f"{self.messages} NGAP messages: {self.skipped} skipped by triage, {self.cached} from cache, "
+                f"{self.fast} via fast decoder, {self.fallback} via pycrate")
+
+
+def _random_ngsetup(rng):
+    """Build a random NGSetupRequest or NGSetupResponse with pycrate."""
+    from ngap_pdu_pool import encode_aper
+
+    def plmn():
+        mcc = [rng.randrange(10) for _ in range(3)]
+        mnc = [rng.randrange(10) for _ in range(rng.choice((2, 3)))]
+        b1 = (mcc[1] << 4) | mcc[0]
+        if len(mnc) == 2:
+            b2, b3 = 0xF0 | mcc[2], (mnc[1] << 4) | mnc[0]
+        else:
+            b2, b3 = (mnc[2] << 4) | mcc[2], (mnc[1] << 4) | mnc[0]
+        if rng.random() < 0.2:
+            return bytes(rng.randrange(256) for _ in range(3))
+        return bytes((b1, b2, b3))
+
+    def slices():
+        items = []
+        for _ in range(rng.randint(1, 3)):
+            nssai = {"sST": bytes([rng.randrange(256)])}
+            if rng.random() < 0.5:
+                nssai["sD"] = bytes(rng.randrange(256) for _ in range(3))
+            items.append({"s-NSSAI": nssai})
+        return items
+
+    def name(lo=1, hi=150):
+        alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 '()+,-./:=?"
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(lo, hi)))
+
+    if rng.random() < 0.5:
+        if rng.random() < 0.8:
+            node = ("globalGNB-ID", {"pLMNIdentity": plmn(),
+                                     "gNB-ID": ("gNB-ID", (rng.getrandbits(32), 32))})
+        else:
+            node = ("globalNgENB-ID", {"pLMNIdentity": plmn(),
+                                       "ngENB-ID": ("macroNgENB-ID", (rng.getrandbits(20), 20))})
+        tas = [{"tAC": bytes(rng.randrange(256) for _ in range(3)),
+                "broadcastPLMNList": [{"pLMNIdentity": plmn(), "tAISliceSupportList": slices()}
+                                      for _ in range(rng.randint(1, 3))]}
+               for _ in range(rng.randint(1, 3))]
+        ies = [
+            {"id": IE_GLOBAL_RAN_NODE_ID, "criticality": "reject", "value": ("GlobalRANNodeID", node)},
+            {"id": 82, "criticality": "ignore", "value": ("RANNodeName", name())},
+            {"id": IE_SUPPORTED_TA_LIST, "criticality": "reject", "value": ("SupportedTAList", tas)},
+            {"id": 21, "criticality": "ignore", "value": ("PagingDRX", rng.choice(("v32", "v64", "v128", "v256")))},
+        ]
+        rng.shuffle(ies)
+        val = ("initiatingMessage", {"procedureCode": PROC_NG_SETUP, "criticality": "reject",
+                                     "value": ("NGSetupRequest", {"protocolIEs": ies})})
+    else:
+        guami = {"gUAMI": {"pLMNIdentity": plmn(), "aMFRegionID": (rng.getrandbits(8), 8),
+                           "aMFSetID": (rng.getrandbits(10), 10), "aMFPointer": (rng.getrandbits(6), 6)}}
+        if rng.random() < 0.3:
+            guami["backupAMFName"] = name()
+        ies = [
+            {"id": IE_AMF_NAME, "criticality": "reject", "value": ("AMFName", name())},
+            {"id": IE_SERVED_GUAMI_LIST, "criticality": "reject", "value": ("ServedGUAMIList", [guami])},
+            {"id": IE_RELATIVE_AMF_CAPACITY, "criticality": "ignore",
+             "value": ("RelativeAMFCapacity", rng.randrange(256))},
+            {"id": IE_PLMN_SUPPORT_LIST, "criticality": "reject",
+             "value": ("PLMNSupportList", [{"pLMNIdentity": plmn(), "sliceSupportList": slices()}
+                                           for _ in range(rng.randint(1, 3))])},
+        ]
+        rng.shuffle(ies)
+        val = ("successfulOutcome", {"procedureCode": PROC_NG_SETUP, "criticality": "reject",
+                                     "value": ("NGSetupResponse", {"protocolIEs": ies})})
+    return encode_aper(val)
+
+
+def capture_payloads(path):
+    """Reassembled NGAP payloads (PPID 60 DATA) of a capture, in capture order."""
+    from testcase_generation_scenario2 import read_pcap_chunks
+    from sctp_fastpath import CHUNK_DATA, NGAP_PPID, DataReassembler
+
+    reassemblers = {}
+    for ch in read_pcap_chunks(path, progress_interval=0):
+        if ch.ctype != CHUNK_DATA:
+            continue
+        key = frozenset(((ch.ip_src, ch.sport), (ch.ip_dst, ch.dport)))
+        ch = reassemblers.setdefault(key, DataReassembler()).push(ch)
+        if ch is not None and ch.ppid == NGAP_PPID and ch.payload:
+            yield bytes(ch.payload)
+
+
+def main():
+    import argparse
+    import contextlib
+    import io
+    import random
+    import time
+
+    p = argparse.ArgumentParser(description="Check the NGAP fast decoder against pycrate")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--pcap", help="Compare every NGAP payload in this capture")
+    src.add_argument("--random", type=int, metavar="N", help="Compare N random NGSetup messages built with pycrate")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import testcase_generation_scenario2 as scenario2
+    if not scenario2.NGAP_AVAILABLE:
+        print("[!] pycrate_asn1dir not available, nothing to compare against")
+        return
+
+    if args.pcap:
+        payloads = list(capture_payloads(args.pcap))
+    else:
+        rng = random.Random(args.seed)
+        payloads = [_random_ngsetup(rng) for _ in range(args.random)]
+
+    mismatches = fallbacks = skipped = 0
+    fast_time = slow_time = 0.0
+    for payload in payloads:
+        if triage(payload) not in HOT_PROCEDURES:
+            skipped += 1
+            continue
+        start = time.perf_counter()
+        fast = decode_ngsetup(payload)
+        mid = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            slow = scenario2.decode_ngap_message(payload, fast=False)
+        fast_time += mid - start
+        slow_time += time.perf_counter() - mid
+        if fast is FALLBACK and slow is not None:
+            fallbacks += 1
+        elif fast != slow:
+            mismatches += 1
+            print(f"[!] Mismatch for {payload.hex()}")
+            print(f"[!]   fast:    {fast}")
+            print(f"[!]   pycrate: {slow}")
+
+    checked = len(payloads) - skipped
+    print(f"[+] {checked} NGSetup message(s) checked, {skipped} skipped by triage, "
+          f"{fallbacks} fell back to pycrate, {mismatches} mismatch(es)")
+    if checked:
+        print(f"[+] Fast decoder {fast_time * 1e6 / checked:.1f} us/msg, "
+              f"pycrate {slow_time * 1e6 / checked:.1f} us/msg")
+
+
+if __name__ == "__main__":
+    main()
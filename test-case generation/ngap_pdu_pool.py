@@ -0,0 +1,146 @@
+"""
+ngap_pdu_pool.py
+
+Pool of independent pycrate NGAP_PDU objects shared by the NGAP encode /
+decode helpers.
+
+pycrate keeps the decoded or encoded value on the PDU object itself, so
+scripts that all use the module-global NGAP_PDU_Descriptions.NGAP_PDU
+clobber each other as soon as two threads encode or decode at once. Deep
+copying the PDU per call avoids that but costs most of a second each time.
+
+PduPool hands out whole PDU objects with checkout/return semantics. The
+module-global PDU is the first member, so single-threaded scripts never
+copy anything; a further member is deep-copied (once) only when a thread
+has to wait for one, up to `max_size`.
+
+pycrate's PER codec also keeps its bit-offset stack on the ASN1CodecPER
+class, so the APER calls themselves run under CODEC_LOCK; set_val() /
+get_val() and the value checks run on the thread's own PDU outside it.
+
+Usage:
+    from ngap_pdu_pool import decode_aper, encode_aper
+    pdu_val = decode_aper(ngap_bytes)
+    ngap_bytes = encode_aper(pdu_val)
+"""
+
+import copy
+import threading
+from contextlib import contextmanager
+
+try:
+    from pycrate_asn1dir import NGAP
+    from pycrate_asn1rt.codecs import ASN1CodecPER
+    NGAP_AVAILABLE = True
+except ImportError:
+    NGAP_AVAILABLE = False
+
+DEFAULT_POOL_SIZE = 8
+
+CODEC_LOCK = threading.RLock()
+
+
+class PduPool:
+    """Checkout/return pool of independent copies of one pycrate PDU object."""
+
+    def __init__(self, template, max_size=DEFAULT_POOL_SIZE):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self._idle = [template]
+        self._size = 1
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def acquire(self, timeout=None):
+        """Take a PDU out of the pool, waiting up to `timeout` seconds for one."""
+        with self._cond:
+            waited = not self._idle
+            if waited:
+                self.waits += 1
+                if not self._cond.wait_for(lambda: self._idle, timeout):
+                    raise TimeoutError("no NGAP PDU returned to the pool in time")
+            pdu = self._idle.pop()
+            grow = waited and self._size < self.max_size
+            if grow:
+                self._size += 1
+            self.checkouts += 1
+        if grow:
+            # Copy while this PDU is ours and idle; nothing else can touch it.
+            self.release(copy.deepcopy(pdu))
+        return pdu
+
+    def release(self, pdu):
+        with self._cond:
+            self._idle.append(pdu)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        pdu = self.acquire(timeout)
+        try:
+            yield pdu
+        finally:
+            self.release(pdu)
+
+    def prefill(self, count):
+        """Grow the pool to `count` members up front (e.g. one per worker thread)."""
+        count = min(count, self.max_size)
+        while True:
+            with self._cond:
+                if self._size >= count or not self._idle:
+                    return
+                seed = self._idle.pop()
+                self._size += 1
+            try:
+                clone = copy.deepcopy(seed)
+            finally:
+                self.release(seed)
+            self.release(clone)
+
+
+NGAP_PDU_POOL = PduPool(NGAP.NGAP_PDU_Descriptions.NGAP_PDU) if NGAP_AVAILABLE else None
+
+
+def _codec_call(func, *args):
+    with CODEC_LOCK:
+        depth = len(ASN1CodecPER._off)
+        try:
+            return func(*args)
+        finally:
+            # a failed decode leaves its offsets behind; don't poison the next call
+            del ASN1CodecPER._off[depth:]
+
+
+def decode_aper(buf, pool=None):
+    """Decode an APER NGAP PDU and return its pycrate value."""
+    if not isinstance(buf, bytes):
+        buf = bytes(buf)
+    with (pool or NGAP_PDU_POOL).checkout() as pdu:
+        _codec_call(pdu.from_aper, buf)
+        return pdu.get_val()
+
+
+def encode_aper(pdu_val, pool=None):
+    """Encode a pycrate NGAP PDU value to APER bytes."""
+    with (pool or NGAP_PDU_POOL).checkout() as pdu:
+        pdu.set_val(pdu_val)
+        return _codec_call(pdu.to_aper)
+
+
+def decode_aper_struct(buf, visit, pool=None):
+    """
+    Decode with pycrate's bit-level structure (from_aper_ws) and return
+    visit(struct). The structure belongs to the pooled PDU and is rebuilt
+    by its next decode, so it is only valid inside `visit`.
+    """
+    if not isinstance(buf, bytes):
+        buf = bytes(buf)
+    with (pool or NGAP_PDU_POOL).checkout() as pdu:
+        _codec_call(pdu.from_aper_ws, buf)
+        return visit(pdu._struct)
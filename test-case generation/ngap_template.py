@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+ngap_template.py
+
+APER template compiler for repeated NGAP encodes.
+
+The builders (NGSetupResponse, UEContextReleaseRequest / Command,
+DownlinkNASTransport) rebuild the whole pycrate value tree and run
+to_aper() for every message, although only a few leaf fields change
+between calls. A compiled template encodes the message once with pycrate,
+locates the bit span of every variable field by encoding a probe value and
+diffing, and afterwards produces new messages by patching those spans in a
+copy of the cached bytes.
+
+A field can only be patched while its encoded width stays the same. When a
+new value would change a length determinant (a longer AMFName, an
+AMF-UE-NGAP-ID that needs another octet) the template falls back to a full
+pycrate encode. Anything structural (number of PLMN items, presence of a
+slice, the Cause) is part of the template *shape*; TemplateSet compiles
+one template per shape on first use.
+
+Usage:
+    python3 ngap_template.py --check 2000     # compare against pycrate
+    python3 ngap_template.py --bench 5000
+"""
+
+import argparse
+import random
+import time
+
+from ngap_pdu_pool import NGAP_AVAILABLE, encode_aper
+
+# PrintableString alphabet (X.680), the type of AMFName and RANNodeName
+PRINTABLE = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 '()+,-./:=?")
+
+# --------------------------------------------------------------------
+# Field kinds: how a value maps onto the bits of its APER span
+# --------------------------------------------------------------------
+class Octets:
+    """Fixed-size OCTET STRING (PLMNIdentity, SST, TAC)."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def width(self, value):
+        return 8 * self.size if len(value) == self.size else None
+
+    def bits(self, value):
+        return int.from_bytes(value, "big")
+
+    def probe(self, value):
+        return bytes(b ^ 0xFF for b in value)
+
+
+class Bits:
+    """Fixed-size BIT STRING, given as an integer (AMF region / set / pointer)."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def width(self, value):
+        return self.size if 0 <= value < (1 << self.size) else None
+
+    def bits(self, value):
+        return value
+
+    def probe(self, value):
+        return value ^ ((1 << self.size) - 1)
+
+
+class UInt:
+    """
+    Constrained INTEGER. Ranges up to 64K are a fixed-width bit field;
+    larger ranges carry a length determinant, so only values with the same
+    number of content octets can be patched.
+    """
+
+    def __init__(self, lb, ub):
+        self.lb = lb
+        self.ub = ub
+        rng = ub - lb + 1
+        if rng <= 255:
+            self.fixed = (rng - 1).bit_length()
+        elif rng <= 65536:
+            self.fixed = 8 if rng == 256 else 16
+        else:
+            self.fixed = None
+
+    def width(self, value):
+        if not self.lb <= value <= self.ub:
+            return None
+        if self.fixed is not None:
+            return self.fixed
+        return 8 * max(1, ((value - self.lb).bit_length() + 7) // 8)
+
+    def bits(self, value):
+        return value - self.lb
+
+    def probe(self, value):
+        if self.fixed is not None:
+            return self.ub if value != self.ub else self.lb
+        width = self.width(value)
+        # flip every bit below the top octet so the octet count is kept
+        mask = 0xFF if width == 8 else (1 << (width - 8)) - 1
+        return self.lb + ((value - self.lb) ^ mask)
+
+
+class CharString:
+    """Character string with 8-bit characters in APER (AMFName, RANNodeName)."""
+
+    def __init__(self, alphabet=PRINTABLE):
+        self.alphabet = alphabet
+
+    def width(self, value):
+        # characters outside the alphabet are left to pycrate to accept or reject
+        return 8 * len(value) if self.alphabet.issuperset(value) else None
+
+    def bits(self, value):
+        return int.from_bytes(value.encode("ascii"), "big") if value else 0
+
+    def probe(self, value):
+        return "".join("b" if c == "a" else "a" for c in value)
+
+
+# --------------------------------------------------------------------
+# Bit patching
+# --------------------------------------------------------------------
+def _read_bits(buf, off, width):
+    first = off >> 3
+    last = (off + width + 7) >> 3
+    shift = (last << 3) - off - width
+    return (int.from_bytes(buf[first:last], "big") >> shift) & ((1 << width) - 1)
+
+
+def _diff_range(a, b):
+    """First and last differing bit between two equal-length byte strings."""
+    lo = next(i for i in range(len(a)) if a[i] != b[i])
+    hi = next(i for i in range(len(a) - 1, -1, -1) if a[i] != b[i])
+    x_lo = a[lo] ^ b[lo]
+    x_hi = a[hi] ^ b[hi]
+    first = (lo << 3) + 8 - x_lo.bit_length()
+    last = (hi << 3) + 7 - ((x_hi & -x_hi).bit_length() - 1)
+    return first, last
+
+
+# --------------------------------------------------------------------
+# Compiled template
+# --------------------------------------------------------------------
+class AperTemplate:
+    """
+    One message shape compiled against `base` parameters.
+
+    `build(params)` returns the pycrate value for a full parameter dict;
+    `fields` maps each parameter name to its kind. Fields whose span cannot
+    be located (the probe changed the message length, or no offset
+    explains the diff) are left to the pycrate fallback.
+    """
+
+    def __init__(self, build, fields, base, encode=encode_aper):
+        self.build = build
+        self.encode_full = encode
+        self.base = dict(base)
+        self.kinds = dict(fields)
+        self.template = encode(build(self.base))
+        self.spans = {}
+        for name, kind in self.kinds.items():
+            span = self._locate(name, kind)
+            if span is not None:
+                self.spans[name] = span
+        # the whole message as one integer; a field is a masked run of bits
+        nbits = 8 * len(self.template)
+        self._word = int.from_bytes(self.template, "big")
+        self._slots = {}
+        for name, (off, width) in self.spans.items():
+            shift = nbits - off - width
+            self._slots[name] = (shift, width, ~(((1 << width) - 1) << shift), self.kinds[name])
+        self.patched = 0
+        self.fallbacks = 0
+
+    def _locate(self, name, kind):
+        value = self.base[name]
+        width = kind.width(value)
+        probe = kind.probe(value)
+        if not width or probe == value or kind.width(probe) != width:
+            return None
+        params = dict(self.base)
+        params[name] = probe
+        try:
+            other = self.encode_full(self.build(params))
+        except Exception:
+            return None
+        if len(other) != len(self.template) or other == self.template:
+            return None
+        first, last = _diff_range(self.template, other)
+        want_base, want_probe = kind.bits(value), kind.bits(probe)
+        for off in range(max(0, last - width + 1), first + 1):
+            if off + width > 8 * len(self.template):
+                break
+            if (_read_bits(self.template, off, width) == want_base
+                    and _read_bits(other, off, width) == want_probe):
+                return off, width
+        return None
+
+    def fallback(self, params):
+        """Full pycrate encode of the base parameters updated with `params`."""
+        self.fallbacks += 1
+        merged = dict(self.base)
+        merged.update(params)
+        return self.encode_full(self.build(merged))
+
+    def encode(self, params):
+        """Return the APER bytes for `params` (missing keys keep their base value)."""
+        base = self.base
+        slots = self._slots
+        word = self._word
+        for name, value in params.items():
+            if value == base[name]:
+                continue
+            slot = slots.get(name)
+            if slot is None:
+                return self.fallback(params)
+            shift, width, clear, kind = slot
+            if kind.width(value) != width:
+                return self.fallback(params)
+            word = (word & clear) | (kind.bits(value) << shift)
+        self.patched += 1
+        return word.to_bytes(len(self.template), "big")
+
+
+class TemplateSet:
+    """
+    Templates keyed by shape. `build(shape, params)` returns the pycrate
+    value and `fields(shape)` the field kinds for that shape; the first
+    encode of a shape compiles its template against those parameters.
+    """
+
+    def __init__(self, build, fields, encode=encode_aper):
+        self._build = build
+        self._fields = fields
+        self._encode = encode
+        self.templates = {}
+
+    def get(self, shape, params):
+        tmpl = self.templates.get(shape)
+        if tmpl is None:
+            tmpl = AperTemplate(lambda p: self._build(shape, p), self._fields(shape), params,
+                                encode=self._encode)
+            self.templates[shape] = tmpl
+        return tmpl
+
+    def build(self, shape, params):
+        """The pycrate value for `shape` and `params`, without any template."""
+        return self._build(shape, params)
+
+    def encode(self, shape, params):
+        return self.get(shape, params).encode(params)
+
+    def summary(self):
+        patched = sum(t.patched for t in self.templates.values())
+        fallbacks = sum(t.fallbacks for t in self.templates.values())
+        return f"APER templates: {len(self.templates)} compiled, {patched} patched, {fallbacks} pycrate fallbacks"
+
+
+# --------------------------------------------------------------------
+# NGSetupResponse
+#   shape:  tuple with one entry per PLMNSupportList item, True when the
+#           item carries an SST
+#   params: amf_name, guami_plmn, region, set, pointer, capacity,
+#           plmn_<i>, sst_<i> (PLMN / SST as raw bytes)
+# --------------------------------------------------------------------
+def ngsetup_response_value(shape, params):
+    guami_val = {
+        "pLMNIdentity": params["guami_plmn"],
+        "aMFRegionID": (params["region"], 8),
+        "aMFSetID": (params["set"], 10),
+        "aMFPointer": (params["pointer"], 6),
+    }
+    plmn_items = []
+    for i, has_sst in enumerate(shape):
+        entry = {"pLMNIdentity": params[f"plmn_{i}"]}
+        if has_sst:
+            entry["sliceSupportList"] = [{"s-NSSAI": {"sST": params[f"sst_{i}"]}}]
+        plmn_items.append(entry)
+    ies = [
+        {"id": 1, "criticality": "reject", "value": ("AMFName", params["amf_name"])},
+        {"id": 96, "criticality": "reject", "value": ("ServedGUAMIList", [{"gUAMI": guami_val}])},
+        {"id": 86, "criticality": "reject", "value": ("RelativeAMFCapacity", params["capacity"])},
+        {"id": 80, "criticality": "reject", "value": ("PLMNSupportList", plmn_items)},
+    ]
+    return ("successfulOutcome", {
+        "procedureCode": 21,
+        "criticality": "reject",
+        "value": ("NGSetupResponse", {"protocolIEs": ies}),
+    })
+
+
+def ngsetup_response_fields(shape):
+    fields = {
+        "amf_name": CharString(),
+        "guami_plmn": Octets(3),
+        "region": Bits(8),
+        "set": Bits(10),
+        "pointer": Bits(6),
+        "capacity": UInt(0, 255),
+    }
+    for i, has_sst in enumerate(shape):
+        fields[f"plmn_{i}"] = Octets(3)
+        if has_sst:
+            fields[f"sst_{i}"] = Octets(1)
+    return fields
+
+
+NGSETUP_RESPONSE = TemplateSet(ngsetup_response_value, ngsetup_response_fields)
+
+
+# --------------------------------------------------------------------
+# UEContextReleaseRequest
+#   shape:  (procedure_code, cause_domain, cause_name)
+#   params: amf_ue_ngap_id, ran_ue_ngap_id
+# --------------------------------------------------------------------
+ID_AMF_UE_NGAP_ID = 10
+ID_RAN_UE_NGAP_ID = 85
+ID_CAUSE = 15
+
+
+def ue_context_release_request_value(shape, params):
+    proc, cause_dom, cause_name = shape
+    ies = [
+        {"id": ID_AMF_UE_NGAP_ID, "criticality": "reject",
+         "value": ("AMF-UE-NGAP-ID", params["amf_ue_ngap_id"])},
+        {"id": ID_RAN_UE_NGAP_ID, "criticality": "reject",
+         "value": ("RAN-UE-NGAP-ID", params["ran_ue_ngap_id"])},
+        {"id": ID_CAUSE, "criticality": "ignore", "value": ("Cause", (cause_dom, cause_name))},
+    ]
+    return ("initiatingMessage", {
+        "procedureCode": proc,
+        "criticality": "reject",
+        "value": ("UEContextReleaseRequest", {"protocolIEs": ies}),
+    })
+
+
+def ue_context_release_request_fields(shape):
+    return {
+        "amf_ue_ngap_id": UInt(0, (1 << 40) - 1),
+        "ran_ue_ngap_id": UInt(0, (1 << 32) - 1),
+    }
+
+
+UE_CONTEXT_RELEASE_REQUEST = TemplateSet(ue_context_release_request_value,
+                                         ue_context_release_request_fields)
+
+
+# --------------------------------------------------------------------
+# UEContextReleaseCommand (AMF -> gNB, answers a release request)
+#   shape:  (cause_domain, cause_name)
+#   params: amf_ue_ngap_id, ran_ue_ngap_id (the UE-NGAP-ID-pair)
+# --------------------------------------------------------------------
+ID_UE_NGAP_IDS = 114
+PROC_UE_CONTEXT_RELEASE = 41
+
+
+def ue_context_release_command_value(shape, params):
+    cause_dom, cause_name = shape
+    pair = {"aMF-UE-NGAP-ID": params["amf_ue_ngap_id"], "rAN-UE-NGAP-ID": params["ran_ue_ngap_id"]}
+    ies = [
+        {"id": ID_UE_NGAP_IDS, "criticality": "reject", "value": ("UE-NGAP-IDs", ("uE-NGAP-ID-pair", pair))},
+        {"id": ID_CAUSE, "criticality": "ignore", "value": ("Cause", (cause_dom, cause_name))},
+    ]
+    return ("initiatingMessage", {
+        "procedureCode": PROC_UE_CONTEXT_RELEASE,
+        "criticality": "reject",
+        "value": ("UEContextReleaseCommand", {"protocolIEs": ies}),
+    })
+
+
+UE_CONTEXT_RELEASE_COMMAND = TemplateSet(ue_context_release_command_value,
+                                         ue_context_release_request_fields)
+
+
+# --------------------------------------------------------------------
+# DownlinkNASTransport
+#   shape:  (nas_pdu,) raw NAS bytes
+#   params: amf_ue_ngap_id, ran_ue_ngap_id
+# --------------------------------------------------------------------
+ID_NAS_PDU = 38
+PROC_DOWNLINK_NAS_TRANSPORT = 4
+
+
+def downlink_nas_transport_value(shape, params):
+    (nas_pdu,) = shape
+    ies = [
+        {"id": ID_AMF_UE_NGAP_ID, "criticality": "reject",
+         "value": ("AMF-UE-NGAP-ID", params["amf_ue_ngap_id"])},
+        {"id": ID_RAN_UE_NGAP_ID, "criticality": "reject",
+         "value": ("RAN-UE-NGAP-ID", params["ran_ue_ngap_id"])},
+        {"id": ID_NAS_PDU, "criticality": "reject", "value": ("NAS-PDU", nas_pdu)},
+    ]
+    return ("initiatingMessage", {
+        "procedureCode": PROC_DOWNLINK_NAS_TRANSPORT,
+        "criticality": "ignore",
+        "value": ("DownlinkNASTransport", {"protocolIEs": ies}),
+    })
+
+
+DOWNLINK_NAS_TRANSPORT = TemplateSet(downlink_nas_transport_value, ue_context_release_request_fields)
+
+
+# --------------------------------------------------------------------
+# Self-check / benchmark
+# --------------------------------------------------------------------
+def _random_ngsetup_response(rng):
+    shape = (True,) * rng.choice((1, 1, 2))
+    params = {
+        # open5gs_amf* are not PrintableString: the template must raise exactly when pycrate does
+        "amf_name": rng.choice(("open5gs-amf0", "open5gs-amf1", "AMF", "amf-lab-%d" % rng.randrange(100),
+                                "open5gs_amf1", "open5gs_amf")),
+        "guami_plmn": bytes(rng.randrange(256) for _ in range(3)),
+        "region": rng.randrange(256),
+        "set": rng.randrange(1024),
+        "pointer": rng.randrange(64),
+        "capacity": rng.randrange(256),
+    }
+    for i, has_sst in enumerate(shape):
+        params[f"plmn_{i}"] = bytes(rng.randrange(256) for _ in range(3))
+        if has_sst:
+            params[f"sst_{i}"] = bytes([rng.randrange(256)])
+    return NGSETUP_RESPONSE, shape, params
+
+
+def _random_ue_release(rng):
+    shape = (41, "radioNetwork", rng.choice(("unspecified", "user-inactivity", "radio-connection-with-ue-lost")))
+    params = {
+        "amf_ue_ngap_id": rng.randrange(1 << rng.choice((8, 16, 24, 40))),
+        "ran_ue_ngap_id": rng.randrange(1 << rng.choice((8, 16, 32))),
+    }
+    return UE_CONTEXT_RELEASE_REQUEST, shape, params
+
+
+def _random_ue_release_command(rng):
+    _, (_, cause_dom, cause_name), params = _random_ue_release(rng)
+    return UE_CONTEXT_RELEASE_COMMAND, (cause_dom, cause_name), params
+
+
+def _random_downlink_nas(rng):
+    _, _, params = _random_ue_release(rng)
+    nas = rng.choice((bytes.fromhex("7e005601020000217c6b"), bytes.fromhex("7e005d020004f0f0f0f0")))
+    return DOWNLINK_NAS_TRANSPORT, (nas,), params
+
+
+def _samples(count, seed):
+    rng = random.Random(seed)
+    makers = (_random_ngsetup_response, _random_ngsetup_response, _random_ue_release,
+              _random_ue_release_command, _random_downlink_nas)
+    return [rng.choice(makers)(rng) for _ in range(count)]
+
+
+def _outcome(encode, *args):
+    """Hex of the encoding, or the exception type when the encoder refuses the value."""
+    try:
+        return encode(*args).hex()
+    except Exception as e:
+        return type(e).__name__
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APER template compiler self-check")
+    parser.add_argument("--check", type=int, metavar="N", help="compare N random encodes against pycrate")
+    parser.add_argument("--bench", type=int, metavar="N", help="time N NGSetupResponse encodes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not NGAP_AVAILABLE:
+        print("[!] pycrate_asn1dir not available")
+        return 1
+
+    if args.check:
+        mismatches = 0
+        for tset, shape, params in _samples(args.check, args.seed):
+            got = _outcome(tset.encode, shape, params)
+            want = _outcome(encode_aper, tset.build(shape, params))
+            if got != want:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"[!] Mismatch {shape} {params}: {got} != {want}")
+        print(f"[+] {args.check} messages checked, {mismatches} mismatches")
+        print(f"[*] {NGSETUP_RESPONSE.summary()}")
+        print(f"[*] {UE_CONTEXT_RELEASE_REQUEST.summary()}")
+        print(f"[*] {UE_CONTEXT_RELEASE_COMMAND.summary()}")
+        print(f"[*] {DOWNLINK_NAS_TRANSPORT.summary()}")
+        if mismatches:
+            return 1
+
+    if args.bench:
+        rng = random.Random(args.seed)
+        batch = [_random_ngsetup_response(rng)[2] for _ in range(args.bench)]
+        for params in batch:
+            params["amf_name"] = "open5gs-amf0"
+            for key in ("plmn_1", "sst_1"):
+                params.pop(key, None)
+        shape = (True,)
+        sample = batch[:200]
+        start = time.perf_counter()
+        for params in sample:
+            encode_aper(ngsetup_response_value(shape, params))
+        full = (time.perf_counter() - start) / len(sample)
+        NGSETUP_RESPONSE.get(shape, batch[0])
+        start = time.perf_counter()
+        for params in batch:
+            NGSETUP_RESPONSE.encode(shape, params)
+        patched = (time.perf_counter() - start) / len(batch)
+        print(f"[+] pycrate: {full * 1e6:.1f} us/msg, template: {patched * 1e6:.1f} us/msg "
+              f"({full / patched:.0f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,466 @@
+"""
+ngap_transport.py
+
+Long-lived SCTP associations for sending many NGAP PDUs to an AMF.
+
+Opening an association per PDU pays the four-way SCTP handshake (and the
+AMF's association setup) for every test case. AssociationPool connects
+`size` associations to one (AMF IP, port) once and keeps them:
+
+  - submit() only queues a PDU; queues are written from a selectors loop
+    on non-blocking sockets, so a slow association never stalls the rest.
+  - Non-UE-associated PDUs go on stream 0. UE-associated PDUs are spread
+    over the other outbound streams (TS 38.412) and associations by a UE
+    key, so one UE's messages keep their order while different UEs do not
+    head-of-line block each other.
+  - Every PDU is sent with PPID 60 (NGAP); whatever the AMF sends back is
+    read as it arrives and handed to `on_message`.
+  - With `setup`, every association completes NGSetup before any queued
+    PDU is written on it, so procedures that need an NG-C connection
+    (RANConfigurationUpdate, UE-associated messages) can be fuzzed.
+  - An association the AMF aborts is reopened (and set up again) and keeps
+    its queue; PDUs already handed to the kernel on it may be lost
+    (ResponseMatcher shows which cases went unanswered). The last PDUs
+    written before the abort are kept in `aborts` as suspects. If it
+    cannot be reopened it stays down, queue kept, and is retried every
+    RETRY_INTERVAL seconds from pump().
+
+pool_for() keeps one pool per (AMF IP, port) for the whole process and
+close_pools() flushes and closes them all.
+
+ResponseMatcher pairs AMF answers with the cases sent, by the AMF / RAN
+UE NGAP IDs they carry (ngap_fastpath.decode_ue_ngap_ids).
+
+transport="tcp" replaces SCTP with FramedTcpSocket (length-prefixed NGAP
+over TCP) for boxes without pysctp or kernel SCTP; only mock_amf.py speaks
+it. "auto" picks SCTP when both are present.
+"""
+
+import selectors
+import socket
+import struct
+import time
+from collections import Counter, deque
+
+from ngap_fastpath import NGSETUP_RESPONSE, PDU_UNSUCCESSFUL, PROC_NG_SETUP, decode_ue_ngap_ids, triage
+from sctp_fastpath import NGAP_PPID
+
+try:
+    import sctp  # pysctp
+    SCTP_AVAILABLE = True
+except ImportError:
+    SCTP_AVAILABLE = False
+
+NGAP_PORT = 38412
+DEFAULT_ASSOCIATIONS = 4
+DEFAULT_STREAMS = 8
+RECV_SIZE = 65536
+SETUP_TIMEOUT = 5.0
+RECENT_PDUS = 8              # (label, payload) kept per association for abort reports
+TRANSPORTS = ("auto", "sctp", "tcp")
+FRAME = struct.Struct("!I")  # TCP transport: big-endian PDU length before every PDU
+MAX_FRAME = 1 << 20
+SEND_TIMEOUT = 5.0
+RETRY_INTERVAL = 1.0         # seconds between reopen attempts of a down association
+
+PDU_TYPES = {0: "initiatingMessage", 1: "successfulOutcome", 2: "unsuccessfulOutcome"}
+
+
+class Association:
+    """One connected SCTP association (sock None while down) and the PDUs queued for it."""
+    __slots__ = ("sock", "streams", "queue", "recent", "sent", "received", "retry_at")
+
+    def __init__(self, sock, streams):
+        self.sock = sock
+        self.retry_at = 0.0       # while down: when pump() tries to reopen it
+        self.streams = streams    # negotiated outbound streams
+        self.queue = deque()      # (payload, stream, label) not yet written
+        self.recent = deque(maxlen=RECENT_PDUS)   # (label, payload) last written
+        self.sent = 0
+        self.received = 0
+
+
+class FramedTcpSocket:
+    """
+    TCP stand-in for a pysctp one-to-one socket. sctp_send() writes the PDU
+    behind a 4-byte length (PPID and stream are dropped) and recv() returns
+    exactly one PDU, so message boundaries survive the byte stream. Other
+    socket calls go to the wrapped socket.
+    """
+
+    def __init__(self, sock=None):
+        self.sock = sock if sock is not None else socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = bytearray()
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def sctp_send(self, msg, ppid=0, stream=0):
+        frame = FRAME.pack(len(msg)) + bytes(msg)
+        n = self.sock.send(frame)    # BlockingIOError here: nothing written, retry later
+        if n < len(frame):
+            # part of the frame is out: finish it, or the stream is out of sync
+            timeout = self.sock.gettimeout()
+            self.sock.settimeout(SEND_TIMEOUT)
+            try:
+                self.sock.sendall(frame[n:])
+            finally:
+                self.sock.settimeout(timeout)
+        return len(msg)
+
+    def _frame(self):
+        if len(self.buffer) < FRAME.size:
+            return None
+        (n,) = FRAME.unpack_from(self.buffer)
+        if n > MAX_FRAME:
+            raise ConnectionError(f"bad frame length {n}")
+        if len(self.buffer) < FRAME.size + n:
+            return None
+        data = bytes(self.buffer[FRAME.size:FRAME.size + n])
+        del self.buffer[:FRAME.size + n]
+        return data
+
+    def recv(self, bufsize=RECV_SIZE):
+        while True:
+            data = self._frame()
+            if data is not None:
+                return data
+            chunk = self.sock.recv(max(bufsize, RECV_SIZE))
+            if not chunk:
+                return b""
+            self.buffer += chunk
+
+    def accept(self):
+        conn, addr = self.sock.accept()
+        return FramedTcpSocket(conn), addr
+
+
+def kernel_sctp_available():
+    """True when the kernel can open an SCTP socket (sctp module loaded)."""
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_STREAM, getattr(socket, "IPPROTO_SCTP", 132)).close()
+        return True
+    except OSError:
+        return False
+
+
+def resolve_transport(transport="auto"):
+    """'sctp' or 'tcp'; 'auto' falls back to TCP without pysctp or kernel SCTP."""
+    if transport == "auto":
+        return "sctp" if SCTP_AVAILABLE and kernel_sctp_available() else "tcp"
+    if transport not in TRANSPORTS:
+        raise ValueError(f"unknown transport {transport!r}")
+    return transport
+
+
+def open_socket(transport="sctp"):
+    """A new NGAP client / server socket for `transport`."""
+    if resolve_transport(transport) == "tcp":
+        return FramedTcpSocket()
+    if not SCTP_AVAILABLE:
+        raise RuntimeError("pysctp is not installed (pip install pysctp)")
+    return sctp.sctpsocket_tcp(socket.AF_INET)
+
+
+def _out_streams(sock, requested):
+    try:
+        return max(1, min(requested, sock.get_status().outstrms))
+    except Exception:
+        return requested
+
+
+class AssociationPool:
+    """
+    `size` SCTP associations to one AMF, connected once and reused for
+    every PDU. `on_message(payload, index)` is called for every PDU the AMF
+    sends, with the index of the association it arrived on. `setup(index)`,
+    when given, returns the NGSetupRequest to complete on each association
+    as soon as it is connected. `transport` is one of TRANSPORTS.
+    """
+
+    def __init__(self, amf_ip, amf_port=NGAP_PORT, size=DEFAULT_ASSOCIATIONS,
+                 streams=DEFAULT_STREAMS, on_message=None, setup=None, transport="sctp"):
+        self.transport = resolve_transport(transport)
+        if self.transport == "sctp" and not SCTP_AVAILABLE:
+            raise RuntimeError("pysctp is not installed (pip install pysctp)")
+        self.amf_ip = amf_ip
+        self.amf_port = amf_port
+        self.size = size
+        self.streams = streams
+        self.on_message = on_message
+        self.setup = setup
+        self.selector = selectors.DefaultSelector()
+        self.associations = []
+        self.next = 0
+        self.queued = 0
+        self.sent = 0
+        self.received = 0
+        self.reconnects = 0
+        self.setups = 0
+        self.aborts = []       # (index, error, [(label, payload), ...] last written)
+        for index in range(size):
+            self.associations.append(self._open(index))
+
+    def _open(self, index):
+        s = open_socket(self.transport)
+        if self.transport == "sctp":
+            s.initparams.num_ostreams = self.streams
+            s.initparams.max_instreams = self.streams
+        s.connect((self.amf_ip, self.amf_port))
+        if self.setup is not None:
+            try:
+                self._ng_setup(s, self.setup(index))
+            except (OSError, ConnectionError):
+                s.close()
+                raise
+        s.setblocking(False)
+        assoc = Association(s, _out_streams(s, self.streams))
+        self.selector.register(s.fileno(), selectors.EVENT_READ, index)
+        return assoc
+
+    def _ng_setup(self, s, request):
+        """Send NGSetupRequest on stream 0 and wait for the AMF's answer."""
+        s.settimeout(SETUP_TIMEOUT)
+        s.sctp_send(request, ppid=socket.htonl(NGAP_PPID), stream=0)
+        deadline = time.monotonic() + SETUP_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                data = s.recv(RECV_SIZE)
+            except socket.timeout:
+                break
+            if not data:
+                raise ConnectionError("association closed during NGSetup")
+            key = triage(data)
+            if key == NGSETUP_RESPONSE:
+                self.setups += 1
+                return
+            if key == (PDU_UNSUCCESSFUL, PROC_NG_SETUP):
+                raise ConnectionError("AMF answered NGSetupFailure")
+            if self.on_message is not None:
+                self.on_message(data, None)
+        raise ConnectionError(f"no NGSetupResponse within {SETUP_TIMEOUT:.0f}s")
+
+    def _reopen(self, index, error=None):
+        old = self.associations[index]
+        if old.sock is not None:
+            print(f"[!] Association {index} to {self.amf_ip}:{self.amf_port} failed ({error}); reconnecting")
+            self.selector.unregister(old.sock.fileno())
+            old.sock.close()
+            self.aborts.append((index, str(error), list(old.recent)))
+        try:
+            assoc = self._open(index)
+        except OSError as e:
+            print(f"[!] Association {index}: reconnect failed ({e}); keeping its {len(old.queue)} "
+                  f"queued PDUs, retrying in {RETRY_INTERVAL:.0f}s")
+            down = Association(None, old.streams)
+            down.queue = old.queue
+            down.retry_at = time.monotonic() + RETRY_INTERVAL
+            self.associations[index] = down
+            return
+        assoc.queue = old.queue
+        if assoc.queue:
+            self.selector.modify(assoc.sock.fileno(), selectors.EVENT_READ | selectors.EVENT_WRITE, index)
+        self.associations[index] = assoc
+        self.reconnects += 1
+
+    def submit(self, payload, ue_key=None, label=None):
+        """
+        Queue one PDU. PDUs with the same `ue_key` (e.g. the RAN-UE-NGAP-ID)
+        share an association and stream; None means non-UE-associated.
+        `label` names the PDU in abort reports.
+        """
+        if ue_key is None:
+            index = self.next
+            self.next = (self.next + 1) % self.size
+            stream = 0
+        else:
+            h = hash(ue_key)
+            index = h % self.size
+            n = self.associations[index].streams
+            stream = 1 + (h // self.size) % (n - 1) if n > 1 else 0
+        assoc = self.associations[index]
+        assoc.queue.append((payload, stream, label))
+        self.queued += 1
+        if len(assoc.queue) == 1 and assoc.sock is not None:
+            self.selector.modify(assoc.sock.fileno(), selectors.EVENT_READ | selectors.EVENT_WRITE, index)
+
+    def _write(self, index):
+        assoc = self.associations[index]
+        ppid = socket.htonl(NGAP_PPID)
+        while assoc.queue:
+            payload, stream, label = assoc.queue[0]
+            try:
+                assoc.sock.sctp_send(payload, ppid=ppid, stream=stream)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._reopen(index, e)
+                return
+            assoc.queue.popleft()
+            assoc.recent.append((label, payload))
+            assoc.sent += 1
+            self.sent += 1
+            self.queued -= 1
+        self.selector.modify(assoc.sock.fileno(), selectors.EVENT_READ, index)
+
+    def _read(self, index):
+        assoc = self.associations[index]
+        while True:
+            try:
+                data = assoc.sock.recv(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._reopen(index, e)
+                return
+            if not data:
+                self._reopen(index, "closed by peer")
+                return
+            assoc.received += 1
+            self.received += 1
+            if self.on_message is not None:
+                self.on_message(data, index)
+
+    def pump(self, timeout=0.0):
+        """Run one selector round: write what the sockets accept, read what arrived."""
+        now = time.monotonic()
+        for index, assoc in enumerate(self.associations):
+            if assoc.sock is None and now >= assoc.retry_at:
+                self._reopen(index)
+        for key, events in self.selector.select(timeout):
+            if events & selectors.EVENT_WRITE:
+                self._write(key.data)
+            if events & selectors.EVENT_READ and self.associations[key.data].sock is not None:
+                self._read(key.data)
+
+    def flush(self, timeout=10.0):
+        """Write every queued PDU (reading answers meanwhile). Returns PDUs still queued."""
+        deadline = time.monotonic() + timeout
+        while self.queued and time.monotonic() < deadline:
+            self.pump(min(0.1, max(0.0, deadline - time.monotonic())))
+        return self.queued
+
+    def wait(self, timeout, done=None):
+        """Read answers for up to `timeout` seconds, or until done() is true."""
+        deadline = time.monotonic() + timeout
+        while not (done and done()) and time.monotonic() < deadline:
+            self.pump(min(0.1, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        for assoc in self.associations:
+            if assoc.sock is None:
+                continue
+            try:
+                self.selector.unregister(assoc.sock.fileno())
+            except (KeyError, ValueError):
+                pass
+            assoc.sock.close()
+        self.selector.close()
+        self.associations = []
+
+    def summary(self):
+        down = sum(1 for assoc in self.associations if assoc.sock is None)
+        return (f"{self.amf_ip}:{self.amf_port}/{self.transport}: {self.size} association(s), "
+                f"{self.sent} PDUs sent, {self.received} received, {self.queued} still queued, "
+                f"{self.reconnects} reconnects" +
+                (f", {self.setups} NGSetups" if self.setup is not None else "") +
+                (f", {down} down" if down else ""))
+
+
+_POOLS = {}
+
+
+def pool_for(amf_ip, amf_port=NGAP_PORT, **kwargs):
+    """The process-wide pool for (amf_ip, amf_port), connected on first use."""
+    pool = _POOLS.get((amf_ip, amf_port))
+    if pool is None:
+        pool = _POOLS[(amf_ip, amf_port)] = AssociationPool(amf_ip, amf_port, **kwargs)
+    return pool
+
+
+def pools():
+    return list(_POOLS.values())
+
+
+def close_pools(timeout=10.0):
+    """Flush and close every pool opened by pool_for()."""
+    for pool in pools():
+        left = pool.flush(timeout)
+        if left:
+            print(f"[!] {left} PDUs to {pool.amf_ip}:{pool.amf_port} were never written")
+        pool.close()
+    _POOLS.clear()
+
+
+class ResponseMatcher:
+    """
+    Matches AMF answers to sent UE-associated cases by their UE NGAP IDs:
+    the (AMF, RAN) pair first, then either ID alone (UEContextReleaseCommand
+    may carry only the AMF-UE-NGAP-ID). Cases sent with the same IDs are
+    answered oldest first. Use on_message as the pool callback.
+    """
+
+    def __init__(self):
+        self.pending = {}      # (amf id, ran id) -> deque of (label, sent at), oldest first
+        self.by_amf = {}       # amf id -> deque of (amf id, ran id) keys, oldest first
+        self.by_ran = {}
+        self.outstanding = 0
+        self.results = []      # (label, answer, latency in seconds)
+        self.unmatched = 0
+        self.answers = Counter()
+
+    def expect(self, amf_id, ran_id, label):
+        key = (amf_id, ran_id)
+        self.pending.setdefault(key, deque()).append((label, time.monotonic()))
+        self.by_amf.setdefault(amf_id, deque()).append(key)
+        self.by_ran.setdefault(ran_id, deque()).append(key)
+        self.outstanding += 1
+
+    @staticmethod
+    def _forget(index, id_, key):
+        keys = index[id_]
+        keys.remove(key)       # first (oldest) occurrence
+        if not keys:
+            del index[id_]
+
+    def on_message(self, payload, index=None):
+        ids = decode_ue_ngap_ids(payload)
+        key = None
+        if ids is not None:
+            amf_id, ran_id = ids
+            if ids in self.pending:
+                key = ids
+            elif amf_id in self.by_amf:
+                key = self.by_amf[amf_id][0]
+            elif ran_id in self.by_ran:
+                key = self.by_ran[ran_id][0]
+        if key is None:
+            self.unmatched += 1
+            return
+        cases = self.pending[key]
+        label, sent_at = cases.popleft()
+        if not cases:
+            del self.pending[key]
+        self._forget(self.by_amf, key[0], key)
+        self._forget(self.by_ran, key[1], key)
+        self.outstanding -= 1
+        answer = describe(payload)
+        self.answers[answer] += 1
+        self.results.append((label, answer, time.monotonic() - sent_at))
+
+    def done(self):
+        return not self.outstanding
+
+    def summary(self):
+        detail = ", ".join(f"{n} {answer}" for answer, n in self.answers.most_common())
+        return (f"{len(self.results)} matched ({detail or 'none'}), {self.outstanding} unanswered, "
+                f"{self.unmatched} unmatched answers")
+
+
+def describe(payload):
+    """'<pduType>/<procedureCode>' of an NGAP PDU, from its first two bytes."""
+    key = triage(payload)
+    if key is None:
+        return "unknown"
+    return f"{PDU_TYPES.get(key[0], key[0])}/{key[1]}"
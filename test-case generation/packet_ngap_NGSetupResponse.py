@@ -26,6 +26,8 @@ except Exception as e:
 
 from pycrate_asn1rt.err import ASN1ObjErr
 
+from ngap_template import NGSETUP_RESPONSE
+
 
 # --------------------------------------------------------------------
 # Helper functions
@@ -54,65 +56,40 @@ def load_json(json_path):
 # Build NGAP message
 # --------------------------------------------------------------------
 def build_ngap_ngsetup_response(amf_name, served_guami, amf_capacity, plmn_list):
-    """Use pycrate_asn1dir to construct NGSetupResponse with direct native values."""
-    PDU = NGAP.NGAP_PDU_Descriptions.NGAP_PDU
+    """
+    Construct NGSetupResponse with direct native values.
 
+    The first message of each shape (number of PLMN items / slices) is
+    encoded by pycrate; later ones patch the compiled APER template
+    (ngap_template.py) and only go back to pycrate when a length changes.
+    """
     # Build GUAMI
     mcc = served_guami.get("mcc", "999")
     mnc = served_guami.get("mnc", "70")
-    plmn_bytes = encode_plmn_identity(mcc, mnc)
-    region = int(served_guami.get("amf_region_id", "01"), 16)
-    setid  = int(served_guami.get("amf_set_id", "0001"), 16)
-    pointer= int(served_guami.get("amf_pointer", "00"), 16)
-
-    guami_val = {
-        # ✅ OCTET STRING as raw bytes
-        "pLMNIdentity": plmn_bytes,
-        # ✅ BIT STRINGs as (value, bitlen)
-        "aMFRegionID": (region, 8),
-        "aMFSetID":    (setid, 10),
-        "aMFPointer":  (pointer, 6),
+    params = {
+        "amf_name": str(amf_name),
+        # OCTET STRING as raw bytes, BIT STRINGs as integers of 8/10/6 bits
+        "guami_plmn": encode_plmn_identity(mcc, mnc),
+        "region": int(served_guami.get("amf_region_id", "01"), 16),
+        "set": int(served_guami.get("amf_set_id", "0001"), 16),
+        "pointer": int(served_guami.get("amf_pointer", "00"), 16),
+        "capacity": int(amf_capacity),
     }
-    served_guami_list = [{"gUAMI": guami_val}]
 
     # Build PLMNSupportList
-    plmn_items = []
-    for item in plmn_list:
+    shape = []
+    for i, item in enumerate(plmn_list):
         mcc_plmn = item.get("mcc", "999")
         mnc_plmn = item.get("mnc", "70")
-        plmn_bytes_item = encode_plmn_identity(mcc_plmn, mnc_plmn)
-
-        # ✅ OCTET STRING as raw bytes
-        entry = {"pLMNIdentity": plmn_bytes_item}
+        params[f"plmn_{i}"] = encode_plmn_identity(mcc_plmn, mnc_plmn)
 
         # sST is OCTET STRING (SIZE(1)) → 1-byte
+        shape.append("sst" in item)
         if "sst" in item:
-            sst_val = int(item.get("sst", "01"), 16)
-            entry["sliceSupportList"] = [
-                {"s-NSSAI": {"sST": bytes([sst_val])}}
-            ]
-        plmn_items.append(entry)
-
-    # Build IEs
-    ies = [
-        {"id": 1,  "criticality": "reject", "value": ("AMFName", str(amf_name))},
-        {"id": 96, "criticality": "reject", "value": ("ServedGUAMIList", served_guami_list)},
-        {"id": 86, "criticality": "reject", "value": ("RelativeAMFCapacity", int(amf_capacity))},
-        {"id": 80, "criticality": "reject", "value": ("PLMNSupportList", plmn_items)},
-    ]
-
-    pdu_val = (
-        "successfulOutcome",
-        {
-            "procedureCode": 21,  # id-NGSetup
-            "criticality": "reject",
-            "value": ("NGSetupResponse", {"protocolIEs": ies}),
-        },
-    )
+            params[f"sst_{i}"] = bytes([int(item.get("sst", "01"), 16)])
 
     try:
-        PDU.set_val(pdu_val)
-        aper_bytes = PDU.to_aper()
+        aper_bytes = NGSETUP_RESPONSE.encode(tuple(shape), params)
         print("[+] NGSetupResponse ASN.1 encoding successful")
         return aper_bytes
     except ASN1ObjErr as e:
@@ -0,0 +1,316 @@
+"""
+sctp_fastpath.py
+
+Raw-bytes SCTP chunk extraction for the offline analysis tools.
+
+Reads the Ethernet / IPv4 / SCTP headers straight from the frame bytes and
+walks the chunk TLVs, dispatching on the chunk type code instead of building
+Scapy layer objects. Frames it does not understand (other link types, IP
+fragments, tunnels, malformed chunk lengths, I-DATA, ...) are reported back
+so the caller can fall back to Scapy dissection for just those frames.
+"""
+
+import socket
+import struct
+from collections import OrderedDict, deque, namedtuple
+
+# SCTP chunk type codes (RFC 4960 section 3.2)
+CHUNK_DATA = 0
+CHUNK_INIT = 1
+CHUNK_INIT_ACK = 2
+CHUNK_SACK = 3
+CHUNK_SHUTDOWN = 7
+CHUNK_IDATA = 64
+
+# DATA chunk flags
+DATA_FLAG_UNORDERED = 0x04
+DATA_FLAG_BEGIN = 0x02
+DATA_FLAG_END = 0x01
+DATA_FLAGS_WHOLE = DATA_FLAG_BEGIN | DATA_FLAG_END
+
+NGAP_PPID = 60
+
+# Per association direction: how many recent DATA TSNs are remembered to
+# spot retransmissions, and how many fragment bytes may wait for reassembly.
+TSN_DEDUP_WINDOW = 16384
+REASSEMBLY_MAX_BYTES = 1 << 20
+
+LINKTYPE_ETHERNET = 1
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+ETHERTYPE_IGNORED = (0x0806, 0x86DD)   # ARP, IPv6: never carry the IPv4 SCTP we analyze
+IPPROTO_SCTP = 132
+IPPROTO_TUNNELS = (4, 41, 47)          # IP-in-IP, 6in4, GRE: let Scapy look inside
+
+# One SCTP chunk reduced to the plain values the analyzers need.
+# INIT/INIT-ACK carry their Initial TSN in `tsn`; SACK (and SHUTDOWN, which
+# also carries a cumulative TSN ack) carries the cumulative TSN ack there.
+# `flags` is the DATA chunk flags byte (U/B/E), None for other chunks or when unknown.
+SCTPChunk = namedtuple(
+    "SCTPChunk",
+    "eth_src eth_dst ip_src ip_dst sport dport vtag ctype tsn init_tag sid ssn ppid payload flags",
+)
+
+_unpack_sctp_header = struct.Struct("!HHI").unpack_from
+_unpack_chunk_header = struct.Struct("!BBH").unpack_from
+_unpack_data_header = struct.Struct("!IHHI").unpack_from
+_unpack_init = struct.Struct("!I8xI").unpack_from
+_unpack_u32 = struct.Struct("!I").unpack_from
+_unpack_u16 = struct.Struct("!H").unpack_from
+
+# Sentinel returned by parse_frame() when Scapy has to take over.
+FALLBACK = None
+
+
+def parse_frame(frame, linktype=LINKTYPE_ETHERNET):
+    """
+    Parse one captured frame.
+
+    Returns a list of SCTPChunk (empty when the frame is not IPv4 SCTP and can
+    be skipped) or FALLBACK (None) when the frame needs full Scapy dissection.
+    Only DATA, INIT, INIT-ACK and SACK/SHUTDOWN chunks are returned; the DATA
+    payload is only sliced out for NGAP (PPID 60), as the same type as `frame`.
+    """
+    if linktype != LINKTYPE_ETHERNET:
+        return FALLBACK
+
+    flen = len(frame)
+    if flen < 14:
+        return FALLBACK
+    off = 12
+    ethertype = _unpack_u16(frame, off)[0]
+    while ethertype in ETHERTYPE_VLAN:
+        off += 4
+        if flen < off + 2:
+            return FALLBACK
+        ethertype = _unpack_u16(frame, off)[0]
+    off += 2
+
+    if ethertype != ETHERTYPE_IPV4:
+        return [] if ethertype in ETHERTYPE_IGNORED else FALLBACK
+
+    if flen < off + 20:
+        return FALLBACK
+    ver_ihl = frame[off]
+    ihl = (ver_ihl & 0x0F) * 4
+    if ver_ihl >> 4 != 4 or ihl < 20:
+        return FALLBACK
+    proto = frame[off + 9]
+    if proto != IPPROTO_SCTP:
+        return FALLBACK if proto in IPPROTO_TUNNELS else []
+    if _unpack_u16(frame, off + 6)[0] & 0x3FFF:
+        return FALLBACK   # fragmented: MF set or non-zero offset
+    ip_end = off + _unpack_u16(frame, off + 2)[0]
+    if ip_end > flen or ip_end < off + ihl + 12:
+        return FALLBACK
+    ip_src = socket.inet_ntoa(frame[off + 12:off + 16])
+    ip_dst = socket.inet_ntoa(frame[off + 16:off + 20])
+
+    off += ihl
+    sport, dport, vtag = _unpack_sctp_header(frame, off)
+    off += 12
+
+    eth_dst = eth_src = None
+    chunks = []
+    while off + 4 <= ip_end:
+        ctype, flags, clen = _unpack_chunk_header(frame, off)
+        if clen < 4 or off + clen > ip_end:
+            return FALLBACK
+
+        if ctype == CHUNK_DATA:
+            if clen < 16:
+                return FALLBACK
+            tsn, sid, ssn, ppid = _unpack_data_header(frame, off + 4)
+            # For memoryview frames (MmapPcapReader) this stays a view into
+            # the capture; consumers copy it only when they must.
+            payload = frame[off + 16:off + clen] if ppid == NGAP_PPID else None
+            chunk = (CHUNK_DATA, tsn, None, sid, ssn, ppid, payload, flags)
+        elif ctype == CHUNK_INIT or ctype == CHUNK_INIT_ACK:
+            if clen < 20:
+                return FALLBACK
+            init_tag, init_tsn = _unpack_init(frame, off + 4)
+            chunk = (ctype, init_tsn, init_tag, None, None, None, None, None)
+        elif ctype == CHUNK_SACK or ctype == CHUNK_SHUTDOWN:
+            if clen < 8:
+                return FALLBACK
+            chunk = (CHUNK_SACK, _unpack_u32(frame, off + 4)[0], None, None, None, None, None, None)
+        elif ctype == CHUNK_IDATA:
+            return FALLBACK
+        else:
+            chunk = None
+
+        if chunk is not None:
+            if eth_dst is None:
+                eth_dst = bytes(frame[0:6]).hex(":")
+                eth_src = bytes(frame[6:12]).hex(":")
+            chunks.append(SCTPChunk(eth_src, eth_dst, ip_src, ip_dst, sport, dport, vtag, *chunk))
+
+        off += (clen + 3) & ~3
+    return chunks
+
+
+class FastPathStats:
+    """Counters for how frames were handled by iter_raw_chunks()."""
+    __slots__ = ("frames", "fast", "fallback", "skipped")
+
+    def __init__(self):
+        self.frames = 0
+        self.fast = 0
+        self.fallback = 0
+        self.skipped = 0
+
+    def summary(self):
+        return (f"{self.frames} frames: {self.fast} SCTP via fast path, "
+                f"{self.fallback} via Scapy fallback, {self.skipped} skipped")
+
+
+def iter_raw_chunks(frames, linktype, fallback, stats=None):
+    """
+    Yield SCTPChunk records for raw `frames` (bytes-like objects).
+
+    `fallback(frame, linktype)` is called for frames parse_frame() cannot
+    handle and must return an iterable of SCTPChunk (typically by dissecting
+    the frame with Scapy).
+    """
+    if stats is None:
+        stats = FastPathStats()
+    for frame in frames:
+        stats.frames += 1
+        chunks = parse_frame(frame, linktype)
+        if chunks is FALLBACK:
+            stats.fallback += 1
+            yield from fallback(frame, linktype)
+        elif chunks:
+            stats.fast += 1
+            yield from chunks
+        else:
+            stats.skipped += 1
+
+
+class DataReassembler:
+    """
+    Per-association DATA chunk filter run before any NGAP decode.
+
+    Retransmitted chunks are dropped by TSN (remembering the last
+    TSN_DEDUP_WINDOW TSNs per direction). Fragmented user messages are
+    joined by TSN and B/E flags; fragments of one message always carry
+    consecutive TSNs. Buffered fragments are bounded by `max_bytes` per
+    direction, oldest first out.
+    """
+    __slots__ = ("max_bytes", "window", "_seen", "_fragments", "_buffered",
+                 "duplicates", "reassembled", "evicted", "last_refs")
+
+    def __init__(self, max_bytes=REASSEMBLY_MAX_BYTES, window=TSN_DEDUP_WINDOW):
+        self.max_bytes = max_bytes
+        self.window = window
+        self._seen = {}        # direction -> (set of TSNs, deque in arrival order)
+        self._fragments = {}   # direction -> OrderedDict tsn -> (chunk, ref)
+        self._buffered = {}    # direction -> fragment payload bytes held
+        self.duplicates = 0
+        self.reassembled = 0
+        self.evicted = 0
+        self.last_refs = []    # refs of the chunks behind the last message returned
+
+    def _is_duplicate(self, direction, tsn):
+        seen = self._seen.get(direction)
+        if seen is None:
+            seen = self._seen[direction] = (set(), deque())
+        tsns, order = seen
+        if tsn in tsns:
+            return True
+        tsns.add(tsn)
+        order.append(tsn)
+        if len(order) > self.window:
+            tsns.discard(order.popleft())
+        return False
+
+    def push(self, ch, ref=None):
+        """
+        Feed one DATA SCTPChunk. Returns the chunk to analyze - the chunk
+        itself, or for the last fragment a copy carrying the whole message
+        - or None for retransmissions and incomplete messages. `ref` is any
+        caller token (e.g. a frame index entry) collected in `last_refs`.
+        """
+        direction = (ch.ip_src, ch.sport)
+        if ch.tsn is not None and self._is_duplicate(direction, ch.tsn):
+            self.duplicates += 1
+            return None
+        if ch.tsn is None or ch.flags is None or ch.flags & DATA_FLAGS_WHOLE == DATA_FLAGS_WHOLE:
+            self.last_refs = [ref]
+            return ch
+
+        frags = self._fragments.get(direction)
+        if frags is None:
+            frags = self._fragments[direction] = OrderedDict()
+            self._buffered[direction] = 0
+        if ch.payload is not None and not isinstance(ch.payload, bytes):
+            ch = ch._replace(payload=bytes(ch.payload))  # do not pin the capture mapping
+        frags[ch.tsn] = (ch, ref)
+        self._buffered[direction] += len(ch.payload or b"")
+
+        message = self._complete(frags, ch.tsn)
+        if message is None:
+            while self._buffered[direction] > self.max_bytes and frags:
+                old, _ = frags.popitem(last=False)[1]
+                self._buffered[direction] -= len(old.payload or b"")
+                self.evicted += 1
+            return None
+
+        parts = [frags.pop(tsn) for tsn in message]
+        self._buffered[direction] -= sum(len(part.payload or b"") for part, _ in parts)
+        self.reassembled += 1
+        self.last_refs = [r for _, r in parts]
+        first, last = parts[0][0], parts[-1][0]
+        payload = b"".join(part.payload or b"" for part, _ in parts) if first.payload is not None else None
+        # the message is analyzed as of its last fragment (highest TSN)
+        return last._replace(payload=payload, flags=(first.flags & DATA_FLAG_UNORDERED) | DATA_FLAGS_WHOLE)
+
+    @staticmethod
+    def _complete(frags, tsn):
+        """TSNs (in order) of the complete B..E run containing `tsn`, else None."""
+        start = tsn
+        while not frags[start][0].flags & DATA_FLAG_BEGIN:
+            start = (start - 1) & 0xFFFFFFFF
+            if start not in frags:
+                return None
+        end = tsn
+        while not frags[end][0].flags & DATA_FLAG_END:
+            end = (end + 1) & 0xFFFFFFFF
+            if end not in frags:
+                return None
+        run = [start]
+        while run[-1] != end:
+            run.append((run[-1] + 1) & 0xFFFFFFFF)
+        return run
+
+    def to_state(self, seen_tail=None):
+        """
+        JSON-able snapshot; buffered fragment payloads are hex encoded.
+        `seen_tail` keeps only the most recent TSNs of each dedup window.
+        """
+        return {
+            "max_bytes": self.max_bytes,
+            "window": self.window,
+            "seen": [[list(d), list(order)[-seen_tail:] if seen_tail else list(order)]
+                     for d, (_, order) in self._seen.items()],
+            "fragments": [[list(d), [[list(ch[:-2]), ch.payload.hex() if ch.payload is not None else None,
+                                      ch.flags, ref] for ch, ref in frags.values()]]
+                          for d, frags in self._fragments.items()],
+            "counters": [self.duplicates, self.reassembled, self.evicted],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        r = cls(state["max_bytes"], state["window"])
+        for d, order in state["seen"]:
+            r._seen[tuple(d)] = (set(order), deque(order))
+        for d, frags in state["fragments"]:
+            d = tuple(d)
+            r._fragments[d] = OrderedDict()
+            r._buffered[d] = 0
+            for fields, payload, flags, ref in frags:
+                ch = SCTPChunk(*fields, bytes.fromhex(payload) if payload is not None else None, flags)
+                r._fragments[d][ch.tsn] = (ch, ref)
+                r._buffered[d] += len(ch.payload or b"")
+        r.duplicates, r.reassembled, r.evicted = state["counters"]
+        return r
@@ -0,0 +1,224 @@
+"""
+sctp_flows.py
+
+Association bookkeeping shared by testcase_generation_scenario2.py and
+capture_index.py: SCTPFlowTable maps SCTP chunks to one record per
+association, and scapy_fallback() / iter_sctp_chunks() turn frames the raw
+fast path (sctp_fastpath.py) rejects into the same SCTPChunk records with
+Scapy.
+
+SCTPFlow is the bare record (endpoints, verification tags, DATA
+reassembler); the generator subclasses the table with its analyzing
+SCTPAssociation as `association_class`.
+"""
+
+from scapy.all import conf
+from scapy.layers.inet import IP
+from scapy.layers.l2 import Ether
+from scapy.packet import bind_layers
+
+try:
+    from scapy.contrib.sctp import SCTP, SCTPChunkData, SCTPChunkSACK
+    try:
+        bind_layers(IP, SCTP, proto=132)
+    except Exception:
+        pass
+except Exception:
+    SCTP = None
+    SCTPChunkData = None
+    SCTPChunkSACK = None
+
+from sctp_fastpath import (
+    CHUNK_DATA, CHUNK_INIT, CHUNK_INIT_ACK, CHUNK_SACK, REASSEMBLY_MAX_BYTES, DataReassembler, SCTPChunk,
+)
+
+
+def _chunk_payload(ch):
+    """Return the user data carried by a Scapy DATA chunk as bytes."""
+    ngap_payload = None
+    if hasattr(ch, "data"):
+        try:
+            data_attr = ch.data
+            if data_attr is not None:
+                ngap_payload = bytes(data_attr)
+        except Exception:
+            pass
+
+    if not ngap_payload and hasattr(ch, "load"):
+        try:
+            load_bytes = bytes(ch.load)
+            if load_bytes:
+                ngap_payload = load_bytes
+        except Exception:
+            pass
+
+    if not ngap_payload and hasattr(ch, "payload"):
+        try:
+            payload_obj = ch.payload
+            if payload_obj:
+                if hasattr(payload_obj, "load"):
+                    ngap_payload = bytes(payload_obj.load)
+                else:
+                    ngap_payload = bytes(payload_obj)
+        except Exception:
+            pass
+    return ngap_payload
+
+
+def _data_flags(ch):
+    """U/B/E flags byte of a Scapy DATA chunk, None if the layer does not expose them."""
+    if not hasattr(ch, "beginning"):
+        return None
+    return (int(getattr(ch, "unordered", 0) or 0) << 2) | (int(ch.beginning or 0) << 1) | int(ch.ending or 0)
+
+
+def iter_sctp_chunks(packets):
+    """Dissect packets with Scapy and yield one SCTPChunk per relevant chunk (slow path)."""
+    for pkt in packets:
+        if not pkt.haslayer(IP):
+            continue
+        ip = pkt[IP]
+
+        sctp_root = None
+        try:
+            if SCTP is not None and pkt.haslayer(SCTP):
+                sctp_root = pkt[SCTP]
+        except Exception:
+            sctp_root = None
+        if sctp_root is None:
+            try:
+                sctp_root = pkt["SCTP"]
+            except Exception:
+                sctp_root = None
+        if not sctp_root:
+            continue
+
+        chunks = list(getattr(sctp_root, "chunks", []) or [])
+        if not chunks:
+            ch_iter = getattr(sctp_root, "payload", None)
+            while ch_iter is not None and hasattr(ch_iter, "name") and str(ch_iter.name).startswith("SCTPChunk"):
+                chunks.append(ch_iter)
+                ch_iter = getattr(ch_iter, "payload", None)
+        if not chunks:
+            chunks = [sctp_root]
+
+        eth_src = pkt[Ether].src if pkt.haslayer(Ether) else None
+        eth_dst = pkt[Ether].dst if pkt.haslayer(Ether) else None
+        sport = getattr(sctp_root, "sport", None)
+        dport = getattr(sctp_root, "dport", None)
+        vtag = getattr(sctp_root, "tag", None)
+
+        for ch in chunks:
+            chn = ch.__class__.__name__
+
+            is_sack = hasattr(ch, "cumul_tsn_ack") or hasattr(ch, "cum_tsn_ack") or chn.endswith("SACK")
+            is_data = hasattr(ch, "tsn") or chn.endswith("Data") or (SCTPChunkData and isinstance(ch, SCTPChunkData))
+            is_init = hasattr(ch, "initiate_tag") or chn.endswith("INIT") or (hasattr(ch, "type") and getattr(ch, "type", None) == 1)
+            is_init_ack = hasattr(ch, "initiate_tag") and hasattr(ch, "state_cookie") or chn.endswith("INIT-ACK") or (hasattr(ch, "type") and getattr(ch, "type", None) == 2)
+
+            if is_init or is_init_ack:
+                init_tsn = getattr(ch, "init_tsn", getattr(ch, "initial_tsn", None))
+                if init_tsn is None:
+                    continue
+                init_tag = getattr(ch, "init_tag", getattr(ch, "initiate_tag", None))
+                yield SCTPChunk(eth_src, eth_dst, ip.src, ip.dst, sport, dport, vtag,
+                                CHUNK_INIT if is_init else CHUNK_INIT_ACK,
+                                init_tsn, init_tag, None, None, None, None, None)
+            elif is_sack:
+                cumulative = getattr(ch, "cum_tsn_ack", getattr(ch, "cumul_tsn_ack", None))
+                yield SCTPChunk(eth_src, eth_dst, ip.src, ip.dst, sport, dport, vtag,
+                                CHUNK_SACK, cumulative, None, None, None, None, None, None)
+            elif is_data:
+                ppid_val = getattr(ch, "ppid", getattr(ch, "proto_id", None))
+                yield SCTPChunk(eth_src, eth_dst, ip.src, ip.dst, sport, dport, vtag, CHUNK_DATA,
+                                getattr(ch, "tsn", None),
+                                None,
+                                getattr(ch, "stream_id", getattr(ch, "sid", None)),
+                                getattr(ch, "stream_seq", getattr(ch, "ssn", None)),
+                                ppid_val,
+                                _chunk_payload(ch) if ppid_val == 60 else None,
+                                _data_flags(ch))
+
+
+def scapy_fallback(frame, linktype):
+    """Dissect one raw frame with Scapy; used for frames the fast path rejects."""
+    cls = conf.l2types.get(linktype)
+    if cls is None:
+        return ()
+    try:
+        pkt = cls(bytes(frame))
+    except Exception:
+        return ()
+    return iter_sctp_chunks([pkt])
+
+
+class SCTPFlow:
+    """One association as the flow table sees it: 4-tuple, tags and DATA reassembler."""
+    __slots__ = ("index", "endpoints", "tags", "reassembler")
+
+    def __init__(self, index, endpoints, reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
+        self.index = index
+        self.endpoints = endpoints
+        self.tags = []
+        self.reassembler = DataReassembler(reassembly_max_bytes)
+
+
+class SCTPFlowTable:
+    """
+    Flow table mapping chunks to association records.
+
+    Associations are keyed by the (unordered) SCTP 4-tuple plus verification
+    tag. Each side of an association uses the tag its peer chose in INIT /
+    INIT-ACK, so both tags are registered against the same record. A new INIT
+    on a known 4-tuple (e.g. gNB restart) starts a new association.
+    Records are instances of `association_class`.
+    """
+    association_class = SCTPFlow
+
+    def __init__(self, reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
+        self.associations = []
+        self._by_tag = {}
+        self._latest = {}
+        self.reassembly_max_bytes = reassembly_max_bytes
+
+    @staticmethod
+    def endpoints(ip_src, sport, ip_dst, dport):
+        a = (ip_src, sport)
+        b = (ip_dst, dport)
+        return (a, b) if a <= b else (b, a)
+
+    def _new(self, endpoints):
+        assoc = self.association_class(len(self.associations), endpoints, self.reassembly_max_bytes)
+        self.associations.append(assoc)
+        self._latest[endpoints] = assoc
+        return assoc
+
+    def _register(self, endpoints, tag, assoc):
+        if tag and (endpoints, tag) not in self._by_tag:
+            self._by_tag[(endpoints, tag)] = assoc
+            assoc.tags.append(tag)
+
+    def lookup(self, ch):
+        """Return the association a chunk belongs to, creating it if needed."""
+        endpoints = self.endpoints(ch.ip_src, ch.sport, ch.ip_dst, ch.dport)
+
+        if ch.ctype == CHUNK_INIT:
+            assoc = self._by_tag.get((endpoints, ch.init_tag))
+            if assoc is None:
+                assoc = self._new(endpoints)
+                self._register(endpoints, ch.init_tag, assoc)
+            return assoc
+
+        assoc = self._by_tag.get((endpoints, ch.vtag))
+        if assoc is None:
+            # Capture may start mid-association: attach the first unknown tag
+            # to the latest association on this 4-tuple if it still has room.
+            assoc = self._latest.get(endpoints)
+            if assoc is None or len(assoc.tags) >= 2:
+                assoc = self._new(endpoints)
+            self._register(endpoints, ch.vtag, assoc)
+
+        if ch.ctype == CHUNK_INIT_ACK:
+            self._register(endpoints, ch.init_tag, assoc)
+        return assoc
+
@@ -0,0 +1,375 @@
+"""
+synthetic_capture.py
+
+Deterministic generator of large, realistic lab captures for throughput and
+memory benchmarks of the analysis tools (testcase_generation_scenario2.py,
+capture_index.py, ...).
+
+Payloads come from the repo's own builders:
+  - NGSetupRequest:  Fuzzing/Scenario 1/gnodebid.py create_correct_ng_setup()
+                     (gNB ID and RAN node name patched per gNB)
+  - NGSetupResponse: packet_ngap_NGSetupResponse.build_ngap_ngsetup_response()
+  - PFCP:            Fuzzing/Scenario 3/smf_dynamic_attack.py build_pfcp_*()
+
+Frames are packed with struct and written straight to a classic pcap, so
+10^6 packets take seconds rather than the minutes Scapy would need. The
+same --seed always produces the same file.
+
+Usage:
+    python synthetic_capture.py --out bench.pcap --gnbs 2000 --noise 20 --pfcp-sessions 5000
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import socket
+import struct
+import time
+
+try:
+    import crc32c as _crc32c
+    CRC32C_AVAILABLE = True
+except ImportError:
+    CRC32C_AVAILABLE = False
+
+try:
+    import pycrate_asn1dir  # noqa: F401  (needed by packet_ngap_NGSetupResponse)
+    NGAP_AVAILABLE = True
+except ImportError:
+    NGAP_AVAILABLE = False
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(HERE)
+SCENARIO1_NGSETUP = os.path.join(REPO_ROOT, "Fuzzing", "Scenario 1", "gnodebid.py")
+SCENARIO3_PFCP = os.path.join(REPO_ROOT, "Fuzzing", "Scenario 3", "smf_dynamic_attack.py")
+
+NGAP_PORT = 38412
+NGAP_PPID = 60
+PFCP_PORT = 8805
+GTPU_PORT = 2152
+SBI_PORT = 7777
+
+AMF_IP = "10.10.0.1"
+SMF_IP = "10.10.0.2"
+UPF_IP = "10.10.0.3"
+AMF_MAC = bytes.fromhex("020000aa0001")
+SMF_MAC = bytes.fromhex("020000aa0002")
+UPF_MAC = bytes.fromhex("020000aa0003")
+TEMPLATE_RAN_NODE_NAME = b"safemalwarescanner123"
+
+_eth_header = struct.Struct("!6s6sH")
+_ipv4_header = struct.Struct("!BBHHHBBH4s4s")
+_sctp_header = struct.Struct("!HHII")
+_data_chunk = struct.Struct("!BBHIHHI")
+_record_header = struct.Struct("<IIII")
+
+
+def load_module(name, path):
+    """Import a repo script by path (the Fuzzing scripts are not packages)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# --------------------------------------------------------------------
+# Frame building
+# --------------------------------------------------------------------
+def _ip_checksum(header):
+    total = sum(struct.unpack("!10H", header))
+    total = (total & 0xFFFF) + (total >> 16)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _sctp_crc32c(packet):
+    if CRC32C_AVAILABLE:
+        return struct.pack("<I", _crc32c.crc32c(packet))
+    from scapy.layers.sctp import crc32c
+    return struct.pack(">I", crc32c(packet))
+
+
+class FrameBuilder:
+    """Ethernet / IPv4 / {SCTP, UDP, TCP, ICMP} frames from raw bytes."""
+
+    def __init__(self, checksums=False):
+        self.checksums = checksums
+        self._ip_id = 0
+
+    def ipv4(self, src_mac, dst_mac, src, dst, proto, payload):
+        self._ip_id = (self._ip_id + 1) & 0xFFFF
+        header = _ipv4_header.pack(0x45, 0, 20 + len(payload), self._ip_id, 0x4000, 64, proto, 0,
+                                   socket.inet_aton(src), socket.inet_aton(dst))
+        header = header[:10] + struct.pack("!H", _ip_checksum(header)) + header[12:]
+        return _eth_header.pack(dst_mac, src_mac, 0x0800) + header + payload
+
+    def sctp(self, src_mac, dst_mac, src, dst, sport, dport, vtag, chunks):
+        packet = _sctp_header.pack(sport, dport, vtag, 0) + b"".join(chunks)
+        if self.checksums:
+            packet = packet[:8] + _sctp_crc32c(packet) + packet[12:]
+        return self.ipv4(src_mac, dst_mac, src, dst, 132, packet)
+
+    def udp(self, src_mac, dst_mac, src, dst, sport, dport, payload):
+        # UDP checksum 0 = not computed, valid for IPv4
+        return self.ipv4(src_mac, dst_mac, src, dst, 17, struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload)
+
+
+def _chunk(ctype, flags, body):
+    chunk = struct.pack("!BBH", ctype, flags, 4 + len(body)) + body
+    return chunk + b"\x00" * (-len(chunk) % 4)
+
+
+def init_chunk(ctype, init_tag, init_tsn):
+    # a_rwnd 106496, 2 outbound / 2 inbound streams
+    return _chunk(ctype, 0, struct.pack("!IIHHI", init_tag, 106496, 2, 2, init_tsn))
+
+
+def data_chunk(tsn, sid, ssn, payload, flags=0x03, ppid=NGAP_PPID):
+    chunk = _data_chunk.pack(0, flags, 16 + len(payload), tsn, sid, ssn, ppid) + payload
+    return chunk + b"\x00" * (-len(chunk) % 4)
+
+
+def sack_chunk(cumulative_tsn):
+    return _chunk(3, 0, struct.pack("!IIHH", cumulative_tsn, 106496, 0, 0))
+
+
+def data_chunks(tsn, sid, ssn, payload, fragment_size):
+    """DATA chunk(s) for one user message, split into B/E fragments over fragment_size."""
+    if not fragment_size or len(payload) <= fragment_size:
+        return [data_chunk(tsn, sid, ssn, payload)]
+    parts = [payload[i:i + fragment_size] for i in range(0, len(payload), fragment_size)]
+    chunks = []
+    for n, part in enumerate(parts):
+        flags = (0x02 if n == 0 else 0) | (0x01 if n == len(parts) - 1 else 0)
+        chunks.append(data_chunk((tsn + n) & 0xFFFFFFFF, sid, ssn, part, flags))
+    return chunks
+
+
+# --------------------------------------------------------------------
+# Flows: generators of raw frames, interleaved by the writer
+# --------------------------------------------------------------------
+class Payloads:
+    """NGAP / PFCP payloads produced once with the repo builders and reused."""
+
+    def __init__(self, plmn=("999", "70"), sst="01"):
+        s1 = load_module("scenario1_gnodebid", SCENARIO1_NGSETUP)
+        self.pfcp = load_module("scenario3_smf_dynamic_attack", SCENARIO3_PFCP)
+        import packet_ngap_NGSetupResponse as ngsetup_response
+
+        self.ngsetup_request = s1.create_correct_ng_setup()
+        self._gnb_id_offset = 16          # 32-bit gNB-ID inside GlobalRANNodeID
+        self._name_offset = self.ngsetup_request.index(TEMPLATE_RAN_NODE_NAME)
+        mcc, mnc = plmn
+        self.ngsetup_response = ngsetup_response.build_ngap_ngsetup_response(
+            "synthetic-amf",
+            {"mcc": mcc, "mnc": mnc, "amf_region_id": "01", "amf_set_id": "0001", "amf_pointer": "00"},
+            255,
+            [{"mcc": mcc, "mnc": mnc, "sst": sst}],
+        )
+
+    def ngsetup_request_for(self, gnb_id):
+        """Scenario 1 request with this gNB's ID and a same-length RAN node name."""
+        msg = bytearray(self.ngsetup_request)
+        msg[self._gnb_id_offset:self._gnb_id_offset + 4] = struct.pack("!I", gnb_id & 0xFFFFFFFF)
+        name = f"synthetic-gnb-{gnb_id:07d}".encode()[:len(TEMPLATE_RAN_NODE_NAME)]
+        msg[self._name_offset:self._name_offset + len(name)] = name
+        return bytes(msg)
+
+
+def ngap_association(fb, rng, payloads, gnb_n, gnb_ip, gnb_mac, sport, retransmit, fragment_size):
+    """One gNB <-> AMF association: handshake, NGSetup exchange, SACKs, optional retransmissions."""
+    gtag, atag = rng.getrandbits(32) or 1, rng.getrandbits(32) or 1
+    gtsn, atsn = rng.getrandbits(32), rng.getrandbits(32)
+    up = lambda vtag, chunks: fb.sctp(gnb_mac, AMF_MAC, gnb_ip, AMF_IP, sport, NGAP_PORT, vtag, chunks)
+    down = lambda vtag, chunks: fb.sctp(AMF_MAC, gnb_mac, AMF_IP, gnb_ip, NGAP_PORT, sport, vtag, chunks)
+
+    yield up(0, [init_chunk(1, gtag, gtsn)])
+    yield down(gtag, [init_chunk(2, atag, atsn)])
+    yield up(atag, [_chunk(10, 0, rng.randbytes(32))])   # COOKIE ECHO
+    yield down(gtag, [_chunk(11, 0, b"")])                                          # COOKIE ACK
+
+    request = data_chunks(gtsn, 0, 0, payloads.ngsetup_request_for(gnb_n), fragment_size)
+    for chunk in request:
+        yield up(atag, [chunk])
+        if rng.random() < retransmit:
+            yield up(atag, [chunk])
+    gtsn = (gtsn + len(request) - 1) & 0xFFFFFFFF
+    yield down(gtag, [sack_chunk(gtsn)])
+
+    response = data_chunks(atsn, 0, 0, payloads.ngsetup_response, fragment_size)
+    for chunk in response:
+        yield down(gtag, [chunk])
+        if rng.random() < retransmit:
+            yield down(gtag, [chunk])
+    atsn = (atsn + len(response) - 1) & 0xFFFFFFFF
+    yield up(atag, [sack_chunk(atsn)])
+
+    # SCTP HEARTBEAT / HEARTBEAT ACK keep-alive pair
+    info = _chunk(1, 0, bytes(8))
+    yield up(atag, [_chunk(4, 0, info)])
+    yield down(gtag, [_chunk(5, 0, info)])
+
+
+def pfcp_association(fb, payloads):
+    """SMF <-> UPF PFCP association setup (Scenario 3 builder) and response."""
+    pfcp = payloads.pfcp
+    yield fb.udp(SMF_MAC, UPF_MAC, SMF_IP, UPF_IP, PFCP_PORT, PFCP_PORT,
+                 pfcp.build_pfcp_association_setup_request(SMF_IP, recovery_ts=1700000000))
+    cause = b"\x00\x13\x00\x01\x01"
+    node = b"\x00\x3c\x00\x05\x00" + socket.inet_aton(UPF_IP)
+    body = node + cause
+    yield fb.udp(UPF_MAC, SMF_MAC, UPF_IP, SMF_IP, PFCP_PORT, PFCP_PORT,
+                 b"\x20\x06" + struct.pack("!H", len(body) + 4) + b"\x00\x00\x00\x01" + body)
+
+
+def _pfcp_session_message(msg_type, seid, seq, body=b""):
+    return b"\x21" + bytes([msg_type]) + struct.pack("!HQ", len(body) + 12, seid) + seq.to_bytes(3, "big") + b"\x00" + body
+
+
+def pfcp_session(fb, rng, payloads, n, gnb_ip, retransmit):
+    """One PDU session on N4: establishment, a Scenario 3 modification, heartbeat, deletion."""
+    pfcp = payloads.pfcp
+    cp_seid, up_seid = rng.getrandbits(63) | 1, rng.getrandbits(63) | 1
+    teid = rng.getrandbits(32)
+    ue_ip = f"10.45.{(n >> 8) & 0xFF}.{n & 0xFF}"
+    seq = (n * 4) & 0xFFFFFF
+    req = lambda payload: fb.udp(SMF_MAC, UPF_MAC, SMF_IP, UPF_IP, PFCP_PORT, PFCP_PORT, payload)
+    rsp = lambda payload: fb.udp(UPF_MAC, SMF_MAC, UPF_IP, SMF_IP, PFCP_PORT, PFCP_PORT, payload)
+    cause = b"\x00\x13\x00\x01\x01"
+    fseid = b"\x00\x39\x00\x0d\x02" + struct.pack("!Q", up_seid) + socket.inet_aton(UPF_IP)
+
+    establishment = _pfcp_session_message(50, 0, seq, b"\x00\x39\x00\x0d\x02" + struct.pack("!Q", cp_seid)
+                                          + socket.inet_aton(SMF_IP))
+    yield req(establishment)
+    if rng.random() < retransmit:
+        yield req(establishment)
+    yield rsp(_pfcp_session_message(51, cp_seid, seq, cause + fseid))
+    yield req(pfcp.build_pfcp_session_modification_request(teid, gnb_ip, up_seid, ue_ip, seq + 1))
+    yield rsp(_pfcp_session_message(53, cp_seid, seq + 1, cause))
+    yield req(pfcp.build_pfcp_heartbeat_response((seq + 2).to_bytes(3, "big") + b"\x00", 1700000000))
+    yield req(_pfcp_session_message(54, up_seid, seq + 3))
+    yield rsp(_pfcp_session_message(55, cp_seid, seq + 3, cause))
+
+
+def noise_frame(fb, rng):
+    """One background frame: ARP, GTP-U user plane, SBI HTTP/2, or ICMP echo."""
+    kind = rng.random()
+    host = rng.randrange(2, 250)
+    mac = bytes((2, 0, 0, 0xbb, 0, host))
+    if kind < 0.1:
+        arp = struct.pack("!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, 1, mac, socket.inet_aton(f"10.20.0.{host}"),
+                          b"\x00" * 6, socket.inet_aton("10.20.0.1"))
+        return _eth_header.pack(b"\xff" * 6, mac, 0x0806) + arp
+    if kind < 0.7:
+        inner = rng.randbytes(rng.choice((40, 64, 128, 512)))
+        gtp = struct.pack("!BBHI", 0x30, 0xFF, len(inner), rng.getrandbits(32)) + inner
+        return fb.udp(mac, UPF_MAC, f"10.30.0.{host}", UPF_IP, GTPU_PORT, GTPU_PORT, gtp)
+    if kind < 0.9:
+        h2 = b"\x00\x00\x12\x01\x04\x00\x00\x00\x01" + bytes(18)   # HEADERS frame
+        tcp = struct.pack("!HHIIBBHHH", rng.randrange(30000, 60000), SBI_PORT, rng.getrandbits(32), 0,
+                          0x50, 0x18, 65535, 0, 0) + h2
+        return fb.ipv4(mac, SMF_MAC, f"10.40.0.{host}", SMF_IP, 6, tcp)
+    icmp = struct.pack("!BBHHH", 8, 0, 0, host, rng.randrange(65536)) + bytes(32)
+    return fb.ipv4(mac, AMF_MAC, f"10.20.0.{host}", AMF_IP, 1, icmp)
+
+
+# --------------------------------------------------------------------
+# Writer
+# --------------------------------------------------------------------
+def write_capture(out, gnbs, assocs_per_gnb=1, pfcp_sessions=0, noise=0.0, retransmit=0.0,
+                  seed=1, fragment_size=0, concurrency=32, checksums=False, start_time=1700000000.0):
+    """
+    Interleave `concurrency` active flows (NGAP associations, PFCP sessions)
+    plus `noise` background frames per signalling frame, and write them to
+    `out` as a classic microsecond pcap. Returns the number of frames.
+    """
+    rng = random.Random(seed)
+    fb = FrameBuilder(checksums)
+    payloads = Payloads()
+
+    def flows():
+        yield pfcp_association(fb, payloads)
+        jobs = [("ngap", n, k) for n in range(gnbs) for k in range(assocs_per_gnb)]
+        jobs += [("pfcp", n, 0) for n in range(pfcp_sessions)]
+        rng.shuffle(jobs)
+        for kind, n, k in jobs:
+            gnb_ip = f"10.0.{(n >> 8) & 0xFF}.{n & 0xFF}"
+            if kind == "ngap":
+                gnb_mac = bytes((2, 0, 0, 0xcc, (n >> 8) & 0xFF, n & 0xFF))
+                yield ngap_association(fb, rng, payloads, n + 1, gnb_ip, gnb_mac, 30000 + k,
+                                       retransmit, fragment_size)
+            else:
+                yield pfcp_session(fb, rng, payloads, n, gnb_ip, retransmit)
+
+    pending = flows()
+    active = []
+    frames = 0
+    ts = start_time
+    with open(out, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+
+        def emit(frame):
+            nonlocal frames, ts
+            ts += rng.expovariate(2000.0)
+            sec = int(ts)
+            f.write(_record_header.pack(sec, int((ts - sec) * 1e6), len(frame), len(frame)))
+            f.write(frame)
+            frames += 1
+
+        while True:
+            while len(active) < concurrency:
+                flow = next(pending, None)
+                if flow is None:
+                    break
+                active.append(flow)
+            if not active:
+                break
+            i = rng.randrange(len(active))
+            frame = next(active[i], None)
+            if frame is None:
+                active[i] = active[-1]
+                active.pop()
+                continue
+            emit(frame)
+            # noise is a ratio: whole frames plus one more with the fractional probability
+            n_noise = int(noise) + (1 if rng.random() < noise - int(noise) else 0)
+            for _ in range(n_noise):
+                emit(noise_frame(fb, rng))
+    return frames
+
+
+def main():
+    p = argparse.ArgumentParser(description="Write a deterministic synthetic 5GC capture for benchmarks")
+    p.add_argument("--out", required=True, help="Output pcap path")
+    p.add_argument("--gnbs", type=int, default=100, help="Number of gNBs (default: 100)")
+    p.add_argument("--assocs-per-gnb", type=int, default=1,
+                   help="SCTP associations per gNB, e.g. to model restarts (default: 1)")
+    p.add_argument("--pfcp-sessions", type=int, default=0, help="PFCP sessions on N4 (default: 0)")
+    p.add_argument("--noise", type=float, default=0.0,
+                   help="Background frames (ARP/GTP-U/SBI/ICMP) per signalling frame (default: 0)")
+    p.add_argument("--retransmit", type=float, default=0.0,
+                   help="Probability that a DATA chunk / PFCP request is retransmitted (default: 0)")
+    p.add_argument("--fragment-size", type=int, default=0,
+                   help="Split NGAP messages into DATA fragments of at most N bytes (default: 0, no split)")
+    p.add_argument("--concurrency", type=int, default=32, help="Flows interleaved at once (default: 32)")
+    p.add_argument("--checksums", action="store_true",
+                   help="Fill in SCTP CRC32c (slow without the crc32c package)")
+    p.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    args = p.parse_args()
+
+    if not NGAP_AVAILABLE:
+        print("[!] ERROR: pycrate_asn1dir not available. Cannot build NGSetupResponse.")
+        print("[!] Install with: pip install pycrate")
+        return
+
+    start = time.monotonic()
+    frames = write_capture(args.out, args.gnbs, args.assocs_per_gnb, args.pfcp_sessions, args.noise,
+                           args.retransmit, args.seed, args.fragment_size, args.concurrency, args.checksums)
+    elapsed = time.monotonic() - start
+    print(f"[+] Wrote {frames} frames ({os.path.getsize(args.out) / 1e6:.1f} MB) to {args.out} "
+          f"in {elapsed:.2f}s (seed {args.seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,28 @@
+import contextlib
+import hashlib
+import io
 import json
+import multiprocessing
 import os
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Full as QueueFull
 from pprint import pprint
 
-from scapy.all import rdpcap
-from scapy.layers.inet import IP
-from scapy.layers.l2 import Ether
-from scapy.packet import bind_layers
-
-try:
-    from scapy.contrib.sctp import SCTP, SCTPChunkData, SCTPChunkSACK
-    try:
-        bind_layers(IP, SCTP, proto=132)
-    except Exception:
-        pass
-except Exception:
-    SCTP = None
-    SCTPChunkData = None
-    SCTPChunkSACK = None
+import sctp_flows
+from capture_io import PCAP_MAGICS, PcapTailReader, capture_magic, open_capture
+from decode_cache import DEFAULT_MAX_ENTRIES, MISS, DecodeCache
+from frame_classifier import CLASSES, DEFAULT_PASS, FrameClassifier
+from ngap_fastpath import FALLBACK as NGAP_FALLBACK
+from ngap_extract import extract_message
+from ngap_fastpath import HOT_PROCEDURES, NgapStats, decode_ngsetup, triage
+from ngap_pdu_pool import decode_aper
+from sctp_fastpath import (
+    CHUNK_DATA, CHUNK_INIT, CHUNK_INIT_ACK, CHUNK_SACK, FALLBACK, REASSEMBLY_MAX_BYTES,
+    DataReassembler, FastPathStats, iter_raw_chunks, parse_frame,
+)
+from sctp_flows import iter_sctp_chunks, scapy_fallback
 
 try:
     from pycrate_asn1dir import NGAP
@@ -29,59 +33,78 @@ except ImportError:
     print("[!] Warning: pycrate_asn1dir not available. Cannot parse NGAP messages.")
 
 
-def decode_plmn(plmn_bytes: bytes):
-    """Decode PLMN bytes to MCC/MNC strings.
-    
-    PLMN encoding (3GPP TS 24.301):
-    Byte 1: MNC_digit2 (bits 4-7) || MCC_digit1 (bits 0-3)
-    Byte 2: MNC_digit1 (bits 4-7) || MCC_digit3 (bits 0-3)
-    Byte 3: MNC_digit3 (bits 4-7) || MCC_digit2 (bits 0-3)
-    
-    For 2-digit MNC: If byte 2 upper nibble = 0xF, then:
-      - MNC_digit1 is in byte 1 upper nibble
-      - MNC_digit2 is in byte 3 upper nibble
-      - Byte 2 upper nibble = 0xF is just an indicator
+NGAP_STATS = NgapStats()
+
+# Bump when the extract_* functions change what they return, so rows in an
+# on-disk decode cache from older runs are not reused.
+DECODE_CACHE_VERSION = 1
+NGAP_CACHE = DecodeCache(version=DECODE_CACHE_VERSION)
+CACHE_COUNTERS = ("lookups", "hits", "disk_hits", "evictions")
+
+
+def _init_worker(max_entries, db_path):
     """
-    if len(plmn_bytes) < 3:
-        return None, None
-    
-    b1, b2, b3 = plmn_bytes[0], plmn_bytes[1], plmn_bytes[2]
-    
-    mcc1 = (b1 & 0x0F)
-    mcc2 = (b1 & 0xF0) >> 4
-    mcc3 = (b2 & 0x0F)
-    
-    if (b2 & 0xF0) >> 4 == 0xF:
-        mnc1 = (b3 & 0x0F)
-        mnc2 = (b3 & 0xF0) >> 4
-        mnc = f"{mnc1}{mnc2}"
-    elif (b3 & 0xF0) >> 4 == 0xF:
-        mnc1 = (b2 & 0xF0) >> 4
-        mnc1 = (b1 & 0xF0) >> 4
-        mnc2 = (b2 & 0xF0) >> 4
-        mnc1 = (b2 & 0xF0) >> 4
-        mnc2 = (b1 & 0xF0) >> 4
-        mnc = f"{mnc1}{mnc2}"
-    else:
-        mnc1 = (b2 & 0xF0) >> 4
-        mnc2 = (b1 & 0xF0) >> 4
-        mnc3 = (b3 & 0xF0) >> 4
-        mnc = f"{mnc1}{mnc2}{mnc3}"
-    
-    mcc = f"{mcc1}{mcc2}{mcc3}"
-    
-    return mcc, mnc
+    Worker process initializer: a decode cache built from the parent's CLI
+    settings (a `global` reassignment in main() only reaches forked
+    workers), and zeroed counters so only this worker's work is reported.
+    """
+    global NGAP_CACHE, NGAP_STATS
+    NGAP_CACHE = DecodeCache(max_entries, db_path, DECODE_CACHE_VERSION)
+    NGAP_STATS = NgapStats()
+
 
+def _counters():
+    """Decode cache and NGAP counters of this process, as a picklable dict."""
+    counters = {"cache." + name: getattr(NGAP_CACHE, name) for name in CACHE_COUNTERS}
+    counters.update({"ngap." + name: getattr(NGAP_STATS, name) for name in NgapStats.__slots__})
+    return counters
+
+
+def _merge_counters(counters):
+    """Add counters returned by a worker to this process's NGAP_CACHE and NGAP_STATS."""
+    for key, value in counters.items():
+        kind, name = key.split(".")
+        target = NGAP_CACHE if kind == "cache" else NGAP_STATS
+        setattr(target, name, getattr(target, name) + value)
+
+
+def decode_ngap_message(ngap_bytes: bytes, fast=True):
+    """Decode NGAP message from bytes and extract values.
+
+    Only NGSetupRequest/Response are ever extracted, so anything else is
+    dropped by triage() before pycrate sees it; the hot messages go through
+    the ngap_fastpath decoder first and pycrate is the fallback. Results of
+    either are kept in NGAP_CACHE, keyed by payload digest.
+    """
+    if fast:
+        NGAP_STATS.messages += 1
+        if triage(ngap_bytes) not in HOT_PROCEDURES:
+            NGAP_STATS.skipped += 1
+            return None
+        decoded = NGAP_CACHE.get(ngap_bytes)
+        if decoded is not MISS:
+            NGAP_STATS.cached += 1
+            return decoded
+        decoded = decode_ngsetup(ngap_bytes)
+        if decoded is NGAP_FALLBACK:
+            NGAP_STATS.fallback += 1
+            if not NGAP_AVAILABLE:
+                return None
+            decoded = decode_ngap_message(ngap_bytes, fast=False)
+        else:
+            NGAP_STATS.fast += 1
+        NGAP_CACHE.put(ngap_bytes, decoded)
+        return decoded
 
-def decode_ngap_message(ngap_bytes: bytes):
-    """Decode NGAP message from bytes and extract values."""
     if not NGAP_AVAILABLE:
         return None
     
     try:
-        PDU = NGAP.NGAP_PDU_Descriptions.NGAP_PDU
-        PDU.from_aper(ngap_bytes)
-        pdu_val = PDU.get_val()
+        # Payloads from MmapPcapReader are memoryviews into the capture;
+        # pycrate needs real bytes, so this is where the copy happens.
+        if not isinstance(ngap_bytes, bytes):
+            ngap_bytes = bytes(ngap_bytes)
+        pdu_val = decode_aper(ngap_bytes)
         
         if isinstance(pdu_val, tuple) and len(pdu_val) >= 2:
             if pdu_val[0] == "initiatingMessage":
@@ -112,462 +135,416 @@ def decode_ngap_message(ngap_bytes: bytes):
 
 
 def extract_ngsetup_request_values(ngsetup_request):
-    """Extract MCC/MNC/SST from NGSetupRequest."""
-    extracted = {}
-    
-    try:
-        ies = ngsetup_request.get("protocolIEs", [])
-        
-        for ie in ies:
-            ie_id = ie.get("id", 0)
-            ie_value = ie.get("value", {})
-            
-            if ie_id == 27:
-                if isinstance(ie_value, tuple) and len(ie_value) >= 2:
-                    node_id = ie_value[1]
-                    if isinstance(node_id, tuple) and len(node_id) >= 2:
-                        if node_id[0] == "globalGNB-ID":
-                            gnb_id = node_id[1]
-                            if isinstance(gnb_id, dict):
-                                plmn = gnb_id.get("pLMNIdentity", b"")
-                                if plmn:
-                                    mcc, mnc = decode_plmn(plmn)
-                                    if mcc and mnc:
-                                        extracted["mcc"] = mcc
-                                        extracted["mnc"] = mnc
-            
-            if ie_id == 102:
-                ta_list = []
-                if isinstance(ie_value, list):
-                    ta_list = ie_value
-                elif isinstance(ie_value, tuple):
-                    if len(ie_value) >= 2 and isinstance(ie_value[1], list):
-                        ta_list = ie_value[1]
-                    else:
-                        ta_list = [ie_value]
-                
-                for ta_item in ta_list:
-                    if isinstance(ta_item, dict):
-                        broadcast_list = ta_item.get("broadcastPLMNList", [])
-                        for plmn_item in broadcast_list:
-                            if isinstance(plmn_item, dict):
-                                plmn = plmn_item.get("pLMNIdentity", b"")
-                                if plmn and "mcc" not in extracted:
-                                    mcc, mnc = decode_plmn(plmn)
-                                    if mcc and mnc:
-                                        extracted["mcc"] = mcc
-                                        extracted["mnc"] = mnc
-                                
-                                slice_list = plmn_item.get("tAISliceSupportList", [])
-                                for slice_item in slice_list:
-                                    if isinstance(slice_item, dict):
-                                        nssai = slice_item.get("s-NSSAI", {})
-                                        if isinstance(nssai, dict):
-                                            sst = nssai.get("sST", b"")
-                                            if sst and len(sst) > 0:
-                                                if isinstance(sst, bytes):
-                                                    extracted["sst"] = f"{sst[0]:02X}"
-                                                else:
-                                                    extracted["sst"] = f"{sst:02X}"
-                                                break
-                                break
-                        break
-        
-        
-    except Exception as e:
-        import traceback
-        print(f"[!] Error extracting NGSetupRequest: {e}")
-        print(f"[!] Traceback: {traceback.format_exc()}")
-        pass
-    
-    return extracted if extracted else None
+    """Extract MCC/MNC/SST from NGSetupRequest (fields declared in ngap_extract.NGAP_FIELDS)."""
+    return extract_message("NGSetupRequest", ngsetup_request)
 
 
 def extract_ngsetup_response_values(ngsetup_response):
-    """Extract AMF identity values from NGSetupResponse."""
-    extracted = {}
-    
-    try:
-        ies = ngsetup_response.get("protocolIEs", [])
-        
-        for ie in ies:
-            ie_id = ie.get("id", 0)
-            ie_value = ie.get("value", {})
-            
-            if ie_id == 1:
-                if isinstance(ie_value, tuple) and len(ie_value) >= 2:
-                    if ie_value[0] == "AMFName":
-                        extracted["amf_name"] = str(ie_value[1])
-                    else:
-                        extracted["amf_name"] = str(ie_value[1])
-                elif isinstance(ie_value, str):
-                    extracted["amf_name"] = ie_value
-                elif isinstance(ie_value, bytes):
-                    extracted["amf_name"] = ie_value.decode('utf-8', errors='ignore')
-            
-            if ie_id == 96:
-                guami_list = []
-                
-                if isinstance(ie_value, tuple):
-                    if len(ie_value) >= 2 and isinstance(ie_value[1], list):
-                        guami_list = ie_value[1]
-                    elif isinstance(ie_value[0], list):
-                        guami_list = ie_value[0]
-                    else:
-                        guami_list = [ie_value]
-                elif isinstance(ie_value, list):
-                    guami_list = ie_value
-                
-                for idx, guami_item in enumerate(guami_list):
-                    
-                    guami = None
-                    if isinstance(guami_item, dict):
-                        guami = guami_item.get("gUAMI", guami_item)
-                    elif isinstance(guami_item, tuple) and len(guami_item) >= 2:
-                        if isinstance(guami_item[1], dict):
-                            guami = guami_item[1].get("gUAMI", guami_item[1])
-                        else:
-                            guami = guami_item[1]
-                    
-                    if guami is None:
-                        continue
-                        
-                    
-                    if isinstance(guami, dict):
-                        plmn = guami.get("pLMNIdentity", b"")
-                        if plmn:
-                            mcc, mnc = decode_plmn(plmn)
-                            if mcc and mnc:
-                                extracted["mcc"] = mcc
-                                extracted["mnc"] = mnc
-                        
-                        region_bits = guami.get("aMFRegionID", None)
-                        if region_bits is not None:
-                            if isinstance(region_bits, tuple):
-                                extracted["amf_region_id"] = f"{region_bits[0]:02X}"
-                            else:
-                                extracted["amf_region_id"] = f"{region_bits:02X}"
-                        
-                        set_bits = guami.get("aMFSetID", None)
-                        if set_bits is not None:
-                            if isinstance(set_bits, tuple):
-                                extracted["amf_set_id"] = f"{set_bits[0]:04X}"
-                            else:
-                                extracted["amf_set_id"] = f"{set_bits:04X}"
-                        
-                        pointer_bits = guami.get("aMFPointer", None)
-                        if pointer_bits is not None:
-                            if isinstance(pointer_bits, tuple):
-                                extracted["amf_pointer"] = f"{pointer_bits[0]:02X}"
-                            else:
-                                extracted["amf_pointer"] = f"{pointer_bits:02X}"
-                    break
-            
-            if ie_id == 86:
-                if isinstance(ie_value, tuple) and len(ie_value) >= 2:
-                    if ie_value[0] == "RelativeAMFCapacity":
-                        extracted["amf_capacity"] = int(ie_value[1])
-                    else:
-                        extracted["amf_capacity"] = int(ie_value[1])
-                elif isinstance(ie_value, int):
-                    extracted["amf_capacity"] = ie_value
-            
-            if ie_id == 80:
-                plmn_list = []
-                
-                if isinstance(ie_value, tuple):
-                    if len(ie_value) >= 2 and isinstance(ie_value[1], list):
-                        plmn_list = ie_value[1]
-                    elif isinstance(ie_value[0], list):
-                        plmn_list = ie_value[0]
-                    else:
-                        plmn_list = [ie_value]
-                elif isinstance(ie_value, list):
-                    plmn_list = ie_value
-                
-                for idx, plmn_item in enumerate(plmn_list):
-                    
-                    item_dict = None
-                    if isinstance(plmn_item, dict):
-                        item_dict = plmn_item
-                    elif isinstance(plmn_item, tuple) and len(plmn_item) >= 2:
-                        if isinstance(plmn_item[1], dict):
-                            item_dict = plmn_item[1]
-                    
-                    if item_dict is None:
-                        continue
-                    
-                    plmn = item_dict.get("pLMNIdentity", b"")
-                    if plmn and "mcc" not in extracted:
-                        mcc, mnc = decode_plmn(plmn)
-                        if mcc and mnc:
-                            extracted["mcc"] = mcc
-                            extracted["mnc"] = mnc
-                    
-                    slice_list = item_dict.get("sliceSupportList", [])
-                    for slice_item in slice_list:
-                        nssai = None
-                        if isinstance(slice_item, dict):
-                            nssai = slice_item.get("s-NSSAI", slice_item)
-                        elif isinstance(slice_item, tuple) and len(slice_item) >= 2:
-                            nssai = slice_item[1] if isinstance(slice_item[1], dict) else slice_item
-                        
-                        if nssai and isinstance(nssai, dict):
-                            sst = nssai.get("sST", b"")
-                            if sst and len(sst) > 0:
-                                if isinstance(sst, bytes):
-                                    extracted["sst"] = f"{sst[0]:02X}"
-                                else:
-                                    extracted["sst"] = f"{sst:02X}"
-                                break
-                    break
-        
-        
-    except Exception as e:
-        import traceback
-        print(f"[!] Error extracting NGSetupResponse: {e}")
-        print(f"[!] Traceback: {traceback.format_exc()}")
-        pass
-    
-    return extracted if extracted else None
+    """Extract AMF identity values from NGSetupResponse (fields declared in ngap_extract.NGAP_FIELDS)."""
+    return extract_message("NGSetupResponse", ngsetup_response)
 
 
-def analyze_stream(packets):
+def _format_bytes(num):
+    """Format a byte count for progress output."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if num < 1024.0 or unit == "GB":
+            return f"{num:.1f} {unit}"
+        num /= 1024.0
+
+
+def iter_with_progress(packets, interval=2.0):
+    """Yield packets unchanged while printing throughput every `interval` seconds.
+
+    Works on any iterable (PcapReader, list, generator), so memory use is
+    whatever the underlying reader needs - nothing is buffered here.
+    """
+    start = time.monotonic()
+    last_report = start
+    count = 0
+    total_bytes = 0
+    for pkt in packets:
+        count += 1
+        if isinstance(pkt, (bytes, bytearray, memoryview)):
+            total_bytes += len(pkt)
+        else:
+            raw = getattr(pkt, "original", None)
+            total_bytes += len(raw) if raw else getattr(pkt, "wirelen", None) or 0
+        yield pkt
+        if interval and interval > 0:
+            now = time.monotonic()
+            if now - last_report >= interval:
+                elapsed = now - start
+                print(f"[*] {count} packets, {_format_bytes(total_bytes)} read "
+                      f"({count / elapsed:.0f} pkt/s, {_format_bytes(total_bytes / elapsed)}/s)")
+                last_report = now
+    elapsed = max(time.monotonic() - start, 1e-9)
+    print(f"[+] Read {count} packets, {_format_bytes(total_bytes)} in {elapsed:.2f}s "
+          f"({count / elapsed:.0f} pkt/s, {_format_bytes(total_bytes / elapsed)}/s)")
+
+
+class SCTPAssociation:
+    """
+    State for one SCTP association (one gNB <-> AMF link) seen in a capture.
+    Kept in __slots__ so captures with many gNBs stay cheap to track.
+    DATA chunks pass through a DataReassembler first, so retransmissions
+    are never decoded twice and fragmented NGAP messages are decoded whole.
+    """
+    __slots__ = (
+        "index", "endpoints", "tags", "reassembler",
+        "down_src", "down_dst", "last_dl", "latest_tsn",
+        "initial_tsn", "amf_initial_tsn", "gnb_initial_tsn", "verification_tag",
+        "ngap_packet_count", "ngsetup_request_values",
+        "ngsetup_request_src", "ngsetup_request_dst",
+        "ngsetup_request_src_port", "ngsetup_request_dst_port",
+    )
+
+    def __init__(self, index, endpoints, reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
+        self.index = index
+        self.endpoints = endpoints
+        self.tags = []
+        self.reassembler = DataReassembler(reassembly_max_bytes)
+        self.down_src = None
+        self.down_dst = None
+        self.last_dl = None
+        self.latest_tsn = None
+        self.initial_tsn = None
+        self.amf_initial_tsn = None
+        self.gnb_initial_tsn = None
+        self.verification_tag = None
+        self.ngap_packet_count = 0
+        self.ngsetup_request_values = {}
+        self.ngsetup_request_src = None
+        self.ngsetup_request_dst = None
+        self.ngsetup_request_src_port = None
+        self.ngsetup_request_dst_port = None
+
+    def describe(self):
+        """Short human readable label, gNB side first when known."""
+        if self.ngsetup_request_src is not None:
+            return (f"gNB {self.ngsetup_request_src}:{self.ngsetup_request_src_port} -> "
+                    f"AMF {self.ngsetup_request_dst}:{self.ngsetup_request_dst_port}")
+        (ip_a, port_a), (ip_b, port_b) = self.endpoints
+        return f"{ip_a}:{port_a} <-> {ip_b}:{port_b}"
+
+    def to_state(self, seen_tail=None):
+        """JSON-able snapshot of this association (for --follow checkpoints)."""
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["reassembler"] = self.reassembler.to_state(seen_tail)
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        endpoints = tuple(tuple(ep) for ep in state["endpoints"])
+        assoc = cls(state["index"], endpoints)
+        for name in cls.__slots__:
+            if name not in ("index", "endpoints", "reassembler") and name in state:
+                setattr(assoc, name, state[name])
+        if "reassembler" in state:
+            assoc.reassembler = DataReassembler.from_state(state["reassembler"])
+        return assoc
+
+    def handle(self, ch):
+        """Update association state from one SCTPChunk."""
+        if ch.ctype == CHUNK_INIT:
+            self.gnb_initial_tsn = ch.tsn
+            if ch.init_tag is not None:
+                self.verification_tag = ch.init_tag
+            if self.initial_tsn is None:
+                self.initial_tsn = ch.tsn
+        elif ch.ctype == CHUNK_INIT_ACK:
+            self.amf_initial_tsn = ch.tsn
+            if self.verification_tag is None and ch.vtag is not None:
+                self.verification_tag = ch.vtag
+            self.initial_tsn = ch.tsn
+        elif ch.ctype == CHUNK_SACK:
+            self.down_src = ch.ip_dst
+            self.down_dst = ch.ip_src
+        elif ch.ctype == CHUNK_DATA:
+            ch = self.reassembler.push(ch)
+            if ch is not None:
+                self._handle_data(ch)
+
+    def _handle_data(self, ch):
+        if ch.ppid == 60:
+            self.ngap_packet_count += 1
+
+            if ch.payload and NGAP_AVAILABLE:
+                decoded = decode_ngap_message(ch.payload)
+                if decoded and "mcc" in decoded and "amf_name" not in decoded:
+                    print(f"[+] Extracted from NGSetupRequest: MCC={decoded.get('mcc')}, MNC={decoded.get('mnc')}, SST={decoded.get('sst', 'N/A')}")
+                    self.ngsetup_request_values.update({k: v for k, v in decoded.items() if k in ["mcc", "mnc", "sst"]})
+                    self.ngsetup_request_src = ch.ip_src
+                    self.ngsetup_request_dst = ch.ip_dst
+                    self.ngsetup_request_src_port = ch.sport
+                    self.ngsetup_request_dst_port = ch.dport
+
+        is_attacker_to_target = False
+
+        if self.ngsetup_request_src_port and self.ngsetup_request_dst_port:
+            if ch.sport == self.ngsetup_request_dst_port and ch.dport == self.ngsetup_request_src_port:
+                is_attacker_to_target = True
+        elif self.ngsetup_request_src and self.ngsetup_request_dst:
+            if ch.ip_src == self.ngsetup_request_dst and ch.ip_dst == self.ngsetup_request_src:
+                is_attacker_to_target = True
+        elif self.down_src and self.down_dst:
+            if ch.ip_src == self.down_src and ch.ip_dst == self.down_dst:
+                is_attacker_to_target = True
+
+        if not is_attacker_to_target:
+            return
+        if ch.tsn is not None:
+            if self.latest_tsn is not None and ch.tsn <= self.latest_tsn:
+                return
+            self.latest_tsn = ch.tsn
+        elif self.last_dl is not None:
+            return
+        self.last_dl = {
+            "eth_dst": ch.eth_dst,
+            "eth_src": ch.eth_src,
+            "ip_src": ch.ip_src,
+            "ip_dst": ch.ip_dst,
+            "src_port": ch.sport,
+            "dst_port": ch.dport,
+            "verification_tag": ch.vtag,
+            "ppid": ch.ppid,
+            "sid": ch.sid,
+            "tsn_abs": ch.tsn,
+            "ssn": ch.ssn,
+        }
+
+    def result(self):
+        """
+        Returns: (last_dl, ngap_values) for this association.
+        - MCC/MNC/SST come from the gNB's NGSetupRequest
+        - AMF identity (name/region/set/pointer/capacity) is the attacker's fake one
+        """
+        ngap_values = {}
+        ngap_values.update(self.ngsetup_request_values)
+
+        ngap_values["amf_name"] = "fake-amf-attacker"
+        ngap_values["amf_region_id"] = "01"
+        ngap_values["amf_set_id"] = "0001"
+        ngap_values["amf_pointer"] = "00"
+        ngap_values["amf_capacity"] = 255
+
+        last_dl = dict(self.last_dl) if self.last_dl else None
+        if not last_dl and self.ngsetup_request_src_port and self.ngsetup_request_dst_port:
+            use_tsn = self.amf_initial_tsn if self.amf_initial_tsn is not None else self.initial_tsn
+            if use_tsn is not None:
+                last_dl = {
+                    "eth_dst": None,
+                    "eth_src": None,
+                    "ip_src": self.ngsetup_request_dst,
+                    "ip_dst": self.ngsetup_request_src,
+                    "src_port": self.ngsetup_request_dst_port,
+                    "dst_port": self.ngsetup_request_src_port,
+                    "verification_tag": self.verification_tag,
+                    "ppid": 60,
+                    "sid": 0,
+                    "tsn_abs": use_tsn,
+                    "ssn": 0,
+                }
+
+        if last_dl:
+            if self.amf_initial_tsn is not None:
+                last_dl["initial_tsn"] = self.amf_initial_tsn
+            elif self.initial_tsn is not None:
+                last_dl["initial_tsn"] = self.initial_tsn
+
+        return last_dl, ngap_values
+
+
+class SCTPFlowTable(sctp_flows.SCTPFlowTable):
+    """SCTPFlowTable whose records are SCTPAssociation analyzers, with --follow checkpoints."""
+    association_class = SCTPAssociation
+
+    def to_state(self, done=(), seen_tail=None):
+        """
+        JSON-able snapshot. Associations in `done`, and those superseded by a
+        newer INIT on their 4-tuple, keep only what lookup() needs (index,
+        endpoints, tags); `seen_tail` caps each reassembler's TSN window.
+        """
+        associations = []
+        for assoc in self.associations:
+            if assoc.index in done or self._latest.get(assoc.endpoints) is not assoc:
+                associations.append({"index": assoc.index, "endpoints": assoc.endpoints, "tags": assoc.tags})
+            else:
+                associations.append(assoc.to_state(seen_tail))
+        return {"reassembly_max_bytes": self.reassembly_max_bytes, "associations": associations}
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a table from to_state(); tag lookups are replayed in creation order."""
+        table = cls(state.get("reassembly_max_bytes", REASSEMBLY_MAX_BYTES))
+        for assoc_state in state["associations"]:
+            assoc = cls.association_class.from_state(assoc_state)
+            table.associations.append(assoc)
+            table._latest[assoc.endpoints] = assoc
+            for tag in assoc.tags:
+                table._by_tag.setdefault((assoc.endpoints, tag), assoc)
+        return table
+
+
+
+def read_pcap_chunks(path, progress_interval=2.0, stats=None, classifier=None):
+    """
+    Stream SCTPChunk records from a capture file using the raw-bytes fast
+    path; only odd frames are dissected by Scapy. Classic pcaps are mmapped
+    and NGAP payloads stay views into the file until decoded. Frames the
+    classifier rejects never reach the chunk parser.
+    """
+    with open_capture(path) as reader:
+        frames = (rec.frame for rec in reader)
+        frames = iter_with_progress(frames, interval=progress_interval)
+        if classifier is not None:
+            classifier.linktype = reader.linktype
+            frames = classifier.filter(frames)
+        yield from iter_raw_chunks(frames, reader.linktype, scapy_fallback, stats)
+
+
+def read_pcap_chunks_scapy(path, progress_interval=2.0, classifier=None):
+    """Stream SCTPChunk records, dissecting every frame the classifier passes with Scapy."""
+    with open_capture(path) as reader:
+        frames = (rec.frame for rec in reader)
+        frames = iter_with_progress(frames, interval=progress_interval)
+        if classifier is not None:
+            classifier.linktype = reader.linktype
+            frames = classifier.filter(frames)
+        for frame in frames:
+            yield from scapy_fallback(frame, reader.linktype)
+
+
+def analyze_chunks(chunks, reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
     """
-    Analyze SCTP stream following scenario9 pattern.
-    Returns: transport info, extracted NGAP values
+    Analyze SCTP streams following scenario9 pattern, one record per association.
+    `chunks` is any iterable of SCTPChunk; it is consumed once.
+    Returns: list of (association, last_dl, ngap_values), total NGAP packet count
     Strategy:
     - Extract MCC/MNC/SST from NGSetupRequest (gNB's request - must match what gNB wants)
     - Generate fake AMF identity (region/set/pointer/capacity) - attacker chooses these
     - Use fake AMF name: "fake-amf-attacker"
     """
-    latest_sack = None
-    down_src = None
-    down_dst = None
-    last_dl = None
-    latest_tsn = None
-    initial_tsn = None
-    amf_initial_tsn = None
-    gnb_initial_tsn = None
-    verification_tag = None
-    ngap_values = {}
+    table = SCTPFlowTable(reassembly_max_bytes)
+    for ch in chunks:
+        table.lookup(ch).handle(ch)
+
+    results = []
     ngap_packet_count = 0
-    ngsetup_request_values = {}
-    ngsetup_request_src = None
-    ngsetup_request_dst = None
-    ngsetup_request_src_port = None
-    ngsetup_request_dst_port = None
+    for assoc in table.associations:
+        ngap_packet_count += assoc.ngap_packet_count
+        last_dl, ngap_values = assoc.result()
+        results.append((assoc, last_dl, ngap_values))
+    return results, ngap_packet_count
 
-    packet_num = 0
-    for pkt in packets:
-        packet_num += 1
-        if not pkt.haslayer(IP):
-            continue
-        ip = pkt[IP]
-        
-        sctp_root = None
+
+def reassembly_summary(associations):
+    """One line of DataReassembler counters summed over `associations`."""
+    dup = sum(a.reassembler.duplicates for a in associations)
+    joined = sum(a.reassembler.reassembled for a in associations)
+    evicted = sum(a.reassembler.evicted for a in associations)
+    return (f"SCTP DATA: {dup} retransmission(s) dropped before decode, {joined} fragmented "
+            f"message(s) reassembled, {evicted} fragment(s) evicted by the memory cap")
+
+
+def analyze_stream(packets):
+    """analyze_chunks() over Scapy packets (any iterable, e.g. a PcapReader)."""
+    return analyze_chunks(iter_sctp_chunks(packets))
+
+
+SHARD_BATCH = 256          # chunks per message to a shard worker
+SHARD_QUEUE_DEPTH = 8      # batches in flight per worker; bounds the parent's memory
+
+
+def _put(queue, item, proc):
+    """queue.put() that gives up when the worker reading the queue has died."""
+    while True:
         try:
-            if SCTP is not None and pkt.haslayer(SCTP):
-                sctp_root = pkt[SCTP]
-        except Exception:
-            sctp_root = None
-        if sctp_root is None:
-            try:
-                sctp_root = pkt["SCTP"]
-            except Exception:
-                sctp_root = None
-        if not sctp_root:
-            continue
-        
-        chunks = list(getattr(sctp_root, "chunks", []) or [])
-        if not chunks:
-            ch_iter = getattr(sctp_root, "payload", None)
-            while ch_iter is not None and hasattr(ch_iter, "name") and str(ch_iter.name).startswith("SCTPChunk"):
-                chunks.append(ch_iter)
-                ch_iter = getattr(ch_iter, "payload", None)
-        if not chunks:
-            chunks = [sctp_root]
-        
-        for idx, ch in enumerate(chunks):
-            chn = ch.__class__.__name__
-            
-            is_sack = hasattr(ch, "cumul_tsn_ack") or hasattr(ch, "cum_tsn_ack") or chn.endswith("SACK")
-            is_data = hasattr(ch, "tsn") or chn.endswith("Data") or (SCTPChunkData and isinstance(ch, SCTPChunkData))
-            is_init = hasattr(ch, "initiate_tag") or chn.endswith("INIT") or (hasattr(ch, "type") and getattr(ch, "type", None) == 1)
-            is_init_ack = hasattr(ch, "initiate_tag") and hasattr(ch, "state_cookie") or chn.endswith("INIT-ACK") or (hasattr(ch, "type") and getattr(ch, "type", None) == 2)
-            
-            if is_init or is_init_ack:
-                init_tsn = getattr(ch, "init_tsn", getattr(ch, "initial_tsn", None))
-                src_port_init = getattr(sctp_root, "sport", None)
-                dst_port_init = getattr(sctp_root, "dport", None)
-                
-                if init_tsn is not None:
-                    
-                    if is_init:
-                        gnb_initial_tsn = init_tsn
-                        init_tag = getattr(ch, "initiate_tag", getattr(ch, "tag", None))
-                        if init_tag is not None:
-                            verification_tag = init_tag
-                    elif is_init_ack:
-                        amf_initial_tsn = init_tsn
-                        if verification_tag is None:
-                            vt = getattr(sctp_root, "tag", None)
-                            if vt is not None:
-                                verification_tag = vt
-                    
-                    if initial_tsn is None:
-                        initial_tsn = init_tsn
-                    elif is_init_ack:
-                        initial_tsn = init_tsn
-                continue
-            
-            if is_sack:
-                latest_sack = {
-                    "ip_src": ip.src,
-                    "ip_dst": ip.dst,
-                    "cumulative": getattr(ch, "cum_tsn_ack", getattr(ch, "cumul_tsn_ack", None)),
-                    "a_rwnd": getattr(ch, "a_rwnd", None),
-                    "gap_blocks": len(getattr(ch, "gap_ack_blocks", []) or []),
-                }
-                down_src = ip.dst
-                down_dst = ip.src
-                continue
-            
-            if is_data:
-                ppid_val = getattr(ch, "ppid", getattr(ch, "proto_id", None))
-                
-                ngap_payload = None
-                if ppid_val == 60:
-                    ngap_packet_count += 1
-                    
-                    if hasattr(ch, "data"):
-                        try:
-                            data_attr = ch.data
-                            if data_attr is not None:
-                                ngap_payload = bytes(data_attr)
-                        except Exception:
-                            pass
-                    
-                    if not ngap_payload and hasattr(ch, "load"):
-                        try:
-                            load_bytes = bytes(ch.load)
-                            if load_bytes:
-                                ngap_payload = load_bytes
-                        except Exception:
-                            pass
-                    
-                    if not ngap_payload and hasattr(ch, "payload"):
-                        try:
-                            payload_obj = ch.payload
-                            if payload_obj:
-                                if hasattr(payload_obj, "load"):
-                                    ngap_payload = bytes(payload_obj.load)
-                                else:
-                                    ngap_payload = bytes(payload_obj)
-                        except Exception:
-                            pass
-                    
-                    if ngap_payload and NGAP_AVAILABLE:
-                        decoded = decode_ngap_message(ngap_payload)
-                        if decoded:
-                            is_uplink = None
-                            if down_src and down_dst:
-                                is_uplink = (ip.src == down_dst and ip.dst == down_src)
-                            
-                            if "mcc" in decoded and "amf_name" not in decoded:
-                                print(f"[+] Extracted from NGSetupRequest: MCC={decoded.get('mcc')}, MNC={decoded.get('mnc')}, SST={decoded.get('sst', 'N/A')}")
-                                ngsetup_request_values.update({k: v for k, v in decoded.items() if k in ["mcc", "mnc", "sst"]})
-                                ngsetup_request_src = ip.src
-                                ngsetup_request_dst = ip.dst
-                                ngsetup_request_src_port = getattr(sctp_root, "sport", None)
-                                ngsetup_request_dst_port = getattr(sctp_root, "dport", None)
-                            elif "amf_name" in decoded:
-                                pass
-                
-                
-                current_tsn = getattr(ch, "tsn", None)
-                src_port = getattr(sctp_root, "sport", None)
-                dst_port = getattr(sctp_root, "dport", None)
-                
-                is_attacker_to_target = False
-                
-                if ngsetup_request_src_port and ngsetup_request_dst_port:
-                    if src_port == ngsetup_request_dst_port and dst_port == ngsetup_request_src_port:
-                        is_attacker_to_target = True
-                elif ngsetup_request_src and ngsetup_request_dst:
-                    if ip.src == ngsetup_request_dst and ip.dst == ngsetup_request_src:
-                        is_attacker_to_target = True
-                elif down_src and down_dst:
-                    if ip.src == down_src and ip.dst == down_dst:
-                        is_attacker_to_target = True
-                
-                if is_attacker_to_target and current_tsn is not None:
-                    if latest_tsn is None or current_tsn > latest_tsn:
-                        latest_tsn = current_tsn
-                        last_dl = {
-                            "eth_dst": pkt[Ether].dst if pkt.haslayer(Ether) else None,
-                            "eth_src": pkt[Ether].src if pkt.haslayer(Ether) else None,
-                            "ip_src": ip.src,
-                            "ip_dst": ip.dst,
-                            "src_port": src_port,
-                            "dst_port": dst_port,
-                            "verification_tag": getattr(sctp_root, "tag", None),
-                            "ppid": ppid_val,
-                            "sid": getattr(ch, "sid", None),
-                            "tsn_abs": current_tsn,
-                            "ssn": getattr(ch, "ssn", None),
-                        }
-                elif is_attacker_to_target and last_dl is None:
-                    last_dl = {
-                        "eth_dst": pkt[Ether].dst if pkt.haslayer(Ether) else None,
-                        "eth_src": pkt[Ether].src if pkt.haslayer(Ether) else None,
-                        "ip_src": ip.src,
-                        "ip_dst": ip.dst,
-                        "src_port": src_port,
-                        "dst_port": dst_port,
-                        "verification_tag": getattr(sctp_root, "tag", None),
-                        "ppid": ppid_val,
-                        "sid": getattr(ch, "sid", None),
-                        "tsn_abs": current_tsn,
-                        "ssn": getattr(ch, "ssn", None),
-                    }
-
-    ngap_values = {}
-    
-    ngap_values.update(ngsetup_request_values)
-    
-    ngap_values["amf_name"] = "fake-amf-attacker"
-    ngap_values["amf_region_id"] = "01"
-    ngap_values["amf_set_id"] = "0001"
-    ngap_values["amf_pointer"] = "00"
-    ngap_values["amf_capacity"] = 255
-    
-    
-    if not last_dl and ngsetup_request_src_port and ngsetup_request_dst_port:
-        use_tsn = amf_initial_tsn if amf_initial_tsn is not None else initial_tsn
-        if use_tsn is not None:
-            last_dl = {
-                "eth_dst": None,
-                "eth_src": None,
-                "ip_src": ngsetup_request_dst,
-                "ip_dst": ngsetup_request_src,
-                "src_port": ngsetup_request_dst_port,
-                "dst_port": ngsetup_request_src_port,
-                "verification_tag": verification_tag,
-                "ppid": 60,
-                "sid": 0,
-                "tsn_abs": use_tsn,
-                "ssn": 0,
-            }
-            latest_tsn = use_tsn
-    
-    if last_dl:
-        if amf_initial_tsn is not None:
-            last_dl["initial_tsn"] = amf_initial_tsn
-        elif initial_tsn is not None:
-            last_dl["initial_tsn"] = initial_tsn
-    
-    return last_dl, ngap_values, ngap_packet_count
+            queue.put(item, timeout=1.0)
+            return
+        except QueueFull:
+            if not proc.is_alive():
+                raise RuntimeError(f"shard worker {proc.name} exited with code {proc.exitcode}")
+
+
+def _shard_worker(inbox, outbox, reassembly_max_bytes, cache_settings):
+    """
+    Worker process: replay the chunks of the associations hashed onto it,
+    batch by batch (NGAP decode happens here), then send back one
+    (association, last_dl, ngap_values) per association and its counters.
+    """
+    _init_worker(*cache_settings)
+    associations = {}
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        for index, endpoints, ch in batch:
+            assoc = associations.get(index)
+            if assoc is None:
+                assoc = associations[index] = SCTPAssociation(index, endpoints, reassembly_max_bytes)
+            assoc.handle(ch)
+    NGAP_CACHE.close()
+    outbox.put(([(assoc,) + assoc.result() for assoc in associations.values()], _counters()))
+
+
+def analyze_chunks_parallel(chunks, workers, reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
+    """
+    Same result as analyze_chunks(), but the pycrate decode and testcase
+    extraction run in `workers` processes. The parent only maps chunks to
+    associations (no NGAP decode) and streams them in small batches to the
+    worker that owns the association (index % workers), so memory stays
+    bounded by the queue depth however large the capture is.
+    """
+    ctx = multiprocessing.get_context()
+    outbox = ctx.Queue()
+    cache_settings = (NGAP_CACHE.max_entries, NGAP_CACHE.db_path)
+    procs, inboxes, batches = [], [], []
+    for n in range(workers):
+        inbox = ctx.Queue(SHARD_QUEUE_DEPTH)
+        proc = ctx.Process(target=_shard_worker, args=(inbox, outbox, reassembly_max_bytes, cache_settings),
+                           name=f"shard-{n}", daemon=True)
+        proc.start()
+        procs.append(proc)
+        inboxes.append(inbox)
+        batches.append([])
+
+    table = SCTPFlowTable(reassembly_max_bytes)
+    n_chunks = 0
+    try:
+        for ch in chunks:
+            assoc = table.lookup(ch)
+            if ch.payload is not None and not isinstance(ch.payload, bytes):
+                ch = ch._replace(payload=bytes(ch.payload))  # views cannot be pickled to workers
+            n = assoc.index % workers
+            batches[n].append((assoc.index, assoc.endpoints, ch))
+            n_chunks += 1
+            if len(batches[n]) >= SHARD_BATCH:
+                _put(inboxes[n], batches[n], procs[n])
+                batches[n] = []
+        for n in range(workers):
+            if batches[n]:
+                _put(inboxes[n], batches[n], procs[n])
+            _put(inboxes[n], None, procs[n])
+        results = []
+        for _ in range(workers):
+            shard, counters = outbox.get()
+            results.extend(shard)
+            _merge_counters(counters)
+        for proc in procs:
+            proc.join()
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+    print(f"[+] Streamed {n_chunks} SCTP chunks of {len(table.associations)} association(s) "
+          f"to {workers} worker(s)")
+
+    # tags are only tracked by the parent's flow table
+    results.sort(key=lambda r: r[0].index)
+    for assoc, _, _ in results:
+        assoc.tags = table.associations[assoc.index].tags
+    ngap_packet_count = sum(assoc.ngap_packet_count for assoc, _, _ in results)
+    return results, ngap_packet_count
 
 
 def make_testcase_dict(last_dl: dict, amf_name, mcc, mnc, amf_region, amf_set, amf_pointer, sst, amf_capacity):
@@ -637,90 +614,67 @@ def make_testcase_dict(last_dl: dict, amf_name, mcc, mnc, amf_region, amf_set, a
     return testcase
 
 
-def main():
-    import argparse
-    p = argparse.ArgumentParser(description="Extract NGAP NGSetupResponse testcase from PCAP - NO MANUAL INPUT")
-    p.add_argument("--pcap", required=True)
-    args = p.parse_args()
-
-    if not os.path.exists(args.pcap):
-        print("[!] pcap not found:", args.pcap)
-        return
-
-    print(f"[+] Analyzing PCAP: {args.pcap}")
-    print("[+] Extracting ALL values from PCAP...")
-    
-    if not NGAP_AVAILABLE:
-        print("[!] ERROR: pycrate_asn1dir not available. Cannot decode NGAP messages.")
-        print("[!] Install with: pip install pycrate")
-        return
-    
-    packets = rdpcap(args.pcap)
-    print(f"[+] Loaded {len(packets)} packets from PCAP")
-    
-    last_dl, ngap_values, ngap_count = analyze_stream(packets)
-    
-    print(f"[+] Found {ngap_count} NGAP packets (PPID 60) in PCAP")
-    
+def build_testcase(last_dl, ngap_values):
+    """Validate the values extracted for one association and build its testcase (None on error)."""
     if not last_dl:
         print("[!] ERROR: No downlink SCTP DATA found in pcap.")
-        return
+        return None
     
     if not ngap_values:
         print("[!] ERROR: No NGAP messages successfully decoded from PCAP.")
         print("[!] PCAP must contain valid NGSetupRequest and/or NGSetupResponse messages.")
-        return
+        return None
 
     if "mcc" not in ngap_values:
         print("[!] ERROR: MCC not found in PCAP NGSetupRequest")
-        return
+        return None
     mcc = ngap_values["mcc"]
     print(f"[+] EXTRACTED MCC from NGSetupRequest: {mcc} (gNB's requested PLMN)")
     
     if "mnc" not in ngap_values:
         print("[!] ERROR: MNC not found in PCAP NGSetupRequest")
-        return
+        return None
     mnc = ngap_values["mnc"]
     print(f"[+] EXTRACTED MNC from NGSetupRequest: {mnc} (gNB's requested PLMN)")
     
     if "sst" not in ngap_values:
         print("[!] ERROR: SST not found in PCAP NGSetupRequest")
-        return
+        return None
     sst = ngap_values["sst"]
     print(f"[+] EXTRACTED SST from NGSetupRequest: {sst} (gNB's requested slice)")
     
     if "amf_name" not in ngap_values:
         print("[!] ERROR: AMF name not found")
-        return
+        return None
     amf_name = ngap_values["amf_name"]
     print(f"[+] USING AMF Name: {amf_name} (FAKE - attacker's identity)")
     
     if "amf_region_id" not in ngap_values:
         print("[!] ERROR: AMF region ID not generated")
-        return
+        return None
     amf_region = ngap_values["amf_region_id"]
     print(f"[+] USING AMF Region: {amf_region} (FAKE - attacker's identity)")
     
     if "amf_set_id" not in ngap_values:
         print("[!] ERROR: AMF set ID not generated")
-        return
+        return None
     amf_set = ngap_values["amf_set_id"]
     print(f"[+] USING AMF Set: {amf_set} (FAKE - attacker's identity)")
     
     if "amf_pointer" not in ngap_values:
         print("[!] ERROR: AMF pointer not generated")
-        return
+        return None
     amf_pointer = ngap_values["amf_pointer"]
     print(f"[+] USING AMF Pointer: {amf_pointer} (FAKE - attacker's identity)")
     
     if "amf_capacity" not in ngap_values:
         print("[!] ERROR: AMF capacity not generated")
-        return
+        return None
     amf_capacity = ngap_values["amf_capacity"]
     print(f"[+] USING AMF Capacity: {amf_capacity} (FAKE - attacker's identity)")
 
     print("\n[+] Building testcase from extracted values...")
-    testcase = make_testcase_dict(
+    return make_testcase_dict(
         last_dl,
         amf_name=amf_name,
         mcc=mcc, mnc=mnc,
@@ -731,14 +685,450 @@ def main():
         amf_capacity=amf_capacity
     )
 
-    out_dir = "testcase_output"
+
+def write_testcase(testcase, out_dir, name):
     os.makedirs(out_dir, exist_ok=True)
-    ts = time.strftime("%Y%m%d_%H%M%S")
-    out_file = os.path.join(out_dir, f"ngap_NGSetupResponse_{ts}.json")
+    out_file = os.path.join(out_dir, name)
     with open(out_file, "w", encoding="utf-8") as f:
         json.dump(testcase, f, indent=2)
     print("[+] Testcase written:", out_file)
-    pprint(testcase)
+    return out_file
+
+
+FOLLOW_STATE_VERSION = 2
+FOLLOW_STATE_SUFFIX = ".follow.json"
+FOLLOW_SEEN_TAIL = 256     # TSNs per direction checkpointed for retransmission dedup
+
+
+def _follow_state_path(path):
+    return path + FOLLOW_STATE_SUFFIX
+
+
+def _capture_identity(path):
+    """Inode plus global header bytes: enough to tell a resumed capture from a new one."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    return {"inode": os.stat(path).st_ino, "header": header.hex()}
+
+
+def load_follow_state(path):
+    """Return the --follow checkpoint for `path`, or None if missing or for another capture."""
+    state_path = _follow_state_path(path)
+    if not os.path.exists(state_path) or not os.path.exists(path):
+        return None
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != FOLLOW_STATE_VERSION or state.get("capture") != _capture_identity(path) \
+            or os.path.getsize(path) < state.get("offset", 0):
+        print("[!] Follow checkpoint does not match the capture; starting from the beginning")
+        return None
+    return state
+
+
+def save_follow_state(path, offset, frame_no, table, emitted):
+    """Atomically write the --follow checkpoint next to the capture."""
+    state = {
+        "version": FOLLOW_STATE_VERSION,
+        "capture": _capture_identity(path),
+        "offset": offset,
+        "frame_no": frame_no,
+        "emitted": sorted(emitted),
+        "table": table.to_state(emitted, FOLLOW_SEEN_TAIL),
+    }
+    state_path = _follow_state_path(path)
+    tmp = state_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, state_path)
+
+
+def _emit_ready(table, emitted, out_dir):
+    """Write a testcase for every association whose NGSetup exchange is complete."""
+    for assoc in table.associations:
+        if assoc.index in emitted or "mcc" not in assoc.ngsetup_request_values or assoc.last_dl is None:
+            continue
+        emitted.add(assoc.index)
+        print(f"\n[+] Association #{assoc.index}: {assoc.describe()}")
+        testcase = build_testcase(*assoc.result())
+        if testcase:
+            ts = time.strftime("%Y%m%d_%H%M%S")
+            write_testcase(testcase, out_dir, f"ngap_NGSetupResponse_{ts}_a{assoc.index:03d}.json")
+
+
+def follow_capture(path, out_dir="testcase_output", classifier=None, poll_interval=0.2,
+                   checkpoint_interval=1.0, idle_exit=None, reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
+    """
+    Tail a capture that is still being written and emit one testcase per
+    association as soon as its NGSetupRequest and the AMF's downlink answer
+    are on disk. Read offset and association state are checkpointed to
+    <pcap>.follow.json, so a restart picks up where the last run stopped.
+    """
+    state = load_follow_state(path)
+    if state:
+        table = SCTPFlowTable.from_state(state["table"])
+        emitted = set(state["emitted"])
+        reader = PcapTailReader(path, state["offset"], state["frame_no"], poll_interval)
+        print(f"[+] Resuming at frame {state['frame_no']} (offset {state['offset']}), "
+              f"{len(table.associations)} association(s) restored")
+    else:
+        table = SCTPFlowTable(reassembly_max_bytes)
+        emitted = set()
+        reader = PcapTailReader(path, poll_interval=poll_interval)
+
+    print(f"[+] Following {path} (Ctrl-C to stop)")
+    done_offset, done_frame = reader.offset, reader.frame_no
+    saved_offset = done_offset
+    resets = reader.resets
+    now = time.monotonic()
+    last_data = last_emit = last_checkpoint = now
+    try:
+        for rec in reader:
+            now = time.monotonic()
+            if reader.resets != resets:
+                # new file content: old associations and TSNs would swallow its DATA as duplicates
+                resets = reader.resets
+                table = SCTPFlowTable(reassembly_max_bytes)
+                emitted = set()
+                saved_offset = None
+            if rec is not None:
+                if classifier is not None:
+                    classifier.linktype = reader.linktype
+                if classifier is None or classifier.wants(rec.frame):
+                    chunks = parse_frame(rec.frame, reader.linktype)
+                    if chunks is FALLBACK:
+                        chunks = scapy_fallback(rec.frame, reader.linktype)
+                    for ch in chunks:
+                        table.lookup(ch).handle(ch)
+                done_offset, done_frame = reader.offset, reader.frame_no
+                last_data = now
+            elif idle_exit and now - last_data >= idle_exit:
+                print(f"[+] No new packets for {idle_exit:.0f}s, stopping")
+                break
+
+            if rec is None or now - last_emit >= poll_interval:
+                _emit_ready(table, emitted, out_dir)
+                last_emit = now
+            if done_offset != saved_offset and now - last_checkpoint >= checkpoint_interval:
+                save_follow_state(path, done_offset, done_frame, table, emitted)
+                saved_offset, last_checkpoint = done_offset, now
+    except KeyboardInterrupt:
+        print("\n[+] Stopping")
+    finally:
+        reader.close()
+        _emit_ready(table, emitted, out_dir)
+        if done_offset is not None:
+            save_follow_state(path, done_offset, done_frame, table, emitted)
+        NGAP_CACHE.flush()
+    print(f"[+] {done_frame} frames read, {len(table.associations)} association(s), "
+          f"{len(emitted)} testcase(s) emitted")
+
+
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".cap")
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def find_captures(input_dir):
+    """All capture files below `input_dir` (compressed ones included), sorted."""
+    found = []
+    for root, _dirs, files in os.walk(input_dir):
+        for name in files:
+            base = name
+            for ext in COMPRESSED_EXTENSIONS:
+                if base.endswith(ext):
+                    base = base[:-len(ext)]
+                    break
+            if base.endswith(CAPTURE_EXTENSIONS):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(out_dir):
+    """
+    Manifest layout:
+      captures: {sha256: {"path", "testcases": [file, ...], "associations", "ngap_packets"[, "error"]}}
+      files:    {path: [size, mtime, sha256]}  - avoids rehashing unchanged files
+    """
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        print(f"[!] Ignoring unreadable manifest {path}")
+    return {"version": MANIFEST_VERSION, "captures": {}, "files": {}}
+
+
+def save_manifest(out_dir, manifest):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def capture_hash(path, manifest):
+    """sha256 of a capture, reusing the manifest's entry while size and mtime are unchanged."""
+    st = os.stat(path)
+    cached = manifest["files"].get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime:
+        return cached[2]
+    digest = file_sha256(path)
+    manifest["files"][path] = [st.st_size, st.st_mtime, digest]
+    return digest
+
+
+def process_capture(job):
+    """
+    Batch worker: analyze one capture and write its testcases, named after
+    the capture hash. Per-association output is captured and only the
+    warnings are handed back, so parallel workers do not interleave,
+    along with the counters this capture added.
+    """
+    path, digest, out_dir, pass_classes, reassembly_max_bytes = job
+    before = _counters()
+    log = io.StringIO()
+    written = []
+    with contextlib.redirect_stdout(log):
+        try:
+            classifier = FrameClassifier(pass_classes)
+            results, ngap_count = analyze_chunks(read_pcap_chunks(path, 0, classifier=classifier),
+                                                 reassembly_max_bytes)
+            testcases = [tc for tc in (build_testcase(last_dl, values) for _, last_dl, values in results) if tc]
+            for n, testcase in enumerate(testcases, 1):
+                suffix = f"_{n:03d}" if len(testcases) > 1 else ""
+                name = f"ngap_NGSetupResponse_{digest[:12]}{suffix}.json"
+                write_testcase(testcase, out_dir, name)
+                written.append(name)
+            error = None
+        except Exception as e:
+            results, ngap_count, error = [], 0, f"{type(e).__name__}: {e}"
+    NGAP_CACHE.flush()
+    warnings = [line for line in log.getvalue().splitlines() if line.startswith("[!]")]
+    counters = {key: value - before[key] for key, value in _counters().items()}
+    return path, digest, written, len(results), ngap_count, warnings, error, counters
+
+
+def run_batch(input_dir, out_dir="testcase_output", workers=1, pass_classes=DEFAULT_PASS,
+              reassembly_max_bytes=REASSEMBLY_MAX_BYTES):
+    """
+    Process every capture below `input_dir` in one process (or a pool of
+    `workers`), skipping captures whose content hash is already in the
+    output directory's manifest. Captures that errored last time are
+    retried.
+    """
+    captures = find_captures(input_dir)
+    manifest = load_manifest(out_dir)
+    jobs = []
+    seen = set()
+    retried = 0
+    for path in captures:
+        digest = capture_hash(path, manifest)
+        if digest in seen:
+            continue
+        entry = manifest["captures"].get(digest)
+        if entry is not None:
+            if "error" not in entry:
+                continue
+            retried += 1
+        seen.add(digest)
+        jobs.append((path, digest, out_dir, tuple(pass_classes), reassembly_max_bytes))
+    print(f"[+] {len(captures)} capture(s) in {input_dir}: {len(captures) - len(jobs)} skipped "
+          f"(content hash already seen), {len(jobs)} to do ({retried} retried after an error) "
+          f"with {workers} worker(s)")
+    save_manifest(out_dir, manifest)   # keep the hash cache even if the run is interrupted
+
+    start = time.monotonic()
+    total = 0
+    if workers > 1 and len(jobs) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(NGAP_CACHE.max_entries, NGAP_CACHE.db_path))
+        results = pool.map(process_capture, jobs)
+    else:
+        pool = None
+        results = map(process_capture, jobs)
+    try:
+        for path, digest, written, n_assoc, ngap_count, warnings, error, counters in results:
+            if pool is not None:
+                _merge_counters(counters)
+            entry = {"path": path, "testcases": written, "associations": n_assoc, "ngap_packets": ngap_count}
+            if error:
+                # recorded for the operator; the next run retries it (the error may be transient)
+                print(f"[!] {path}: {error}")
+                entry["error"] = error
+            else:
+                for line in warnings:
+                    print(f"    {line}")
+                print(f"[+] {path}: {n_assoc} association(s), {ngap_count} NGAP packets, "
+                      f"{len(written)} testcase(s)")
+            manifest["captures"][digest] = entry
+            total += len(written)
+            save_manifest(out_dir, manifest)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"[+] Batch done in {time.monotonic() - start:.2f}s: {total} testcase(s) written to {out_dir}")
+
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="Extract NGAP NGSetupResponse testcases (one per SCTP association) from PCAP - NO MANUAL INPUT")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--pcap")
+    src.add_argument("--input-dir",
+                     help="Batch mode: process every capture below this directory in one process, skipping "
+                          "captures already listed (by sha256) in testcase_output/manifest.json; captures that "
+                          "errored are retried")
+    p.add_argument("--progress-interval", type=float, default=2.0,
+                   help="Seconds between progress reports while reading the PCAP (0 disables, default: 2)")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Decode associations in N worker processes; with --input-dir, captures are "
+                        "processed by N workers instead (default: 1, no pool)")
+    p.add_argument("--scapy", action="store_true",
+                   help="Dissect every packet with Scapy instead of the raw-bytes fast path")
+    p.add_argument("--index", action="store_true",
+                   help="Use (building on first run) the <pcap>.idx.json sidecar index and only read the frames needed")
+    p.add_argument("--assoc", type=int, nargs="+",
+                   help="With --index: only analyze these association ids (see capture_index.py output)")
+    p.add_argument("--pass-class", nargs="+", choices=CLASSES, default=list(DEFAULT_PASS),
+                   help="Frame classes handed to the SCTP parser; the rest are skipped before dissection "
+                        f"(default: {' '.join(DEFAULT_PASS)})")
+    p.add_argument("--follow", action="store_true",
+                   help="Tail a pcap tcpdump is still writing and emit each testcase as soon as its NGSetup "
+                        "exchange is on disk; progress is checkpointed to <pcap>.follow.json")
+    p.add_argument("--idle-exit", type=float,
+                   help="With --follow: stop after this many seconds without new packets")
+    p.add_argument("--reassembly-max-bytes", type=int, default=REASSEMBLY_MAX_BYTES,
+                   help="Fragment bytes buffered per association direction while reassembling NGAP "
+                        f"messages split over several DATA chunks (default: {REASSEMBLY_MAX_BYTES})")
+    p.add_argument("--decode-cache", type=int, default=DEFAULT_MAX_ENTRIES, metavar="N",
+                   help="Keep the decoded values of the last N distinct NGAP payloads in memory "
+                        f"(0 disables, default: {DEFAULT_MAX_ENTRIES})")
+    p.add_argument("--decode-cache-db", metavar="PATH",
+                   help="SQLite file that keeps decoded NGAP values across runs, so repeated runs over "
+                        "the same captures skip ASN.1 decoding")
+    args = p.parse_args()
+
+    global NGAP_CACHE
+    NGAP_CACHE = DecodeCache(args.decode_cache, args.decode_cache_db, DECODE_CACHE_VERSION)
+    try:
+        _run(args)
+    finally:
+        NGAP_CACHE.close()
+    if NGAP_CACHE.lookups:
+        print(f"[+] {NGAP_CACHE.summary()}")
+
+
+def _run(args):
+    if args.input_dir:
+        if not NGAP_AVAILABLE:
+            print("[!] ERROR: pycrate_asn1dir not available. Cannot decode NGAP messages.")
+            return
+        if not os.path.isdir(args.input_dir):
+            print("[!] input directory not found:", args.input_dir)
+            return
+        run_batch(args.input_dir, workers=args.workers, pass_classes=args.pass_class,
+                  reassembly_max_bytes=args.reassembly_max_bytes)
+        return
+
+    if args.follow:
+        if not NGAP_AVAILABLE:
+            print("[!] ERROR: pycrate_asn1dir not available. Cannot decode NGAP messages.")
+            return
+        follow_capture(args.pcap, classifier=FrameClassifier(args.pass_class), idle_exit=args.idle_exit,
+                       reassembly_max_bytes=args.reassembly_max_bytes)
+        return
+
+    if not os.path.exists(args.pcap):
+        print("[!] pcap not found:", args.pcap)
+        return
+
+    print(f"[+] Analyzing PCAP: {args.pcap}")
+    print("[+] Extracting ALL values from PCAP...")
+    
+    if not NGAP_AVAILABLE:
+        print("[!] ERROR: pycrate_asn1dir not available. Cannot decode NGAP messages.")
+        print("[!] Install with: pip install pycrate")
+        return
+    
+    index = None
+    if args.index:
+        if capture_magic(args.pcap) in PCAP_MAGICS:
+            import capture_index
+            index = capture_index.load_or_build_index(args.pcap)
+        else:
+            print("[!] Only uncompressed classic pcap supports seeking; falling back to a full scan")
+
+    stats = FastPathStats()
+    classifier = FrameClassifier(args.pass_class)
+    if index is not None:
+        chunks = capture_index.iter_indexed_chunks(
+            args.pcap, index, capture_index.NGSETUP_KINDS, set(args.assoc) if args.assoc else None)
+    elif args.scapy:
+        chunks = read_pcap_chunks_scapy(args.pcap, args.progress_interval, classifier)
+    else:
+        chunks = read_pcap_chunks(args.pcap, args.progress_interval, stats, classifier)
+    if args.workers > 1:
+        results, ngap_count = analyze_chunks_parallel(chunks, args.workers, args.reassembly_max_bytes)
+    else:
+        results, ngap_count = analyze_chunks(chunks, args.reassembly_max_bytes)
+    if index is not None:
+        # report and name the associations by their capture_index.py ids
+        capture_index.match_association_ids(index, [assoc for assoc, _, _ in results])
+        results.sort(key=lambda r: r[0].index)
+        ngap_count = sum(a["ngap_count"] for a in index["associations"]
+                         if not args.assoc or a["id"] in args.assoc)
+    else:
+        print(f"[+] {classifier.summary()}")
+        if not args.scapy:
+            print(f"[+] {stats.summary()}")
+    if NGAP_STATS.messages:
+        print(f"[+] {NGAP_STATS.summary()}")
+    
+    print(f"[+] {reassembly_summary([assoc for assoc, _, _ in results])}")
+    print(f"[+] Found {ngap_count} NGAP packets (PPID 60) in PCAP")
+    print(f"[+] Found {len(results)} SCTP association(s) in PCAP")
+    
+    testcases = []
+    for assoc, last_dl, ngap_values in results:
+        print(f"\n[+] Association #{assoc.index}: {assoc.describe()}")
+        testcase = build_testcase(last_dl, ngap_values)
+        if testcase:
+            testcases.append((assoc.index, testcase))
+
+    if not testcases:
+        print("[!] ERROR: No testcase could be built from this PCAP.")
+        return
+
+    out_dir = "testcase_output"
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    for n, (assoc_id, testcase) in enumerate(testcases, 1):
+        if index is not None:
+            suffix = f"_a{assoc_id:03d}"    # same id as capture_index.py / --assoc
+        else:
+            suffix = f"_{n:03d}" if len(testcases) > 1 else ""
+        write_testcase(testcase, out_dir, f"ngap_NGSetupResponse_{ts}{suffix}.json")
+    if len(testcases) == 1:
+        pprint(testcases[0][1])
+    else:
+        print(f"[+] {len(testcases)} testcases written to {out_dir}")
 
 
 if __name__ == "__main__":